@@ -0,0 +1,136 @@
+'''Checks that utils.table output is byte-identical to tabulate and compares their speed
+
+Run: python benchmark_table.py [number of random tables per schema]
+Exits with code 1 if any table differs from tabulate.
+'''
+import datetime as dt
+import random
+import sys
+import timeit
+
+import tabulate
+
+from utils import constants as uc
+from utils import table as utb
+
+
+single_ordr_hdr = ['Name', 'Quantity', 'Price']  # headers that were passed to tabulate before
+many_ordrs_hdr = ['Order Number', 'Date', 'Status', 'Total Price']
+users_list_header = ['ID', 'Username', 'First Name', 'Last Name', 'Admin', 'Manager', 'Date Registered']
+
+WORDS = ['Pizza', 'Борщ', 'ラーメン', 'Café crème', '🍣 Sushi', 'Tom Yum', '12', '3.50', 'None', 'True', 'inf', ' padded ', '']
+PRICES = [0, 1, 2.5, 10.25, 99.99, 100.0, 1e-05, 123456.789, 0.1 + 0.2]
+
+def random_date(rnd: random.Random) -> dt.datetime:
+    return dt.datetime(2023, 1, 1, tzinfo=dt.timezone.utc) + dt.timedelta(seconds=rnd.randrange(10**8))
+
+def old_order_table(dishes: list, currency: str) -> str:
+    '''Order table as it was made with tabulate'''
+    order_dishes = [[name, quantity, f"{price} {currency}"] for name, quantity, price in dishes]
+    total_price = 0
+    for _, quantity, price in dishes:
+        total_price += price*quantity
+    order_dishes.append(['Total', None, f"{total_price} {currency}"])
+    return tabulate.tabulate(order_dishes, headers=single_ordr_hdr)
+
+def old_order_footer(order_id, restaurant_name: str, status_name: str, date_ordered: dt.datetime) -> str:
+    '''Footer as it was added to order table'''
+    order_date = date_ordered.astimezone(uc.PLACE_TIMEZONE)
+    return (
+        f"\n\nOrder Number: {order_id}\n"
+        f"Restaurant: {restaurant_name}\n"
+        f"Status: {status_name}\n"
+        f"Order Date: {order_date.hour:02}:{order_date.minute:02} "
+        f"{order_date.day:02}.{order_date.month:02}.{order_date.year:04}"
+    )
+
+def order_dishes(rnd: random.Random) -> tuple:
+    dishes = [
+        (rnd.choice(WORDS) + rnd.choice(['', ' XL', ' 2']), rnd.randint(1, 30), rnd.choice(PRICES))
+        for _ in range(rnd.randint(1, 12))
+    ]
+    return dishes, rnd.choice(['USD', 'EUR', '₽', ''])
+
+def orders_rows(rnd: random.Random) -> list:
+    rows = []
+    for _ in range(rnd.randint(0, 40)):
+        order_date = random_date(rnd).astimezone(uc.PLACE_TIMEZONE)
+        rows.append([
+            f"{rnd.randint(1, 10**rnd.randint(1, 6)):02}",
+            f"{order_date.hour:02}:{order_date.minute:02} {order_date.day:02}.{order_date.month:02}.{order_date.year:04}",
+            rnd.choice(uc.ORDER_STATUSES + ['1', '2.5']),  # numeric statuses check type inference
+            f"{rnd.choice(PRICES)}" + rnd.choice([' USD', ' ₽', '']),
+        ])
+    return rows
+
+def users_rows(rnd: random.Random) -> list:
+    return [
+        [
+            str(rnd.randint(1, 10**10)),
+            str(rnd.choice(WORDS + [None])),
+            str(rnd.choice(WORDS)),
+            str(rnd.choice(WORDS + [None])),
+            str(rnd.choice([True, False])),
+            str(rnd.choice([True, False])),
+            str(random_date(rnd).astimezone(uc.PLACE_TIMEZONE)),
+        ] for _ in range(rnd.randint(0, 40))
+    ]
+
+def same(new, old) -> bool:
+    '''Returns True if both calls return the same text or raise the same exception, e.g. 'True' in float column'''
+    results = []
+    for call in (new, old):
+        try:
+            results.append(call())
+        except Exception as er:
+            results.append(type(er))
+    return results[0] == results[1]
+
+def check_equivalence(tables: int) -> list:
+    '''Returns descriptions of tables that differ from tabulate'''
+    rnd = random.Random(0)
+    failures = []
+    for i in range(tables):
+        dishes, currency = order_dishes(rnd)
+        if not same(lambda: utb.format_order_table(dishes, currency), lambda: old_order_table(dishes, currency)):
+            failures.append(f"single_ordr_hdr #{i}: {dishes} {currency}")
+
+        rows = orders_rows(rnd)
+        if rows and not same(lambda: utb.format_table(rows, utb.MANY_ORDERS_COLUMNS), lambda: tabulate.tabulate(rows, headers=many_ordrs_hdr)):
+            failures.append(f"many_ordrs_hdr #{i}: {rows}")
+
+        rows = users_rows(rnd)
+        if rows and not same(lambda: utb.format_table(rows, utb.USERS_LIST_COLUMNS), lambda: tabulate.tabulate(rows, headers=users_list_header)):
+            failures.append(f"users_list_header #{i}: {rows}")
+
+        footer = (rnd.randint(1, 10**6), rnd.choice(WORDS), rnd.choice(uc.ORDER_STATUSES), random_date(rnd))
+        if not same(lambda: utb.format_order_footer(*footer), lambda: old_order_footer(*footer)):
+            failures.append(f"footer #{i}: {footer}")
+    return failures
+
+def benchmark(name: str, new, old, number: int = 200) -> None:
+    new_time = min(timeit.repeat(new, number=number, repeat=5)) / number
+    old_time = min(timeit.repeat(old, number=number, repeat=5)) / number
+    print(f"{name:<20} utils.table {new_time*1e6:9.1f} us   tabulate {old_time*1e6:9.1f} us   x{old_time/new_time:.1f}")
+    return None
+
+def main(tables: int = 1000) -> int:
+    failures = check_equivalence(tables)
+    print(f"Equivalence: {tables} random tables per schema, {len(failures)} differ from tabulate")
+    for failure in failures[:10]:
+        print(f"  {failure}")
+
+    rnd = random.Random(1)
+    dishes, currency = [(f"Dish {i}", rnd.randint(1, 5), rnd.choice(PRICES)) for i in range(10)], 'USD'
+    orders = [row for _ in range(10) for row in orders_rows(rnd)][:50]
+    users = [row for _ in range(10) for row in users_rows(rnd)][:50]
+    footer = (123, 'Pizza', uc.ORDER_STATUSES[0], random_date(rnd))
+
+    benchmark('single_ordr_hdr', lambda: utb.format_order_table(dishes, currency), lambda: old_order_table(dishes, currency))
+    benchmark('many_ordrs_hdr', lambda: utb.format_table(orders, utb.MANY_ORDERS_COLUMNS), lambda: tabulate.tabulate(orders, headers=many_ordrs_hdr))
+    benchmark('users_list_header', lambda: utb.format_table(users, utb.USERS_LIST_COLUMNS), lambda: tabulate.tabulate(users, headers=users_list_header))
+    benchmark('footer', lambda: utb.format_order_footer(*footer), lambda: old_order_footer(*footer))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:2]]))
@@ -1,12 +1,17 @@
 import logging
 import os
 
-from telegram.ext import (Application, CallbackQueryHandler, CommandHandler,
+from telegram import Update
+from telegram.ext import (Application, CallbackQueryHandler,
+                          ChatMemberHandler, CommandHandler,
                           ConversationHandler, InvalidCallbackData,
-                          MessageHandler, filters)
+                          MessageHandler, TypeHandler, filters)
 
-from modules.bot.src import (cart, default, dish, error, lobby, manage_db,
-                             notification, order, restaurant, user_orders)
+from modules.bot.src import (availability, bulk_orders, callback, cart,
+                             default, dish, error, export, lobby, manage_db,
+                             memory, notification, order, persistence,
+                             processing, rate_limiter, restaurant, sharding,
+                             startup, transport, user_orders)
 from utils import constants as uc
 from utils import text as ut
 
@@ -26,30 +31,110 @@ LOBBY, RESTAURANT, DISH, CART, ORDER, USER_ORDERS = range(6)  # states for user
 M_USER, M_ORDER, M_RESTAURANT, M_RESTAURANT_SCHEDULE, N_RESTAURANT = range(6, 11)  # states for manager conversation
 C_RESTAURANT, S_RESTAURANT, N_CATEGORY = range(11, 14)  # states for manager conversation
 R_DISH, C_DISH, N_DISH, D_DISH, PR_DISH, PH_DISH = range(14, 20)  # states for manager conversation
+I_MENU, M_ORDERS = range(20, 22)  # states for manager conversation
+
+def main(started: float = None):
+    '''Run the bot, started is time of process start for startup timing'''
+    startup.checkpoint('imports', started)
+
+    if uc.SHARD_ROLE == 'ingress':
+        sharding.run_ingress(TOKEN)  # ingress only routes updates, they are handled by workers
+        return None
+
+    if uc.SHARD_ROLE != 'worker' and uc.WEBHOOK_URL and not uc.WEBHOOK_SECRET:
+        raise Exception('WEBHOOK_SECRET is required for webhook mode')  # anyone could send updates to webhook
 
-def main():
-    '''Run the bot'''
     application = (
         Application
             .builder()
-            .token(TOKEN)
-            .arbitrary_callback_data(True)
+            .application_class(processing.UserOrderedApplication)  # keeps order of updates for every user
+            .bot(
+                callback.CallbackCodecBot(
+                    token=TOKEN,
+                    request=transport.create_request(),  # media uploads have their own connections
+                    get_updates_request=transport.create_updates_request(),
+                    rate_limiter=rate_limiter.PriorityRateLimiter(),  # keeps outgoing messages in telegram limits
+                )
+            )  # callback data is encoded in buttons, so keyboards are valid after restart
+            .concurrent_updates(uc.UPDATES_TASKS_LIMIT)  # processing limit is applied by application class
+            .persistence(persistence.DatabasePersistence())  # carts and conversation states survive restarts
+            .post_init(startup.warmUp)  # caches are filled and notification chat membership is checked once
             .build()
     )
 
+    # Log updates and outgoing messages queue depth and wait time
+    application.job_queue.run_repeating(
+        processing.reportStats,
+        uc.STATS_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        rate_limiter.reportStats,
+        uc.STATS_INTERVAL
+    )
+
+    # Deliver order requests that were not sent right after ordering
+    application.job_queue.run_repeating(
+        notification.dispatchOutbox,
+        uc.OUTBOX_INTERVAL
+    )
+
+    # Delete keys of old orders, repeated submissions are recognized by them
+    application.job_queue.run_repeating(
+        order.deleteOrderKeys,
+        uc.ORDER_KEY_CLEANUP_INTERVAL
+    )
+
+    # Enable dishes whose sold out time has passed
+    application.job_queue.run_repeating(
+        availability.restockDishes,
+        uc.RESTOCK_INTERVAL
+    )
+
+    # Remove data of idle users from memory and log its size
+    application.job_queue.run_repeating(
+        memory.evictIdleUsers,
+        uc.EVICTION_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        memory.reportMemory,
+        uc.MEMORY_REPORT_INTERVAL
+    )
+
+    # Send counts of repeated errors to developer
+    application.job_queue.run_repeating(
+        error.sendErrorDigest,
+        uc.ERROR_DIGEST_INTERVAL
+    )
+
     fallbacks = [
         CommandHandler('cancel', default.cancelHandler),  # stops conversation
         MessageHandler(filters.COMMAND & ~filters.Text('/help'), default.endConversation),  # ends conversation if another command starts
         MessageHandler(~filters.COMMAND, error.messageHandler),  # message handler to notify user that text is not recognized
         CallbackQueryHandler(
             error.uncatchedCallbackHandler,
-            pattern=lambda data: data['value'] not in ['-ORDER_CONFIRM-', '-ORDER_CANCEL-']
+            pattern=lambda data: data['value'] not in ['-ORDER_CONFIRM-', '-ORDER_CANCEL-', '-CANCEL_EXPORT-']
         )  # callback handler to catch all unanswered callbacks
     ]
 
+    ended_conversation = memory.EndedConversationFilter()
     user_conversation = ConversationHandler(
         entry_points=[
-            CommandHandler('start', default.startHandler, ~default.GROUP_CHAT_FILTER)  # conversation starts by /start command
+            CommandHandler('start', default.startHandler, ~default.GROUP_CHAT_FILTER),  # conversation starts by /start command
+            MessageHandler(
+                filters.Text(
+                    list({
+                        btn_txt for keyboard in (
+                            lobby.LOBBY_KEYBOARD,
+                            restaurant.RESTAURANT_KEYBOARD,
+                            dish.DISH_KEYBOARD,
+                            cart.CART_KEYBOARD,
+                            order.ORDER_KEYBOARD,
+                            user_orders.USER_ORDERS_KEYBOARD
+                        ) for row in keyboard for btn_txt in row
+                    })
+                ) & ~default.GROUP_CHAT_FILTER & ended_conversation,
+                default.startHandler
+            )  # keyboard left after conversation ended by timeout opens lobby
         ],
         states={
             LOBBY: [
@@ -110,6 +195,10 @@ def main():
                     filters.TEXT & ~filters.COMMAND,
                     dish.showDish
                 ),  # message handler to show dishes of selected category
+                CallbackQueryHandler(
+                    dish.changeMenuPage,
+                    pattern=lambda data: data.get('value') == '-MENU_PAGE-'
+                ),  # query handler of carousel previous and next buttons
                 CallbackQueryHandler(
                     dish.showQuantityButton,
                     pattern=lambda data: data.get('value') == '-ADD-' or data.get('value') == '-CHANGE-'
@@ -181,22 +270,33 @@ def main():
                     filters.Regex(r'^[0-9]+$'),
                     user_orders.showSingleOrder
                 )  # one order description
-            ]
+            ],
+            ConversationHandler.TIMEOUT: [
+                TypeHandler(Update, memory.conversationTimeout)
+            ]  # navigation data of idle user is removed
         },
         fallbacks=fallbacks,
-        allow_reentry=True
+        allow_reentry=True,
+        conversation_timeout=uc.USER_CONVERSATION_TIMEOUT,
+        name='user_conversation',
+        persistent=True  # state is restored after restart
     )
+    ended_conversation.handler = user_conversation
 
     manager_conversation = ConversationHandler(
         entry_points=[
             CommandHandler('order', manage_db.findOrder, ~default.GROUP_CHAT_FILTER),
             CommandHandler('orders', manage_db.showOrders, ~default.GROUP_CHAT_FILTER),
+            CommandHandler('active_orders', manage_db.showActiveOrders, ~default.GROUP_CHAT_FILTER),
             CommandHandler('user', manage_db.findUser, ~default.GROUP_CHAT_FILTER),
             CommandHandler('users', manage_db.lastUsers, ~default.GROUP_CHAT_FILTER),
             CommandHandler('restaurant', manage_db.findRestaurant, ~default.GROUP_CHAT_FILTER),
+            CommandHandler('notify', manage_db.routeNotifications, ~default.GROUP_CHAT_FILTER),
             CommandHandler('new_restaurant', manage_db.createNewRestaurant, ~default.GROUP_CHAT_FILTER),
             CommandHandler('new_category', manage_db.createNewDishCategory, ~default.GROUP_CHAT_FILTER),
-            CommandHandler('new_dish', manage_db.createNewDish, ~default.GROUP_CHAT_FILTER)
+            CommandHandler('new_dish', manage_db.createNewDish, ~default.GROUP_CHAT_FILTER),
+            CommandHandler('import', manage_db.startImport, ~default.GROUP_CHAT_FILTER),
+            CommandHandler('availability', manage_db.changeAvailability, ~default.GROUP_CHAT_FILTER)
         ],
         states={
             M_ORDER: [
@@ -209,6 +309,16 @@ def main():
                     pattern=lambda data: data.get('value') == '-NEW_STATUS-'
                 )  # change order status and update keyboard
             ],
+            M_ORDERS: [
+                CallbackQueryHandler(
+                    bulk_orders.orderListButton,
+                    pattern=lambda data: data.get('value') in ['-BULK_ORDER_SELECT-', '-BULK_ORDER_SELECT_PAGE-', '-BULK_ORDER_PAGE-']
+                ),  # select orders and change page
+                CallbackQueryHandler(
+                    bulk_orders.setOrdersStatus,
+                    pattern=lambda data: data.get('value') == '-BULK_ORDER_STATUS-'
+                )  # change status of selected orders
+            ],
             M_USER: [
                 CallbackQueryHandler(
                     manage_db.changePermission,
@@ -231,7 +341,11 @@ def main():
                 CallbackQueryHandler(
                     manage_db.changeDishState,
                     pattern=lambda data: data.get('value') == '-CHANGE_DISH_STATUS-'
-                )
+                ),
+                CallbackQueryHandler(
+                    manage_db.changeMenuPage,
+                    pattern=lambda data: data.get('value') == '-MANAGE_MENU_PAGE-'
+                )  # carousel previous and next buttons
             ],
             M_RESTAURANT_SCHEDULE: [
                 CallbackQueryHandler(
@@ -306,10 +420,22 @@ def main():
                     filters.Regex('^No$'),
                     manage_db.photoNewDish
                 )
-            ]
+            ],
+            I_MENU: [
+                MessageHandler(
+                    filters.Document.ALL,
+                    manage_db.importMenu
+                )  # menu document
+            ],
+            ConversationHandler.TIMEOUT: [
+                TypeHandler(Update, memory.conversationTimeout)
+            ]  # navigation data of idle user is removed
         },
         fallbacks=fallbacks,
         allow_reentry=True,
+        conversation_timeout=uc.MANAGER_CONVERSATION_TIMEOUT,
+        name='manager_conversation',
+        persistent=True  # state is restored after restart
     )
 
     # Register InvalidCallbackdata handler
@@ -336,6 +462,22 @@ def main():
             )
         )
     )
+
+    # Track bot membership in notification chat
+    application.add_handler(
+        ChatMemberHandler(
+            notification.trackChatMembership,
+            ChatMemberHandler.MY_CHAT_MEMBER
+        )
+    )
+
+    # Register callback query handler for export cancel button
+    application.add_handler(
+        CallbackQueryHandler(
+            export.cancelExportButton,
+            pattern=lambda data: data.get('value') == '-CANCEL_EXPORT-'
+        )
+    )
     
     # Handler to show help to users and managers
     application.add_handler(
@@ -357,5 +499,24 @@ def main():
             )
         )
     
-    # Run bot until Ctrl+C
-    application.run_polling()
\ No newline at end of file
+    startup.checkpoint('setup')
+
+    if uc.SHARD_ROLE == 'worker':
+        # Run worker server until Ctrl+C, updates are forwarded by ingress
+        sharding.run_worker(application)
+    elif uc.WEBHOOK_URL:
+        # Run webhook server until Ctrl+C, updates with wrong secret token are rejected
+        application.run_webhook(
+            listen=uc.WEBHOOK_LISTEN,
+            port=uc.WEBHOOK_PORT,
+            url_path=uc.WEBHOOK_PATH,
+            webhook_url=f"{uc.WEBHOOK_URL.rstrip('/')}/{uc.WEBHOOK_PATH}",
+            secret_token=uc.WEBHOOK_SECRET,
+            max_connections=uc.WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        # Run bot until Ctrl+C
+        application.run_polling(
+            timeout=uc.POLLING_TIMEOUT,
+            read_timeout=uc.HTTP_UPDATES_READ_TIMEOUT
+        )
\ No newline at end of file
@@ -0,0 +1,105 @@
+import datetime as dt
+import logging
+
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.orm import Session
+from telegram.ext import ContextTypes
+
+from modules.bot.src import catalog
+from modules.database import config as dbc
+from utils import constants as uc
+from utils import utility as uu
+
+
+logger = logging.getLogger(__name__)
+
+def parse_until(text: str) -> dt.datetime:
+    '''Returns next UTC time of place time HH.MM, today or tomorrow'''
+    hour, minute = [int(x) for x in text.split('.')]
+    now = uu.current_utc_time().astimezone(uc.PLACE_TIMEZONE)
+    until = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if until <= now:
+        until += dt.timedelta(days=1)  # time has passed today
+    return until.astimezone(dt.timezone.utc)
+
+def dishes_condition(restaurant_name: str = None, category_name: str = None, dish_ids: list = None):
+    '''Returns where clause for dishes of restaurant, category, both or listed ids'''
+    if dish_ids:
+        return dbc.Dish.id.in_(dish_ids)
+
+    conditions = []
+    if restaurant_name:
+        conditions.append(
+            dbc.Dish.restaurant_id.in_(
+                select(dbc.Restaurant.id)
+                    .where(func.lower(dbc.Restaurant.name)==restaurant_name.lower())
+            )
+        )
+    if category_name:
+        conditions.append(
+            dbc.Dish.dish_category_id.in_(
+                select(dbc.DishCategory.id)
+                    .where(func.lower(dbc.DishCategory.name)==category_name.lower())
+            )
+        )
+    if not conditions:
+        raise Exception('Restaurant, category or dish ids are not provided')  # empty condition would match every dish
+    return and_(*conditions)
+
+def set_availability(enabled: bool, until: dt.datetime = None, **target) -> int:
+    '''Enables or disables dishes of target with one UPDATE, disabled dishes are enabled again at until if it is set
+
+    Returns number of changed dishes.
+    '''
+    condition = dishes_condition(**target)
+    with Session(dbc.engine) as session:
+        dish_ids = session.scalars(
+            update(dbc.Dish)
+                .where(condition)
+                .where(dbc.Dish.enabled==(not enabled))  # only dishes that change, so restock doesn't enable dishes disabled before
+                .values(enabled=enabled)
+                .returning(dbc.Dish.id)
+        ).all()
+
+        sold_out_ids = session.scalars(
+            delete(dbc.DishSoldOut)
+                .where(dbc.DishSoldOut.dish_id.in_(select(dbc.Dish.id).where(condition)))
+                .returning(dbc.DishSoldOut.dish_id)
+        ).all()  # new state replaces earlier sold out time
+        if until is not None and not enabled:
+            session.add_all(
+                dbc.DishSoldOut(dish_id=dish_id, date_until=until) for dish_id in set(dish_ids) | set(sold_out_ids)
+            )  # dishes that were already sold out get new time
+        session.commit()
+    catalog.forget_catalog()  # users and checkout see new state right away
+    return len(dish_ids)
+
+def forget_sold_out(session: Session, dish_id: int) -> None:
+    '''Removes sold out time of dish that manager changed by hand'''
+    session.execute(
+        delete(dbc.DishSoldOut)
+            .where(dbc.DishSoldOut.dish_id==dish_id)
+    )
+    return None
+
+async def restockDishes(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that enables dishes whose sold out time has passed'''
+    with Session(dbc.engine) as session:
+        dish_ids = session.scalars(
+            delete(dbc.DishSoldOut)
+                .where(dbc.DishSoldOut.date_until<=uu.current_utc_time())
+                .returning(dbc.DishSoldOut.dish_id)
+        ).all()  # entries deleted by other worker are not returned
+        if not dish_ids:
+            return None
+
+        session.execute(
+            update(dbc.Dish)
+                .where(dbc.Dish.id.in_(dish_ids))
+                .values(enabled=True)
+        )
+        session.commit()
+
+    catalog.forget_catalog()
+    logger.info('Dishes are available again: %s', ', '.join(str(dish_id) for dish_id in dish_ids))
+    return None
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import math
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from modules.bot import config as bc
+from modules.bot.src import dashboard, notification
+from modules.database import config as dbc
+from utils import constants as uc
+from utils import text as ut
+from utils import utility as uu
+
+
+logger = logging.getLogger(__name__)
+txt_dct = ut.messages  # dictionary of message texts
+
+def final_status_ids() -> list:
+    '''Returns ids of Completed and Cancelled statuses, orders with them are not active'''
+    return [dbc.get_status_id(name) for name in uc.ORDER_STATUSES[-2:]]
+
+def get_active_order_ids() -> list:
+    '''Returns ids of orders that are not completed or cancelled, oldest first'''
+    with Session(dbc.engine) as session:
+        return session.scalars(
+            select(dbc.Order.id)
+                .where(dbc.Order.status_id.not_in(final_status_ids()))
+                .order_by(dbc.Order.id)
+        ).all()
+
+def get_orders(order_ids: list) -> list:
+    '''Returns id, date, status, restaurant, total price and currency of orders'''
+    with Session(dbc.engine) as session:
+        return session.execute(
+            select(
+                dbc.Order.id,
+                dbc.Order.date_ordered,
+                dbc.Status.name.label('status'),
+                dbc.Restaurant.name.label('restaurant'),
+                func.sum(dbc.Dish.price*dbc.CartDish.quantity).label('total'),  # cart total price
+                dbc.Restaurant.currency
+            )
+                .join(dbc.Order.status)
+                .join(dbc.Order.cart_dish)
+                .join(dbc.CartDish.dish)
+                .join(dbc.Dish.restaurant)
+                .where(dbc.Order.id.in_(order_ids))
+                .group_by(dbc.Order.id, dbc.Status.name, dbc.Restaurant.name, dbc.Restaurant.currency)
+                .order_by(dbc.Order.id)
+        ).all()
+
+def create_order_list(selected: set, page: int) -> tuple:
+    '''Returns text and keyboard of active orders page, selected ids of orders that are not active anymore are removed'''
+    order_ids = get_active_order_ids()
+    selected.intersection_update(order_ids)  # orders could be closed by other managers
+    pages = max(math.ceil(len(order_ids) / uc.BULK_ORDERS_PAGE_SIZE), 1)
+    page = page % pages
+    page_ids = order_ids[page*uc.BULK_ORDERS_PAGE_SIZE:(page + 1)*uc.BULK_ORDERS_PAGE_SIZE]
+
+    txt = f"Active orders: {len(order_ids)}, selected: {len(selected)}"
+    if pages > 1:
+        txt += f" ({page + 1}/{pages})"
+    txt += '\n\n'
+    for order in get_orders(page_ids):
+        txt += (
+            f"{'☑️' if order.id in selected else '▫️'} {order.id} "
+            f"{order.date_ordered.astimezone(uc.PLACE_TIMEZONE):%d.%m %H:%M} "
+            f"{order.restaurant}, {order.total} {order.currency}, {order.status}\n"
+        )  # line for every order of the page
+    if not order_ids:
+        txt += 'There are no active orders'
+
+    rows = uu.list_split(
+        [
+            InlineKeyboardButton(
+                f"{'☑️' if order_id in selected else '▫️'} {order_id}",
+                callback_data={'value': '-BULK_ORDER_SELECT-', 'order_id': order_id, 'page': page}
+            ) for order_id in page_ids
+        ],
+        uc.BULK_ORDERS_COLUMNS
+    )  # order buttons select and unselect orders
+    if page_ids:
+        rows.append([
+            InlineKeyboardButton(
+                'Unselect page' if set(page_ids) <= selected else 'Select page',
+                callback_data={'value': '-BULK_ORDER_SELECT_PAGE-', 'page': page}
+            )
+        ])
+    if pages > 1:
+        rows.append([
+            InlineKeyboardButton('◀️', callback_data={'value': '-BULK_ORDER_PAGE-', 'page': (page - 1) % pages}),
+            InlineKeyboardButton('▶️', callback_data={'value': '-BULK_ORDER_PAGE-', 'page': (page + 1) % pages}),
+        ])
+    if selected:
+        rows.append([
+            InlineKeyboardButton(
+                f"{'❌' if status_name == uc.ORDER_STATUSES[-1] else '✅'} {status_name} ({len(selected)})",
+                callback_data={'value': '-BULK_ORDER_STATUS-', 'status_id': dbc.get_status_id(status_name), 'page': page}
+            ) for status_name in uc.ORDER_STATUSES[-2:]
+        ])  # bulk actions
+    return txt, InlineKeyboardMarkup(rows)
+
+def set_orders_status(order_ids: list, status_id: int, manager_id: int) -> list:
+    '''Sets status of active orders with one UPDATE and saves one audit record, returns ids and users of changed orders'''
+    with Session(dbc.engine) as session:
+        changed = session.execute(
+            update(dbc.Order)
+                .where(dbc.Order.id.in_(order_ids))
+                .where(dbc.Order.status_id.not_in(final_status_ids()))  # orders closed meanwhile are not changed again
+                .values(status_id=status_id, manager_id=manager_id)
+                .returning(dbc.Order.id, dbc.Order.user_id)
+        ).all()
+        if changed:
+            notification.pop_request_messages(session, [order.id for order in changed])  # closed orders are not answered in notification chats
+            session.add(
+                dbc.OrderStatusChange(
+                    manager_id=manager_id,
+                    status_id=status_id,
+                    order_ids=','.join(str(order.id) for order in sorted(changed))
+                )
+            )  # one record for the whole change
+        session.commit()
+    return changed
+
+async def _send_digest(bot, user_id: int, txt: str) -> bool:
+    '''Sends status digest to customer, returns False if it was not delivered'''
+    try:
+        await bot.send_message(user_id, txt)
+        return True
+    except Exception as er:
+        logger.info('Status digest was not sent to user %s: %s', user_id, er)  # user could block the bot
+        return False
+
+async def notifyCustomers(bot, changed: list, status_name: str) -> int:
+    '''Sends one message to every customer with all their changed orders, returns number of delivered messages'''
+    orders_by_user = {}
+    for order_id, user_id in changed:
+        orders_by_user.setdefault(user_id, []).append(order_id)
+
+    results = await asyncio.gather(
+        *[
+            _send_digest(
+                bot,
+                user_id,
+                f"{txt_dct['orders_status_changed']}\n\n" + '\n'.join(
+                    f"{txt_dct['order_number']} {order_id}: {status_name}" for order_id in sorted(order_ids)
+                )
+            ) for user_id, order_ids in orders_by_user.items()
+        ]
+    )  # customers have separate chat limits, so digests are sent in parallel
+    return sum(results)
+
+async def _edit_order_list(query, context: ContextTypes.DEFAULT_TYPE, page: int, notice: str = None):
+    '''Edits order list message with actual orders and selection'''
+    selected = context.user_data.setdefault('manage', {}).setdefault('selected_orders', set())
+    txt, kbrd = create_order_list(selected, page)
+    if notice:
+        txt = f"{notice}\n\n{txt}"
+    try:
+        await query.edit_message_text(txt, reply_markup=kbrd)
+    except BadRequest as er:
+        logger.info('Order list was not edited: %s', er)  # same text and keyboard
+    return None
+
+async def orderListButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Selects and unselects orders or changes page of order list'''
+    query = update.callback_query  # shortcut for callback query
+    selected = context.user_data.setdefault('manage', {}).setdefault('selected_orders', set())
+
+    if query.data['value'] == '-BULK_ORDER_SELECT-':
+        selected.symmetric_difference_update({query.data['order_id']})  # toggle order
+    elif query.data['value'] == '-BULK_ORDER_SELECT_PAGE-':
+        order_ids = get_active_order_ids()
+        page_ids = set(order_ids[query.data['page']*uc.BULK_ORDERS_PAGE_SIZE:(query.data['page'] + 1)*uc.BULK_ORDERS_PAGE_SIZE])
+        if page_ids <= selected:
+            selected.difference_update(page_ids)
+        else:
+            selected.update(page_ids)
+
+    await query.answer()
+    await _edit_order_list(query, context, query.data['page'])
+    return None  # not changing state
+
+async def setOrdersStatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Sets status of all selected orders and sends one digest to every customer'''
+    query = update.callback_query  # shortcut for callback query
+    u_usr = update.effective_user  # user from update
+    status_id = query.data['status_id']
+
+    with Session(dbc.engine) as session:
+        # ---------- CHECKING IF UPDATE USER IS MANAGER ----------
+        user_manager = session.scalar(
+            select(dbc.User)
+                .where(
+                    (dbc.User.id==u_usr.id)
+                    & (dbc.User.manager==True)
+                )
+        )
+
+        if not user_manager:
+            await query.answer('You are not manager', show_alert=True)  # notify of prohibited action
+            return bc.END  # end conversation
+        # ---------- END OF CHECKING IF UPDATE USER IS MANAGER ----------
+
+        status_name = session.scalar(
+            select(dbc.Status.name)
+                .where(dbc.Status.id==status_id)
+        )
+
+    selected = context.user_data.setdefault('manage', {}).setdefault('selected_orders', set())
+    if not selected:
+        await query.answer('No orders are selected', show_alert=True)
+        return None  # not changing state
+
+    changed = set_orders_status(sorted(selected), status_id, u_usr.id)
+    selected.clear()
+    dashboard.orders_changed(context.job_queue, [order.id for order in changed], status_name)
+    await query.answer()
+
+    notified = await notifyCustomers(context.bot, changed, status_name)
+    await _edit_order_list(
+        query,
+        context,
+        query.data['page'],
+        f"{len(changed)} orders have been marked {status_name}, {notified} customers notified"
+    )
+    return None  # not changing state
@@ -0,0 +1,127 @@
+import base64
+
+from telegram import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ExtBot, InvalidCallbackData
+
+
+PREFIX = '~'  # marks encoded callback data, it is not in base64 alphabet
+MAX_LENGTH = 64  # telegram limit of callback data in bytes
+
+# Fields carried by every button value, names and prices are resolved from database by ids
+# Action code is index in this list, so new actions must be appended to the end
+ACTIONS: list = [
+    ('-ADD-', ('dish_id', 'category_id', 'page', 'pages')),
+    ('-CHANGE-', ('dish_id', 'category_id', 'page', 'pages')),
+    ('-CANCEL-', ('dish_id', 'category_id', 'page', 'pages')),
+    ('-QUANTITY-', ('dish_id', 'quantity', 'category_id', 'page', 'pages')),
+    ('-QUANTITY_NEXT-', ('dish_id', 'max_value', 'category_id', 'page', 'pages')),
+    ('-QUANTITY_BACK-', ('dish_id', 'max_value', 'category_id', 'page', 'pages')),
+    ('-MENU_PAGE-', ('category_id', 'page')),
+    ('-LEAVE_CART-', ()),
+    ('-EMPTY_CART-', ()),
+    ('-QUANTITY_CHANGE-', ('dish_id', 'quantity')),
+    ('-QUANTITY_MINUS-', ('dish_id', 'quantity')),
+    ('-QUANTITY_PLUS-', ('dish_id', 'quantity')),
+    ('-QUANTITY_OK-', ('dish_id', 'quantity')),
+    ('-ORDER_CONFIRM-', ('order_id',)),
+    ('-ORDER_CANCEL-', ('order_id',)),
+    ('-CHANGE_STATUS-', ('order_id',)),
+    ('-NEW_STATUS-', ('order_id', 'status_id')),
+    ('-ADMIN_STATUS-', ('user_id',)),
+    ('-MANAGER_STATUS-', ('user_id',)),
+    ('-CHANGE_RESTAURANT_STATUS-', ('restaurant_id',)),
+    ('-CHANGE_RESTAURANT_SCHEDULE-', ('restaurant_id',)),
+    ('-CANCEL_SCHEDULE_CHANGE-', ()),
+    ('-CHANGE_DISH_STATUS-', ('dish_id', 'enabled', 'category_id', 'page', 'pages')),
+    ('-MANAGE_MENU_PAGE-', ('category_id', 'page')),
+    ('-CANCEL_EXPORT-', ('job_id',)),
+    ('-BULK_ORDER_SELECT-', ('order_id', 'page')),
+    ('-BULK_ORDER_SELECT_PAGE-', ('page',)),
+    ('-BULK_ORDER_PAGE-', ('page',)),
+    ('-BULK_ORDER_STATUS-', ('status_id', 'page')),
+]
+ACTION_CODES: dict = {value: (code, fields) for code, (value, fields) in enumerate(ACTIONS)}
+BOOL_FIELDS: set = {'enabled'}  # decoded as bool
+
+def _write_int(buffer: bytearray, number: int):
+    '''Appends zigzag varint, small numbers take one byte'''
+    number = (number << 1) ^ (number >> 63)  # negative numbers become odd positive
+    while True:
+        byte = number & 0x7f
+        number >>= 7
+        if number:
+            buffer.append(byte | 0x80)
+        else:
+            buffer.append(byte)
+            return None
+
+def _read_int(data: bytes, pos: int) -> tuple:
+    '''Returns number and position after it'''
+    number = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        number |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return (number >> 1) ^ -(number & 1), pos
+
+def encode(data: dict) -> str:
+    '''Packs button value and its ids to string, fields that are not provided must be at the end'''
+    code, fields = ACTION_CODES[data['value']]
+    buffer = bytearray([code])
+    for field in fields:
+        if field not in data:
+            break  # optional fields, e.g. carousel position
+        _write_int(buffer, int(data[field]))
+
+    encoded = PREFIX + base64.urlsafe_b64encode(bytes(buffer)).decode().rstrip('=')
+    if len(encoded) > MAX_LENGTH:
+        raise ValueError(f"Callback data of {data['value']} is longer than {MAX_LENGTH} bytes")
+    return encoded
+
+def decode(encoded: str) -> dict:
+    '''Unpacks string made by encode to dict with value and ids'''
+    if not encoded.startswith(PREFIX):
+        raise ValueError('Callback data is not encoded')
+    encoded = encoded[len(PREFIX):]
+    raw = base64.urlsafe_b64decode(encoded + '='*(-len(encoded) % 4))
+
+    value, fields = ACTIONS[raw[0]]
+    data = {'value': value}
+    pos = 1
+    for field in fields:
+        if pos >= len(raw):
+            break
+        number, pos = _read_int(raw, pos)
+        data[field] = bool(number) if field in BOOL_FIELDS else number
+    return data
+
+class CallbackCodecBot(ExtBot):
+    '''Bot that keeps callback data in buttons themselves, so keyboards don't take server memory and never expire'''
+
+    def _replace_keyboard(self, reply_markup):
+        if not isinstance(reply_markup, InlineKeyboardMarkup):
+            return reply_markup
+
+        return InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        button.text,
+                        callback_data=encode(button.callback_data)
+                    ) if isinstance(button.callback_data, dict) else button
+                    for button in row
+                ] for row in reply_markup.inline_keyboard
+            ]
+        )  # dict values are replaced with encoded strings
+
+    def _insert_callback_data(self, obj):
+        if isinstance(obj, CallbackQuery) and isinstance(obj.data, str):
+            try:
+                data = decode(obj.data)
+            except Exception:
+                data = InvalidCallbackData(obj.data)  # keyboard from older version of the bot
+            with obj._unfrozen():
+                obj.data = data
+        return obj
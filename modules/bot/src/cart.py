@@ -1,9 +1,16 @@
+import hashlib
+import secrets
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 from telegram import (InlineKeyboardButton, InlineKeyboardMarkup,
                       ReplyKeyboardMarkup, Update)
 from telegram.ext import ContextTypes
 
 from modules.bot import config as bc
-from modules.bot.src import lobby
+from modules.bot.src import error, lobby
+from modules.database import config as dbc
 from utils import text as ut
 
 
@@ -13,67 +20,165 @@ CART_KEYBOARD: list = [
     [txt_dct['back_to_menu'], txt_dct['place_order']]
 ]
 
-async def showCart(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    '''Replies with current cart'''
-    user = update.effective_user  # shortcut for user of update
-    
-    if (
-        not context.user_data.get('cart')  # if cart is not created
-        or context.user_data['cart']['dishes'] == {}  # if cart is empty
-    ):
-        await user.send_message(txt_dct['cart_is_empty'])
-        return None  # return None to not change the state
-
-    restaurant_name = context.user_data['cart']['restaurant_name']  # get selected restaurant_name
-    dishes = context.user_data['cart']['dishes']  # get dishes dictionary
-    currency = context.user_data['cart']['currency']  # get currency
+class CartLine:
+    '''Dish in cart, name is taken from database when cart is shown'''
+
+    __slots__ = ('dish_id', 'quantity', 'price')
+
+    def __init__(self, dish_id: int, quantity: int, price: float):
+        self.dish_id = dish_id
+        self.quantity = quantity
+        self.price = price  # price when dish was added, for cart total
+
+    @property
+    def cost(self) -> Decimal:
+        return Decimal(str(self.price)) * self.quantity  # same arithmetic as cart total
+
+class Cart:
+    '''Dishes of one restaurant selected by user, total is updated on every change'''
+
+    __slots__ = ('restaurant_id', 'lines', 'total', 'token')
+
+    def __init__(self):
+        self.restaurant_id: int = None
+        self.lines: dict = {}  # CartLine by dish id
+        self.total: Decimal = Decimal(0)  # exact sum of line costs, float prices are added as decimals
+        self.token: str = secrets.token_hex(8)  # tells this cart from earlier carts with same dishes
+
+    def __getstate__(self):
+        return self.restaurant_id, [(line.dish_id, line.quantity, line.price) for line in self.lines.values()], self.token  # compact state for persistence
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.restaurant_id = state[0]
+        if len(state) > 2:
+            self.token = state[2]
+        for dish_id, quantity, price in state[1]:
+            self.lines[dish_id] = CartLine(dish_id, quantity, price)
+            self.total += Decimal(str(price)) * quantity
+
+    def fingerprint(self) -> str:
+        '''Returns hash of cart contents, same until cart is changed'''
+        lines = ','.join(f"{line.dish_id}x{line.quantity}" for line in sorted(self.lines.values(), key=lambda line: line.dish_id))
+        return hashlib.sha1(f"{self.token}:{self.restaurant_id}:{lines}".encode()).hexdigest()
+
+    def get(self, dish_id: int) -> CartLine:
+        return self.lines.get(dish_id)
+
+    def set(self, dish_id: int, quantity: int, price: float, restaurant_id: int):
+        '''Sets quantity of dish, cart of another restaurant is emptied'''
+        if restaurant_id != self.restaurant_id:
+            self.clear()
+            self.restaurant_id = restaurant_id
+        self.remove(dish_id)
+        if quantity > 0:
+            self.lines[dish_id] = CartLine(dish_id, quantity, price)
+            self.total += Decimal(str(price)) * quantity
+        return None
+
+    def change_quantity(self, dish_id: int, quantity: int):
+        '''Changes quantity of dish that is in cart, 0 removes it'''
+        line = self.lines.get(dish_id)
+        if line is not None:
+            self.set(dish_id, quantity, line.price, self.restaurant_id)
+        return None
+
+    def remove(self, dish_id: int):
+        line = self.lines.pop(dish_id, None)
+        if line is not None:
+            self.total -= Decimal(str(line.price)) * line.quantity
+        return None
+
+    def clear(self):
+        self.lines.clear()
+        self.total = Decimal(0)
+        return None
+
+def get_cart(user_data: dict) -> Cart:
+    '''Returns cart of user, creates it if user has none'''
+    cart = user_data.get('cart')
+    if not isinstance(cart, Cart):  # carts saved by older versions are not kept
+        cart = user_data['cart'] = Cart()
+    return cart
+
+def get_names(cart: Cart) -> tuple:
+    '''Returns restaurant name, currency and dish names by id, dishes deleted from database are removed from cart
+
+    Cart is emptied if its restaurant was deleted.
+    '''
+    with Session(dbc.engine) as session:
+        restaurant = session.get(dbc.Restaurant, cart.restaurant_id)
+        if restaurant is None:
+            cart.clear()
+            return None, None, {}
+        dish_names = dict(
+            session.execute(
+                select(dbc.Dish.id, dbc.Dish.name)
+                    .where(dbc.Dish.id.in_(list(cart.lines)))
+            ).all()
+        )
+    for dish_id in [dish_id for dish_id in cart.lines if dish_id not in dish_names]:
+        cart.remove(dish_id)
+    return restaurant.name, restaurant.currency, dish_names
 
-    cart_sum = 0  # create cart price
+def format_cart(cart: Cart, restaurant_name: str, currency: str, dish_names: dict) -> str:
+    '''Returns cart text with line for every dish'''
     txt = (
         f"{txt_dct['cart']}\n\n"
         f"{restaurant_name}:\n"
     )  # create text for message
-    for dish_id in dishes:  # add line for each dish in cart
-        txt += (
-            f"{dishes[dish_id]['dish_name']} x{dishes[dish_id]['quantity']}: "
-            f"{dishes[dish_id]['dish_price']*dishes[dish_id]['quantity']} {currency}\n"
-        )
-        cart_sum += dishes[dish_id]['dish_price'] * dishes[dish_id]['quantity']  # add dish price to cart price
+    for line in cart.lines.values():  # add line for each dish in cart
+        txt += f"{dish_names[line.dish_id]} x{line.quantity}: {line.cost} {currency}\n"
+    return txt
 
-    txt += f"\n{cart_sum} {currency}"  # add last line with cart price
-    kbrd = ReplyKeyboardMarkup(CART_KEYBOARD, True)  # navigation keyboard
+async def showCart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Replies with current cart'''
+    user = update.effective_user  # shortcut for user of update
+    cart = get_cart(context.user_data)
 
-    await user.send_message(txt, reply_markup=kbrd)  # send message with cart
+    if cart.lines:
+        restaurant_name, currency, dish_names = get_names(cart)  # names are not kept in cart
+    if not cart.lines:  # if cart is empty or its dishes were deleted
+        await user.send_message(txt_dct['cart_is_empty'])
+        return None  # return None to not change the state
 
-    txt = txt_dct['select_dish_to_change']  # text for the change message
-    kbrd = InlineKeyboardMarkup(
+    txt = format_cart(cart, restaurant_name, currency, dish_names)
+    txt += f"\n{cart.total} {currency}"  # add last line with cart price
+    kbrd = ReplyKeyboardMarkup(CART_KEYBOARD, True)  # navigation keyboard
+
+    change_txt = txt_dct['select_dish_to_change']  # text for the change message
+    change_kbrd = InlineKeyboardMarkup(
         [
             [
-                InlineKeyboardButton(text=dishes[dish_id]['dish_name'], callback_data={
+                InlineKeyboardButton(text=dish_names[line.dish_id], callback_data={
                     'value': '-QUANTITY_CHANGE-',
-                    'dish_id': dish_id,
-                    'dish_name': dishes[dish_id]['dish_name'],
-                    'quantity': dishes[dish_id]['quantity']
+                    'dish_id': line.dish_id,
+                    'quantity': line.quantity
                 })
-            ] for dish_id in dishes
+            ] for line in cart.lines.values()
         ]
     )  # create Inline Keyboard for the change message
 
-    await user.send_message(txt, reply_markup=kbrd)  # send messge with cart customization
+    await user.send_message(txt, reply_markup=kbrd)  # send message with cart
+    await user.send_message(change_txt, reply_markup=change_kbrd)  # send messge with cart customization
 
     return bc.CART  # returning next state
 
 async def changeDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query  # shortcut for callback query
 
-    txt = f"{query.data['dish_name']} x{query.data['quantity']}"
+    cart = get_cart(context.user_data)
+    dish_names = get_names(cart)[2] if cart.get(query.data['dish_id']) else {}  # dish name is not kept in button
+    if query.data['dish_id'] not in dish_names:
+        return await error.invalidCallbackDataHandler(update, context)  # dish was removed from cart
+
+    txt = f"{dish_names[query.data['dish_id']]} x{query.data['quantity']}"
     kbrd = InlineKeyboardMarkup(
         [
             [
                 InlineKeyboardButton('-', callback_data={
                     'value': '-QUANTITY_MINUS-',
                     'dish_id': query.data['dish_id'],
-                    'dish_name': query.data['dish_name'],
                     'quantity': (
                         (query.data['quantity'] - 1) if query.data['quantity'] - 1 >= 0 else query.data['quantity']  # check lower boundary
                     )  # passing new value
@@ -81,7 +186,6 @@ async def changeDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 InlineKeyboardButton('+', callback_data={
                     'value': '-QUANTITY_PLUS-',
                     'dish_id': query.data['dish_id'],
-                    'dish_name': query.data['dish_name'],
                     'quantity': (
                         (query.data['quantity'] + 1) if query.data['quantity'] + 1 <= 60 else query.data['quantity']  # check upper boundary
                         )  # passing new value
@@ -91,7 +195,6 @@ async def changeDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 InlineKeyboardButton('OK', callback_data={
                     'value': '-QUANTITY_OK-',
                     'dish_id': query.data['dish_id'],
-                    'dish_name': query.data['dish_name'],
                     'quantity': query.data['quantity']
                 })
             ]
@@ -107,11 +210,7 @@ async def confirmChange(update: Update, context: ContextTypes.DEFAULT_TYPE):
     dish_id = query.data['dish_id']  # get dish id from callback data
     new_quantity = query.data['quantity']  # get new quantity from callback data
 
-    if new_quantity == 0:
-        context.user_data['cart']['dishes'].pop(dish_id)  # delete dish form cart if new quantity is 0
-
-    else:
-        context.user_data['cart']['dishes'][dish_id]['quantity'] = new_quantity  # set new quantity
+    get_cart(context.user_data).change_quantity(dish_id, new_quantity)  # dish is deleted from cart if new quantity is 0
 
     txt = txt_dct['cart_changed']  # text for edited message
     kbrd = None  # remove Inline Keyboard
@@ -124,9 +223,7 @@ async def confirmChange(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def emptyCart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message  # shortcut to use update message
 
-    context.user_data['cart'] = {
-        'dishes':{}
-    }  # set empty dictionary for cart
+    get_cart(context.user_data).clear()  # empty the cart
     txt = txt_dct['cart_is_empty']  # text for the message
     kbrd = ReplyKeyboardMarkup(lobby.LOBBY_KEYBOARD, True)  # lobby keyboard
 
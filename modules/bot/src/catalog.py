@@ -0,0 +1,95 @@
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from modules.database import config as dbc
+from utils import constants as uc
+
+
+# Snapshot of restaurants and dishes that is checked on every message and on checkout
+restaurants: dict = {}  # name, enabled and schedule {day_of_week: (start, end)} by restaurant id
+restaurant_ids: dict = {}  # restaurant id by name
+dishes: dict = {}  # restaurant id and enabled by dish id
+enabled_restaurants: set = set()  # names of enabled restaurants
+loaded: float = None  # monotonic time of loading, None until loaded
+version: int = None  # catalog version in database when snapshot was loaded
+checked: float = None  # monotonic time of last check of catalog version
+
+def get_version(session: Session) -> int:
+    '''Returns catalog version from database, 0 if database has no version yet'''
+    return session.scalar(select(dbc.CatalogVersion.version).where(dbc.CatalogVersion.id==1)) or 0
+
+def load_catalog():
+    '''Loads restaurants, their schedules and dishes from database'''
+    global restaurants, restaurant_ids, dishes, enabled_restaurants, loaded, version, checked
+
+    with Session(dbc.engine) as session:
+        new_version = get_version(session)  # read first, so change made during loading causes next reload
+        restaurant_rows = session.execute(
+            select(dbc.Restaurant.id, dbc.Restaurant.name, dbc.Restaurant.enabled)
+        ).all()
+        schedule_rows = session.execute(
+            select(dbc.RestaurantSchedule.restaurant_id, dbc.RestaurantSchedule.day_of_week, dbc.RestaurantSchedule.start, dbc.RestaurantSchedule.end)
+        ).all()
+        dish_rows = session.execute(
+            select(dbc.Dish.id, dbc.Dish.restaurant_id, dbc.Dish.enabled)
+        ).all()
+
+    new_restaurants = {
+        row.id: {'name': row.name, 'enabled': row.enabled, 'schedule': {}} for row in restaurant_rows
+    }
+    for row in schedule_rows:
+        new_restaurants[row.restaurant_id]['schedule'][row.day_of_week] = (row.start, row.end)
+
+    restaurants = new_restaurants  # replaced at once, so readers never see half loaded snapshot
+    restaurant_ids = {restaurant['name']: restaurant_id for restaurant_id, restaurant in restaurants.items()}
+    dishes = {row.id: (row.restaurant_id, row.enabled) for row in dish_rows}
+    enabled_restaurants = {restaurant['name'] for restaurant in restaurants.values() if restaurant['enabled']}
+    version = new_version
+    loaded = checked = time.monotonic()
+    return None
+
+def refresh_catalog():
+    '''Loads catalog again if it was changed on any worker or it is older than CATALOG_CACHE_TTL seconds
+
+    Version is checked at most every CATALOG_VERSION_INTERVAL seconds, so messages don't query database.
+    '''
+    global checked
+
+    now = time.monotonic()
+    if loaded is None or now - loaded > uc.CATALOG_CACHE_TTL:
+        load_catalog()
+    elif now - checked > uc.CATALOG_VERSION_INTERVAL:
+        checked = now
+        with Session(dbc.engine) as session:
+            changed = get_version(session) != version
+        if changed:
+            load_catalog()
+    return None
+
+def forget_catalog():
+    '''Makes catalog to be loaded on next use on every worker, called after manager changes restaurant or dish'''
+    global loaded
+
+    with Session(dbc.engine) as session:
+        session.execute(
+            update(dbc.CatalogVersion)
+                .where(dbc.CatalogVersion.id==1)
+                .values(version=dbc.CatalogVersion.version + 1)
+        )  # other workers see new version on next check
+        session.commit()
+    loaded = None
+    return None
+
+def get_enabled_restaurants() -> set:
+    '''Returns names of enabled restaurants'''
+    refresh_catalog()
+    return enabled_restaurants
+
+def get_restaurant(restaurant_name: str = None, restaurant_id: int = None) -> dict:
+    '''Returns restaurant from catalog by name or id, None if it doesn't exist'''
+    refresh_catalog()
+    if restaurant_id is None:
+        restaurant_id = restaurant_ids.get(restaurant_name)
+    return restaurants.get(restaurant_id)
@@ -0,0 +1,202 @@
+import datetime as dt
+import logging
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import ContextTypes, JobQueue
+
+from modules.bot.src import bulk_orders
+from modules.database import config as dbc
+from utils import constants as uc
+from utils import utility as uu
+
+
+logger = logging.getLogger(__name__)
+
+# Active orders shown in pinned dashboard message of notification chat, changed by order events instead of polling
+orders: dict = {}  # date, status, restaurant, total and currency by order id
+new_order_ids: set = set()  # orders created since last edit, loaded together by next edit
+loaded: bool = False  # orders are loaded from database once, then changed by events
+_scheduled: bool = False  # edit is scheduled, events until it runs are shown by one edit
+
+def dashboard_chat_id():
+    '''Returns chat of dashboard, default notification chat or developer in debug mode'''
+    chat_id = uc.DEVELOPER_ID if uc.DEBUG else uc.CHAT_ID
+    return int(chat_id) if chat_id else None  # ids from environment are strings
+
+def load_orders():
+    '''Loads all active orders from database'''
+    global orders, loaded
+
+    orders = {order.id: order._asdict() for order in bulk_orders.get_orders(bulk_orders.get_active_order_ids())}
+    new_order_ids.clear()
+    loaded = True
+    return None
+
+def schedule(job_queue: JobQueue):
+    '''Schedules dashboard edit in DASHBOARD_DEBOUNCE seconds, if it is not scheduled yet'''
+    global _scheduled
+
+    if not dashboard_chat_id() or _scheduled:
+        return None
+    _scheduled = True
+    job_queue.run_once(updateDashboard, uc.DASHBOARD_DEBOUNCE, name='dashboard')
+    return None
+
+def order_created(job_queue: JobQueue, order_id: int):
+    '''Adds new order to dashboard'''
+    new_order_ids.add(order_id)
+    schedule(job_queue)
+    return None
+
+def orders_changed(job_queue: JobQueue, order_ids: list, status_name: str):
+    '''Changes status of orders in dashboard, completed and cancelled orders are removed'''
+    for order_id in order_ids:
+        if status_name in uc.ORDER_STATUSES[-2:]:
+            orders.pop(order_id, None)
+            new_order_ids.discard(order_id)
+        elif order_id in orders:
+            orders[order_id]['status'] = status_name
+    schedule(job_queue)
+    return None
+
+def create_dashboard_text() -> str:
+    '''Returns text with active orders grouped by status, oldest first'''
+    txt = f"📋 Active orders: {len(orders)}\n"
+    shown = 0
+    for status_name in [name for name in uc.ORDER_STATUSES if name not in uc.ORDER_STATUSES[-2:]]:
+        status_orders = [order for order in orders.values() if order['status'] == status_name]
+        if not status_orders:
+            continue
+        txt += f"\n{status_name} ({len(status_orders)}):\n"
+        for order in sorted(status_orders, key=lambda order: order['id']):
+            if shown == uc.DASHBOARD_MAX_ORDERS:
+                break
+            txt += (
+                f"{order['id']} {order['date_ordered'].astimezone(uc.PLACE_TIMEZONE):%d.%m %H:%M} "
+                f"{order['restaurant']}, {order['total']} {order['currency']}\n"
+            )
+            shown += 1
+    if shown < len(orders):
+        txt += f"\n... and {len(orders) - shown} more, use /active_orders"
+    return txt
+
+def claim_message(chat_id: int, dashboard_msg: dbc.DashboardMessage) -> bool:
+    '''Claims sending of new dashboard message, so workers don't send one each, returns False if other worker sends it
+
+    Row is claimed if there is none, if its message was deleted or if worker that claimed it didn't send message in DASHBOARD_CLAIM_TIMEOUT seconds.
+    '''
+    now = uu.current_utc_time()
+    with Session(dbc.engine) as session:
+        if dashboard_msg is None:
+            session.add(dbc.DashboardMessage(chat_id=chat_id, date_claimed=now))
+            try:
+                session.commit()
+            except IntegrityError:
+                return False  # inserted by other worker
+            return True
+
+        claimed = session.scalar(
+            update(dbc.DashboardMessage)
+                .where(dbc.DashboardMessage.chat_id==chat_id)
+                .where(
+                    dbc.DashboardMessage.message_id==dashboard_msg.message_id if dashboard_msg.message_id is not None
+                    else dbc.DashboardMessage.message_id.is_(None)
+                        & (dbc.DashboardMessage.date_claimed<now - dt.timedelta(seconds=uc.DASHBOARD_CLAIM_TIMEOUT))
+                )  # row is not claimed by other worker meanwhile
+                .values(message_id=None, date_claimed=now)
+                .returning(dbc.DashboardMessage.chat_id)
+        )
+        session.commit()
+    return claimed is not None
+
+def release_claim(chat_id: int) -> None:
+    '''Removes claimed row of message that was not sent, so next edit claims it without waiting DASHBOARD_CLAIM_TIMEOUT'''
+    with Session(dbc.engine) as session:
+        session.execute(
+            delete(dbc.DashboardMessage)
+                .where(dbc.DashboardMessage.chat_id==chat_id)
+                .where(dbc.DashboardMessage.message_id.is_(None))
+        )
+        session.commit()
+    return None
+
+def save_message(chat_id: int, txt: str, message_id: int = None) -> None:
+    '''Saves shown text and id of new dashboard message'''
+    values = {'text': txt} if message_id is None else {'text': txt, 'message_id': message_id}
+    with Session(dbc.engine) as session:
+        session.execute(
+            update(dbc.DashboardMessage)
+                .where(dbc.DashboardMessage.chat_id==chat_id)
+                .values(**values)
+        )
+        session.commit()
+    return None
+
+def _failed(job_queue: JobQueue, chat_id: int, er: Exception):
+    '''Logs error of dashboard send or edit and schedules edit again, if error is not permanent'''
+    if isinstance(er, (BadRequest, Forbidden)):
+        logger.error('Dashboard was not shown in chat %s: %s', chat_id, er)  # shown again by next order event
+        return None
+    logger.warning('Dashboard was not shown in chat %s, retrying: %s', chat_id, er)  # e.g. RetryAfter or NetworkError
+    schedule(job_queue)
+    return None
+
+async def _send_dashboard(context: ContextTypes.DEFAULT_TYPE, chat_id: int, txt: str, dashboard_msg: dbc.DashboardMessage):
+    '''Sends and pins new dashboard message and saves its id, if no other worker does it'''
+    if not claim_message(chat_id, dashboard_msg):
+        schedule(context.job_queue)  # edited after other worker has sent message
+        return None
+
+    try:
+        new_msg = await context.bot.send_message(chat_id, txt, disable_notification=True)
+    except Exception as er:
+        release_claim(chat_id)
+        _failed(context.job_queue, chat_id, er)
+        return None
+    try:
+        await context.bot.pin_chat_message(chat_id, new_msg.message_id, disable_notification=True)
+    except Exception as er:
+        logger.warning('Dashboard was not pinned in chat %s: %s', chat_id, er)  # bot needs pin permission
+    save_message(chat_id, txt, new_msg.message_id)
+    return None
+
+async def updateDashboard(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that edits dashboard message once for all order events since previous edit'''
+    global _scheduled
+
+    _scheduled = False
+    if not loaded or uc.SHARD_ROLE == 'worker':
+        load_orders()  # every worker sees orders of its users only, so sharded dashboard is loaded whole
+    elif new_order_ids:
+        order_ids = list(new_order_ids)
+        new_order_ids.clear()
+        for order in bulk_orders.get_orders(order_ids):  # one query for burst of new orders
+            if order.status not in uc.ORDER_STATUSES[-2:]:
+                orders[order.id] = order._asdict()
+
+    txt = create_dashboard_text()
+    chat_id = dashboard_chat_id()
+    with Session(dbc.engine) as session:
+        dashboard_msg = session.get(dbc.DashboardMessage, chat_id)  # attributes stay loaded after session is closed
+    if dashboard_msg is not None and dashboard_msg.text == txt:
+        return None  # shown text is compared, it could be edited by other worker
+
+    if dashboard_msg is None or dashboard_msg.message_id is None:
+        await _send_dashboard(context, chat_id, txt, dashboard_msg)
+        return None
+
+    try:
+        await context.bot.edit_message_text(txt, chat_id=chat_id, message_id=dashboard_msg.message_id)
+    except BadRequest as er:
+        if 'not modified' not in str(er).lower():
+            logger.info('Dashboard %s was not edited, sending new one: %s', dashboard_msg.message_id, er)  # message was deleted
+            await _send_dashboard(context, chat_id, txt, dashboard_msg)
+            return None
+    except Exception as er:
+        _failed(context.job_queue, chat_id, er)
+        return None
+    save_message(chat_id, txt)
+    return None
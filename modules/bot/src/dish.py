@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
-from modules.bot.src import error, restaurant
+from modules.bot.src import cart, error, menu, restaurant
 from modules.database import config as dbc
 from utils import text as ut
 from utils import utility as uu
@@ -70,91 +70,120 @@ def create_quantity_keyboard(callback_data: dict, max_value: int):
     _kbrd = InlineKeyboardMarkup(_markup)
     return _kbrd
 
-def create_add_keyboard(restaurant_name: str, dish_id: int, dish_name: str, dish_price: float, currency: str):
-    '''Function to create add dish keyboard'''
+def create_add_keyboard(dish_id: int, position: dict = None):
+    '''Function to create add dish keyboard, position is passed for carousel message'''
     _kbrd = InlineKeyboardMarkup(
         [
             [InlineKeyboardButton('Add', callback_data={
                 'value': '-ADD-',
-                'restaurant_name': restaurant_name,
                 'dish_id': dish_id,
-                'dish_name': dish_name,
-                'dish_price': dish_price,
-                'currency' : currency
+                **(position or {})  # carousel position to restore navigation after quantity selection
             })]
         ]
     )
-    return _kbrd
+    return menu.add_navigation(_kbrd, '-MENU_PAGE-', position or {})
 
-def create_selected_dish_keyboard(restaurant_name: str, dish_id: int, dish_name: str, dish_price: float, quantity: int, currency: str):
-    '''Function to create keyboard for selected dish'''
+def create_selected_dish_keyboard(dish_id: int, dish_price: float, quantity: int, currency: str, position: dict = None):
+    '''Function to create keyboard for selected dish, position is passed for carousel message'''
     _kbrd = InlineKeyboardMarkup(
         [
             [InlineKeyboardButton(f"✅ {quantity*dish_price} (x{quantity}) {currency}", callback_data={
                 'value': '-CHANGE-',
-                'restaurant_name': restaurant_name,
                 'dish_id': dish_id,
-                'dish_name': dish_name,
-                'dish_price': dish_price,
-                'currency' : currency
+                **(position or {})  # carousel position to restore navigation after quantity selection
             })]
         ]
     )
-    return _kbrd
+    return menu.add_navigation(_kbrd, '-MENU_PAGE-', position or {})
 
-async def showDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = update.message  # shortcut to use update message
+def create_dish_keyboard(context: ContextTypes.DEFAULT_TYPE, dish, position: dict, restaurant_works: bool):
+    '''Returns keyboard for dish message, dish that is already in the cart is shown selected'''
+    if not restaurant_works:  # dishes can't be added, only navigation is left
+        return menu.add_navigation(None, '-MENU_PAGE-', position)
 
-    if msg.text not in context.user_data['dish_categories']:  # filter text here, because filters module doesn't have access to context
-        return error.messageHandler(update, context)
-    
+    cart_line = cart.get_cart(context.user_data).get(dish.id)  # dish ids are unique across restaurants
+    if cart_line:
+        return create_selected_dish_keyboard(
+            dish.id,
+            dish.price,
+            cart_line.quantity,
+            dish.currency,
+            position
+        )
+    return create_add_keyboard(dish.id, position)
+
+def get_dishes(restaurant_name: str, category: str = None, category_id: int = None) -> list:
+    '''Returns enabled dishes of restaurant category, selected by category name or id'''
     with Session(dbc.engine) as session:
         stmt = (
-            select(dbc.Dish.id, dbc.Dish.name, dbc.Dish.file_id, dbc.Dish.price, dbc.Dish.description, dbc.Restaurant.currency)
+            select(dbc.Dish.id, dbc.Dish.name, dbc.Dish.file_id, dbc.Dish.price, dbc.Dish.description, dbc.Restaurant.currency, dbc.Dish.dish_category_id)
                 .join(dbc.Dish.restaurant)
                 .join(dbc.Dish.dish_category)
                 .where(dbc.Dish.enabled==True)
-                .where(dbc.Restaurant.name==context.user_data['restaurant_name'])
-                .where(dbc.DishCategory.name==msg.text)
+                .where(dbc.Restaurant.name==restaurant_name)
+                .where(dbc.DishCategory.name==category if category_id is None else dbc.DishCategory.id==category_id)
                 .order_by(dbc.Dish.name)
         )
-        dishes = session.execute(stmt).all()  # getting all dishes by selected restaurant and category
+        return session.execute(stmt).all()  # getting all dishes by selected restaurant and category
+
+def get_dish(dish_id: int):
+    '''Returns dish name, price, currency and restaurant by id, None if dish doesn't exist'''
+    with Session(dbc.engine) as session:
+        stmt = (
+            select(dbc.Dish.id, dbc.Dish.name, dbc.Dish.price, dbc.Dish.restaurant_id, dbc.Restaurant.currency, dbc.Restaurant.name.label('restaurant_name'))
+                .join(dbc.Dish.restaurant)
+                .where(dbc.Dish.id==dish_id)
+        )
+        return session.execute(stmt).first()
+
+async def showDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message  # shortcut to use update message
+
+    if msg.text not in context.user_data['dish_categories']:  # filter text here, because filters module doesn't have access to context
+        return await error.messageHandler(update, context)
     
+    dishes = get_dishes(context.user_data['restaurant_name'], category=msg.text)  # getting all dishes by selected restaurant and category
+
     restaurant_works = await restaurant.isRestaurantWorking(
         restaurant_name=context.user_data['restaurant_name']
     )
 
-    for dish in dishes:  # for every dish send message with it
-        kbrd = create_add_keyboard(
-            context.user_data['restaurant_name'],
-            dish.id,
-            dish.name,
-            dish.price,
-            dish.currency
-        ) if restaurant_works else None  # creating keyboard for the message, checking restaurant schedule
-
-        txt = (
-            f"{dish.name}\n\n"
-            f"{dish.description}\n\n"
-            f"Price: {dish.price} {dish.currency}"
-        )  # text for the message
-        
-        if dish.file_id:
-            await msg.reply_photo(photo=dish.file_id, caption=txt, reply_markup=kbrd, disable_notification=True)  # send photo with caption if dish has file_id
-        else:
-            await msg.reply_text(txt, reply_markup=kbrd, disable_notification=True)  # send text message file_id is None
+    await menu.sendDishes(
+        context.bot,
+        msg.chat_id,
+        dishes,
+        lambda dish, position: create_dish_keyboard(context, dish, position, restaurant_works)
+    )  # carousel or messages, depending on MENU_MODE
     return None  # returning None to not change the state
 
+async def changeMenuPage(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Handles pressed -MENU_PAGE- button in dish carousel'''
+    query = update.callback_query  # shortcut for callback query
+
+    dishes = get_dishes(context.user_data['restaurant_name'], category_id=query.data['category_id'])  # dishes could be changed since message was sent
+    restaurant_works = await restaurant.isRestaurantWorking(
+        restaurant_name=context.user_data['restaurant_name']
+    )
+
+    await menu.changePage(
+        query,
+        dishes,
+        lambda dish, position: create_dish_keyboard(context, dish, position, restaurant_works)
+    )
+    return None  # return None to not change the state
+
 async def showQuantityButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Handles pressed -ADD- and -CHANGE- button'''
     query = update.callback_query  # shortcut for callback query
+    dish = get_dish(query.data['dish_id'])  # names and prices are taken from database
 
+    if dish is None:
+        return await error.invalidCallbackDataHandler(update, context)  # dish was deleted
+
+    user_cart = cart.get_cart(context.user_data)
     if (
-        context.user_data['cart'].get('restaurant_name')
-        and (
-            query.data['restaurant_name'] != context.user_data['cart']['restaurant_name']
-            and context.user_data['cart']['dishes'] != {}
-        )  # user can proceed of he emptied his cart by himself (another restaurant_name still in the cart)
+        user_cart.lines  # user can proceed if they emptied the cart by themselves
+        and dish.restaurant_id != user_cart.restaurant_id
     ):  # if user switched restaurants with not empty cart
         txt = txt_dct['cart_another_restaurant']  # create message text
         kbrd = InlineKeyboardMarkup(
@@ -172,11 +201,8 @@ async def showQuantityButton(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return None  # returning None to not change the state
 
     callback_data = {
-        'restaurant_name': query.data['restaurant_name'],
-        'dish_id': query.data['dish_id'],
-        'dish_name': query.data['dish_name'],
-        'dish_price': query.data['dish_price'],
-        'currency': query.data['currency']
+        'dish_id': dish.id,
+        **menu.page_data(query.data)  # carousel position
     }  # callback query data that will be present in each button
 
     kbrd = create_quantity_keyboard(
@@ -200,17 +226,11 @@ async def cancelDishButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Handles pressed -CANCEL- button in dish quantity'''
     query = update.callback_query  # shortcut for callback query
 
-    (
-        context.user_data['cart']['dishes'].get(query.data['dish_id'])
-        and context.user_data['cart']['dishes'].pop(query.data['dish_id'])
-    )  # pop dish id from cart if exists
+    cart.get_cart(context.user_data).remove(query.data['dish_id'])  # remove dish from cart if exists
 
     kbrd = create_add_keyboard(
-        query.data['restaurant_name'],
         query.data['dish_id'],
-        query.data['dish_name'],
-        query.data['dish_price'],
-        query.data['currency']
+        menu.page_data(query.data)
     )  # create keyboard for the message
     await query.answer()  # answer the query
     if query.message.text:
@@ -230,11 +250,8 @@ async def changeQuantityPage(update: Update, context: ContextTypes.DEFAULT_TYPE)
     max_value = query.data['max_value']  # get max quantity in keyboard
 
     callback_data = {
-        'restaurant_name': query.data['restaurant_name'],
         'dish_id': query.data['dish_id'],
-        'dish_name': query.data['dish_name'],
-        'dish_price': query.data['dish_price'],
-        'currency': query.data['currency']
+        **menu.page_data(query.data)  # carousel position
     }  # callback query data that will be present in each button
     max_value += 6 - 12 * is_back  # maximum value for quantity selection
 
@@ -252,29 +269,20 @@ async def selectQuantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     query = update.callback_query  # shortcut for callback query
 
-    restaurant_name = query.data['restaurant_name']  # get selected restaurant_name
-    dish_id = query.data['dish_id']  # get dish id
-    dish_name = query.data['dish_name']  # get dish name
-    dish_price = query.data['dish_price']  # get dish price
+    dish = get_dish(query.data['dish_id'])  # names and prices are taken from database
     quantity = query.data['quantity']  # get selected quantity
-    currency = query.data['currency']  # get currency
 
-    context.user_data['cart']['restaurant_name'] = restaurant_name  # set restaurant name
-    context.user_data['cart']['currency'] = currency  # set currency
+    if dish is None:
+        return await error.invalidCallbackDataHandler(update, context)  # dish was deleted
 
-    context.user_data['cart']['dishes'][dish_id] = {
-        'dish_name': dish_name,
-        'dish_price': dish_price,
-        'quantity': quantity
-    }  # set selected dish data
+    cart.get_cart(context.user_data).set(dish.id, quantity, dish.price, dish.restaurant_id)  # set selected dish
 
     kbrd = create_selected_dish_keyboard(
-        restaurant_name,
-        dish_id,
-        dish_name,
-        dish_price,
+        dish.id,
+        dish.price,
         quantity,
-        currency
+        dish.currency,
+        menu.page_data(query.data)
     )  # create keyboard for the message
 
     await query.answer()  # answer the query
@@ -291,9 +299,7 @@ async def emptyCart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Empties the cart'''
     query = update.callback_query  # shortcut for callback query
 
-    context.user_data['cart'] = {
-        'dishes':{}
-    }  # set empty dictionary for cart
+    cart.get_cart(context.user_data).clear()  # empty the cart
 
     txt = txt_dct['cart_is_empty']  # text for the message
     kbrd = None  # delete keyboard
@@ -1,17 +1,20 @@
-import html
+import hashlib
 import json
 import logging
 import traceback
 
 from telegram import Update
-from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
 from utils import constants as uc
 from utils import text as ut
+from utils import utility as uu
 
 
+logger = logging.getLogger(__name__)
 txt_dct = ut.messages  # dictionary of message texts
+error_reports: dict = {}  # summary, count since last digest and time seen for every error fingerprint
+new_reports_sent: int = 0  # documents with new errors sent since last digest
 
 async def messageHandler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message  # shortcut to use update message
@@ -33,49 +36,93 @@ async def uncatchedCallbackHandler(update: Update, context: ContextTypes.DEFAULT
     await query.answer(txt_dct['uncatched_callback'], True)  # Notify user
     return None  # not changing state
 
+def error_fingerprint(er: BaseException) -> str:
+    '''Returns short hash of exception type and traceback frames, same for repeated errors'''
+    frames = traceback.extract_tb(er.__traceback__)
+    key = type(er).__qualname__ + ''.join(
+        f"|{frame.filename}:{frame.name}:{frame.lineno}" for frame in frames
+    )  # exception message is left out, it often contains changing values
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+def _forget_old_reports():
+    '''Keeps ERROR_REPORTS_KEPT reports that were seen last'''
+    if len(error_reports) <= uc.ERROR_REPORTS_KEPT:
+        return None
+    by_last_seen = sorted(error_reports, key=lambda fingerprint: error_reports[fingerprint]['last_seen'])
+    for fingerprint in by_last_seen[:len(error_reports) - uc.ERROR_REPORTS_KEPT]:
+        error_reports.pop(fingerprint)
+    return None
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Log the error and send a telegram message to notify the developer."""
+    """Log the error and notify the developer of the first occurrence, repeated errors are counted for digest."""
+    global new_reports_sent
+
     # Log the error before we do anything else, so we can see it even if something breaks.
-    logger = logging.getLogger(__name__)
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
+    fingerprint = error_fingerprint(context.error)
+    summary = f"{type(context.error).__name__}: {context.error}"  # one line description of the error
+    now = uu.current_utc_time()
+
+    report = error_reports.get(fingerprint)
+    if report is not None:
+        report['count'] += 1  # reported in next digest
+        report['last_seen'] = now
+        return None
+
+    send_now = new_reports_sent < uc.ERROR_NEW_REPORTS_LIMIT  # too many new errors are left for digest
+    error_reports[fingerprint] = {
+        'summary': summary,
+        'count': 0 if send_now else 1,  # occurrences since last digest, first one is sent right away
+        'first_seen': now,
+        'last_seen': now,
+    }
+    _forget_old_reports()
+    if not send_now:
+        return None
+    new_reports_sent += 1
+
     # traceback.format_exception returns the usual python message about an exception, but as a
     # list of strings rather than a single string, so we have to join them together.
     tb_list = traceback.format_exception(None, context.error, context.error.__traceback__)
     tb_string = "".join(tb_list)
 
-    # Build the message with some markup and additional information about what happened.
-    # You might need to add some logic to deal with messages longer than the 4096 character limit.
+    # Whole report is sent as one document, so its length is not limited by message size
     update_str = update.to_dict() if isinstance(update, Update) else str(update)
-    message = (
+    document = (
         f"An exception was raised while handling an update\n"
-        f"<pre>update = {html.escape(json.dumps(update_str, indent=2, ensure_ascii=False))}"
-        "</pre>\n\n"
-    )
-    await context.bot.send_message(
-        chat_id=uc.DEVELOPER_ID, text=message, parse_mode=ParseMode.HTML
-    )
-
-    message = (
-        f"Chat data\n"
-        f"<pre>context.chat_data = {html.escape(str(context.chat_data))}</pre>\n\n"
+        f"update = {json.dumps(update_str, indent=2, ensure_ascii=False)}\n\n"
+        f"context.chat_data = {context.chat_data}\n\n"
+        f"context.user_data = {context.user_data}\n\n"
+        f"{tb_string}"
     )
-    await context.bot.send_message(
-        chat_id=uc.DEVELOPER_ID, text=message, parse_mode=ParseMode.HTML
-    )
-
-    message = (
-        f"User data\n"
-        f"<pre>context.user_data = {html.escape(str(context.user_data))}</pre>\n\n"
-    )
-    await context.bot.send_message(
-        chat_id=uc.DEVELOPER_ID, text=message, parse_mode=ParseMode.HTML
-    )
-
-    message = (
-        f"Traceback\n"
-        f"<pre>{html.escape(tb_string)}</pre>"
+    await context.bot.send_document(
+        chat_id=uc.DEVELOPER_ID,
+        document=document.encode(),
+        filename=f"error-{fingerprint}.txt",
+        caption=f"New error {fingerprint}\n{summary}"[:1024]  # caption length limit
     )
-    await context.bot.send_message(
-        chat_id=uc.DEVELOPER_ID, text=message, parse_mode=ParseMode.HTML
-    )
\ No newline at end of file
+    return None
+
+async def sendErrorDigest(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that sends one message with counts of repeated errors since last digest'''
+    global new_reports_sent
+
+    new_reports_sent = 0  # new errors can be sent again
+    repeated = [(fingerprint, report) for fingerprint, report in error_reports.items() if report['count']]
+    if not repeated:
+        return None
+
+    repeated.sort(key=lambda item: item[1]['count'], reverse=True)  # most frequent errors first
+    txt = 'Repeated errors:\n'
+    for fingerprint, report in repeated:
+        line = f"\n{fingerprint} x{report['count']}: {report['summary']}"[:200]  # short line for every error
+        if len(txt) + len(line) > 4000:  # message length limit
+            txt += '\n...'
+            break
+        txt += line
+    for _, report in repeated:
+        report['count'] = 0  # start new digest period
+
+    await context.bot.send_message(chat_id=uc.DEVELOPER_ID, text=txt)
+    return None
@@ -0,0 +1,250 @@
+import asyncio
+import itertools
+import threading
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from modules.database import config as dbc
+from utils import constants as uc
+from utils import export as ue
+from utils import table as utb
+
+
+orders_export_header = ['Order Number', 'Date', 'Status', 'Total Price', 'Currency']  # header for orders export
+users_export_header = [name for name, _ in utb.USERS_LIST_COLUMNS]  # header for users export
+
+export_jobs: dict = {}  # queued and running export jobs by job id
+_job_ids = itertools.count(1)  # generator of export job ids
+_semaphore = None  # limits number of exports running at once, created in the event loop
+
+class ExportCancelled(Exception):
+    '''Raised in export thread when manager cancelled the export'''
+
+def orders_export_rows(result):
+    '''Yields rows for orders export from database result'''
+    for order in result:
+        order_date = order[1].astimezone(uc.PLACE_TIMEZONE)  # convert timezone from UTC to local
+        yield [
+            order[0],  # order id
+            f"{order_date:%Y-%m-%d %H:%M}",  # date and time
+            order[2],  # status name
+            order[3],  # total price
+            order[4],  # currency
+        ]
+
+def users_export_rows(result):
+    '''Yields rows for users export from database result'''
+    for user in result:
+        yield [
+            user.id,
+            user.username,
+            user.first_name,
+            user.last_name,
+            user.admin,
+            user.manager,
+            f"{user.date_registered.astimezone(uc.PLACE_TIMEZONE):%Y-%m-%d %H:%M:%S}",  # date registered
+        ]
+
+def orders_export_stmt(quantity: int):
+    '''Returns statement for last orders export'''
+    return (
+        select(
+            dbc.Order.id,
+            dbc.Order.date_ordered,
+            dbc.Status.name,
+            func.sum(dbc.Dish.price*dbc.CartDish.quantity),  # cart total price
+            dbc.Restaurant.currency
+        )
+            .join(dbc.Order.status)
+            .join(dbc.Order.cart_dish)
+            .join(dbc.CartDish.dish)
+            .join(dbc.Dish.restaurant)
+            .group_by(
+                dbc.Order.id,
+                dbc.Status.name,
+                dbc.Restaurant.currency
+            )
+            .order_by(dbc.Order.date_ordered.desc())  # order orders descending
+            .limit(quantity)
+            .execution_options(yield_per=uc.EXPORT_YIELD_PER)  # server-side cursor, rows are fetched in batches
+    )
+
+def users_export_stmt(quantity: int):
+    '''Returns statement for last users export'''
+    return (
+        select(
+            dbc.User.id,
+            dbc.User.username,
+            dbc.User.first_name,
+            dbc.User.last_name,
+            dbc.User.admin,
+            dbc.User.manager,
+            dbc.User.date_registered
+        )
+            .order_by(dbc.User.date_registered.desc())
+            .limit(quantity)
+            .execution_options(yield_per=uc.EXPORT_YIELD_PER)  # server-side cursor, rows are fetched in batches
+    )
+
+EXPORTS: dict = {
+    'orders': (orders_export_header, orders_export_stmt, orders_export_rows),
+    'users': (users_export_header, users_export_stmt, users_export_rows),
+}  # header, statement and rows of every export kind
+
+def _tracked(rows, job: dict):
+    '''Counts exported rows and stops export if it was cancelled'''
+    for row in rows:
+        if job['cancel'].is_set():
+            raise ExportCancelled()
+        job['rows'] += 1
+        yield row
+
+def build_export(job: dict):
+    '''Writes export to the file, returns None if there are no rows. Blocking, runs in a thread'''
+    header, stmt, export_rows = EXPORTS[job['kind']]
+
+    with Session(dbc.engine) as session:
+        rows = _tracked(export_rows(session.execute(stmt(job['quantity']))), job)  # rows are formatted while fetched
+        first_row = next(rows, None)
+
+        if first_row is None:
+            return None
+
+        return ue.write_export(header, itertools.chain([first_row], rows), job['format'])
+
+def create_cancel_keyboard(job_id: int):
+    '''Returns keyboard with cancel button for export status message'''
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton('Cancel', callback_data={
+                    'value': '-CANCEL_EXPORT-',
+                    'job_id': job_id
+                })
+            ]
+        ]
+    )
+
+def cancelled_status(job: dict) -> str:
+    '''Returns text of status message of cancelled export'''
+    return f"Export of last {job['quantity']} {job['kind']} is cancelled"
+
+async def _edit_status(context: ContextTypes.DEFAULT_TYPE, job: dict, txt: str, kbrd: InlineKeyboardMarkup = None):
+    '''Edits export status message if its text has changed'''
+    if job['status'] == txt:
+        return None  # telegram doesn't allow editing message with same text
+
+    job['status'] = txt
+    await context.bot.edit_message_text(
+        txt,
+        chat_id=job['chat_id'],
+        message_id=job['message_id'],
+        reply_markup=kbrd
+    )  # edit status message
+    return None
+
+async def enqueueExport(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str, quantity: int, export_format: str):
+    '''Sends export status message and schedules export job'''
+    u_usr = update.effective_user  # user from update
+    job_id = next(_job_ids)  # id of the new job
+
+    txt = f"Export of last {quantity} {kind} is queued"  # text for status message
+    status_msg = await u_usr.send_message(txt, reply_markup=create_cancel_keyboard(job_id))  # send status message
+
+    export_jobs[job_id] = {
+        'kind': kind,
+        'quantity': quantity,
+        'format': export_format,
+        'user_id': u_usr.id,
+        'chat_id': status_msg.chat_id,
+        'message_id': status_msg.message_id,
+        'status': txt,
+        'rows': 0,
+        'cancel': threading.Event(),
+    }  # save job data
+    context.job_queue.run_once(runExport, 0, data=job_id, name=f"export-{job_id}")  # run as soon as possible
+
+    return None
+
+async def runExport(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that builds export in a thread and delivers file to manager'''
+    global _semaphore
+
+    job_id = context.job.data  # id of export job
+    job = export_jobs[job_id]
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(uc.EXPORT_JOBS_LIMIT)
+
+    try:
+        async with _semaphore:
+            if job['cancel'].is_set():
+                return None  # cancelled while queued
+
+            kbrd = create_cancel_keyboard(job_id)
+            task = asyncio.ensure_future(asyncio.to_thread(build_export, job))  # blocking work is done outside of event loop
+            while not task.done():
+                await asyncio.wait({task}, timeout=uc.EXPORT_PROGRESS_INTERVAL)
+                if task.done() or job['cancel'].is_set():
+                    continue  # status message is edited by cancel button
+                await _edit_status(context, job, f"Exporting last {job['quantity']} {job['kind']}: {job['rows']} rows", kbrd)
+                if job['cancel'].is_set():  # cancelled while progress was being edited, it could overwrite cancel status
+                    job['status'] = None
+                    try:
+                        await _edit_status(context, job, cancelled_status(job))
+                    except BadRequest:
+                        pass  # cancel status was shown last
+
+            try:
+                tmp_file = task.result()
+            except ExportCancelled:
+                return None  # status message is edited by cancel button
+
+            if job['cancel'].is_set():
+                if tmp_file is not None:
+                    tmp_file.close()
+                return None  # cancelled after the last row
+
+            if tmp_file is None:
+                await _edit_status(context, job, f"{job['kind'].capitalize()} list is empty")
+                return None
+
+            with tmp_file:
+                await context.bot.send_document(
+                    job['chat_id'],
+                    tmp_file,
+                    caption=f"Last {job['quantity']} {job['kind']}",
+                    filename=ue.export_filename(job['kind'], job['format'])
+                )  # deliver file
+            await _edit_status(context, job, f"Export of last {job['quantity']} {job['kind']} is done: {job['rows']} rows")
+
+    except Exception as er:
+        await _edit_status(context, job, f"Export of last {job['quantity']} {job['kind']} failed\nError: {er}")
+        raise
+
+    finally:
+        export_jobs.pop(job_id, None)  # forget finished job
+
+    return None
+
+async def cancelExportButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Cancels queued or running export'''
+    query = update.callback_query  # shortcut for callback query
+    job = export_jobs.get(query.data['job_id'])  # get job data
+
+    if job is None:
+        await query.answer('Export is already finished', show_alert=True)
+        await query.edit_message_reply_markup(None)  # delete keyboard
+        return None
+
+    if job['user_id'] != update.effective_user.id:
+        await query.answer('Only manager who started export can cancel it', show_alert=True)
+        return None
+
+    job['cancel'].set()  # export thread will stop on next row
+    await query.answer()
+    await _edit_status(context, job, cancelled_status(job))
+    return None
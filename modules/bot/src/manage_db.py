@@ -1,7 +1,6 @@
+import asyncio
 import datetime as dt
-import tempfile
 
-import tabulate
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from telegram import (InlineKeyboardButton, InlineKeyboardMarkup,
@@ -9,15 +8,17 @@ from telegram import (InlineKeyboardButton, InlineKeyboardMarkup,
 from telegram.ext import ContextTypes
 
 from modules.bot import config as bc
-from modules.bot.src import error, user_orders
+from modules.bot.src import (availability, bulk_orders, catalog, dashboard,
+                             error, export, menu, menu_import,
+                             notification, user_orders)
 from modules.database import config as dbc
 from utils import constants as uc
+from utils import export as ue
+from utils import menu_import as umi
+from utils import table as utb
 from utils import text as ut
 
 
-users_list_header = ['ID', 'Username', 'First Name', 'Last Name', 'Admin', 'Manager', 'Date Registered']  # header for users list
-single_ordr_hdr = ['Name', 'Quantity', 'Price']  # create header for the table with one order description
-many_ordrs_hdr = ['Order Number', 'Date', 'Status', 'Total Price']  # create header for the table with many orders
 txt_dct = ut.messages  # dictionary of message texts
 
 async def findOrder(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -53,27 +54,11 @@ async def findOrder(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             txt = str(order.id)  # caption for message
 
-            order_dishes = []  # create list for dishes in order
-            total_price = 0  # total price of the order
-            for cart_dish in order.cart_dish:
-                order_dishes.append(
-                    [cart_dish.dish.name, cart_dish.quantity, f"{cart_dish.dish.price} {restaurant.currency}"]
-                )
-                total_price += cart_dish.dish.price*cart_dish.quantity  # add price to total
-            
-            order_dishes.append(
-                ['Total', None, f"{total_price} {restaurant.currency}"]  # add total price to list
-            )
-
-            table = tabulate.tabulate(order_dishes, headers=single_ordr_hdr)  # create beautiful table for order
-            order_date = order.date_ordered.astimezone(uc.PLACE_TIMEZONE)  # convert timezone from UTC to local
-            table += (
-                f"\n\nOrder Number: {order.id}\n"
-                f"Restaurant: {restaurant.name}\n"
-                f"Status: {order.status.name}\n"
-                f"Order Date: {order_date.hour:02}:{order_date.minute:02} "
-                f"{order_date.day:02}.{order_date.month:02}.{order_date.year:04}"
-            )  # add bottom information to the table
+            table = utb.format_order_table(
+                [(cart_dish.dish.name, cart_dish.quantity, cart_dish.dish.price) for cart_dish in order.cart_dish],
+                restaurant.currency
+            )  # create beautiful table for order
+            table += utb.format_order_footer(order.id, restaurant.name, order.status.name, order.date_ordered)  # add bottom information to the table
 
             table_bytes = user_orders.create_image(table)  # create image in bytes
 
@@ -95,12 +80,10 @@ async def findOrder(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )  # inline keyboard
             
             await u_usr.send_photo(table_bytes, caption=txt, reply_markup=kbrd)  # send message with photo
-
-            kbrd = ReplyKeyboardMarkup([[f"/user {order.user_id}"]], True)  # text keyboard
             await u_usr.send_location(
                 latitude=location[0],
                 longitude=location[1],
-                reply_markup=kbrd
+                reply_markup=ReplyKeyboardMarkup([[f"/user {order.user_id}"]], True)  # text keyboard
             )  # send delivery location
     
             # Session now may be closed
@@ -116,7 +99,7 @@ async def findOrder(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return bc.M_ORDER  # return next state for conversation handler
 
 async def showOrders(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    '''Sends user file with last orders, quantity provided as argument'''
+    '''Queues export of last orders, quantity provided as argument'''
     u_usr = update.effective_user  # user from update
 
     with Session(dbc.engine) as session:
@@ -136,53 +119,42 @@ async def showOrders(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         try:
             quantity = int(context.args[0])  # get quantity from message
+            export_format = context.args[1].lower() if len(context.args) > 1 else 'csv'  # get export format from message
+            assert export_format in ue.EXPORT_FORMATS, f"available formats: {', '.join(ue.EXPORT_FORMATS)}"
         except Exception as er:
-            await u_usr.send_message(f"Error: {er}\nTry: /orders 10")
+            await u_usr.send_message(f"Error: {er}\nTry: /orders 10 or /orders 10 gz")
             return None  # not changing state
 
-        stmt = (
-            select(
-                dbc.Order.id,
-                dbc.Order.date_ordered,
-                dbc.Status.name,
-                func.sum(dbc.Dish.price*dbc.CartDish.quantity),  # cart total price
-                dbc.Restaurant.currency
-            )
-                .join(dbc.Order.status)
-                .join(dbc.Order.cart_dish)
-                .join(dbc.CartDish.dish)
-                .join(dbc.Dish.restaurant)
-                .group_by(
-                    dbc.Order.id,
-                    dbc.Status.name,
-                    dbc.Restaurant.currency
+        return await export.enqueueExport(update, context, 'orders', quantity, export_format)  # export is delivered by job
+
+async def showActiveOrders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Sends list of active orders, where several orders can be selected and completed or cancelled at once'''
+    msg = update.message  # shortcut for message
+    u_usr = update.effective_user  # user from update
+
+    with Session(dbc.engine) as session:
+        # ---------- CHECKING IF UPDATE USER IS MANAGER ----------
+        user_manager = session.scalar(
+            select(dbc.User)
+                .where(
+                    (dbc.User.id==u_usr.id)
+                    & (dbc.User.manager==True)
                 )
-                .order_by(dbc.Order.date_ordered.desc())  # order orders descending
-                .limit(quantity)
         )
-        orders = session.execute(stmt).all()
 
-        orders_list = []  # create list for all orders
-        for order in orders:
-            order_date = order[1].astimezone(uc.PLACE_TIMEZONE)  # convert timezone from UTC to local
-            orders_list.append(
-                [
-                    f"{order[0]:02}",  # order id
-                    f"{order_date.hour:02}:{order_date.minute:02} {order_date.day:02}.{order_date.month:02}.{order_date.year:04}",  # time and date
-                    order[2],  # status name
-                    f"{order[3]} {order[4]}"  # total price
-                ]
-            )
-        if orders_list:
-            table = tabulate.tabulate(orders_list, headers=many_ordrs_hdr)  # create beautiful table for orders
-            tmp_file = tempfile.NamedTemporaryFile(suffix='.txt')  # create temporary file to be sent
-            tmp_file.write(table.encode('utf-8'))  # add table to the file
-            tmp_file.seek(0)
+        if not user_manager:
+            await msg.reply_text('You are not manager')  # notify of prohibited action
+            return bc.END  # end conversation
+        # ---------- END OF CHECKING IF UPDATE USER IS MANAGER ----------
 
-            await u_usr.send_document(tmp_file, f'Last {quantity} orders')  # send file
-        else:
-            await u_usr.send_message('Orders list is empty')
-    return None  # not changing state
+    context.user_data.clear()  # clear manager's dictionary
+    context.user_data['manage'] = {
+        'selected_orders': set()  # ids of selected orders
+    }
+
+    txt, kbrd = bulk_orders.create_order_list(context.user_data['manage']['selected_orders'], 0)
+    await msg.reply_text(txt, reply_markup=kbrd)  # send message with order list
+    return bc.M_ORDERS  # next state for conversation handler
 
 async def showStatuses(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Edits message keyboard to show available statuses for order'''
@@ -234,11 +206,15 @@ async def setStatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
         order = session.scalar(select(dbc.Order).where(dbc.Order.id==order_id))  # get order
         order.status_id = status_id  # set new status
         order.manager_id = u_usr.id  # update manager for order
+        if status_id in bulk_orders.final_status_ids():
+            notification.pop_request_messages(session, [order_id])  # closed order is not answered in notification chats
 
         session.commit()  # save changes
 
         new_status_name = order.status.name  # get new status name
         user_id = order.user_id # get user
+
+    dashboard.orders_changed(context.job_queue, [order_id], new_status_name)
     
     kbrd = InlineKeyboardMarkup(
         [
@@ -352,7 +328,7 @@ async def findUser(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return bc.M_USER  # return state for conversation handler
 
 async def lastUsers(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    '''Shows last users, quantity provided as argument'''
+    '''Queues export of last users, quantity provided as argument'''
     u_usr = update.effective_user  # user from update
     
     with Session(dbc.engine) as session:
@@ -372,40 +348,14 @@ async def lastUsers(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         try:
             quantity = int(context.args[0])  # get quantity from message
+            export_format = context.args[1].lower() if len(context.args) > 1 else 'csv'  # get export format from message
+            assert export_format in ue.EXPORT_FORMATS, f"available formats: {', '.join(ue.EXPORT_FORMATS)}"
         except Exception as er:
-            await u_usr.send_message(f"Error: {er}\nTry: /users 10")
+            await u_usr.send_message(f"Error: {er}\nTry: /users 10 or /users 10 gz")
             return None  # not changing state
-        
-        last_users = session.scalars(
-            select(dbc.User)
-                .order_by(dbc.User.date_registered.desc())
-                .limit(quantity)
-        )
 
-        users_list = []
-        for user in last_users:
-            users_list.append(
-                [
-                    str(user.id),
-                    str(user.username),
-                    str(user.first_name),
-                    str(user.last_name),
-                    str(user.admin),
-                    str(user.manager),
-                    str(user.date_registered.astimezone(uc.PLACE_TIMEZONE)),
-                ]
-            )
-        if users_list:
-            table = tabulate.tabulate(users_list, headers=users_list_header)  # create beautiful table for orders
-            tmp_file = tempfile.NamedTemporaryFile(suffix='.txt')  # create temporary file to be sent
-            tmp_file.write(table.encode('utf-8'))  # add table to the file
-            tmp_file.seek(0)
+        return await export.enqueueExport(update, context, 'users', quantity, export_format)  # export is delivered by job
 
-            await u_usr.send_document(tmp_file, f'Last {quantity} users')  # send file
-        else:
-            await u_usr.send_message('Users list is empty')
-    return None  # not changing state
-        
 async def changePermission(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Changes admin and manager permission in database'''
     query = update.callback_query  # shortcut for query
@@ -613,6 +563,7 @@ async def changeRestaurantStatus(update: Update, context: ContextTypes.DEFAULT_T
         )
         restaurant.enabled=not restaurant.enabled  # change to opposite
         session.commit()  # save changes
+        catalog.forget_catalog()  # users see the change right away
 
         if restaurant.enabled:
             await query.answer('Restaurant now can be seen to users', show_alert=True)
@@ -750,6 +701,7 @@ async def setRestaurantSchedule(update: Update, context: ContextTypes.DEFAULT_TY
             session.delete(existing_schdule[day])  # delete from DB RestaurantSchedule instances that are left in dictionary
         
         session.commit()  # save changes
+        catalog.forget_catalog()  # checkout sees new schedule right away
     
     txt = 'Changes has been made. Update restaurant to view changes'  # text for message
     kbrd = ReplyKeyboardMarkup([[f"/restaurant {restaurant_name}"]], True)  # keyboard to request updated information of restaurant
@@ -757,51 +709,67 @@ async def setRestaurantSchedule(update: Update, context: ContextTypes.DEFAULT_TY
     await msg.reply_text(txt, reply_markup=kbrd)  # send message
     return bc.M_RESTAURANT  # return manager back to 
 
-async def showDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = update.message  # shortcut to use update message
-
-    if msg.text not in context.user_data['manage']['dish_categories']:  # filter text here, because filters module doesn't have access to context
-        return error.messageHandler(update, context)
+def create_dish_state_keyboard(dish_id: int, enabled: bool, position: dict = None):
+    '''Returns keyboard to enable or disable dish, position is passed for carousel message'''
+    kbrd = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    text="✅ enabled" if enabled else "❌ disabled",
+                    callback_data={
+                        'value': '-CHANGE_DISH_STATUS-',
+                        'dish_id': dish_id,
+                        'enabled': enabled,
+                        **(position or {})  # carousel position to keep navigation
+                    }
+                )
+            ]
+        ]
+    )
+    return menu.add_navigation(kbrd, '-MANAGE_MENU_PAGE-', position or {})
 
+def get_dishes(restaurant_id: int, category: str = None, category_id: int = None) -> list:
+    '''Returns all dishes of restaurant category, including disabled, selected by category name or id'''
     with Session(dbc.engine) as session:
         stmt = (
-            select(dbc.Dish.id, dbc.Dish.name, dbc.Dish.file_id, dbc.Dish.price, dbc.Dish.description, dbc.Restaurant.currency, dbc.Dish.enabled)
+            select(dbc.Dish.id, dbc.Dish.name, dbc.Dish.file_id, dbc.Dish.price, dbc.Dish.description, dbc.Restaurant.currency, dbc.Dish.enabled, dbc.Dish.dish_category_id)
                 .join(dbc.Dish.restaurant)
                 .join(dbc.Dish.dish_category)
-                .where(dbc.Restaurant.id==context.user_data['manage']['restaurant_id'])
-                .where(dbc.DishCategory.name==msg.text)
+                .where(dbc.Restaurant.id==restaurant_id)
+                .where(dbc.DishCategory.name==category if category_id is None else dbc.DishCategory.id==category_id)
                 .order_by(dbc.Dish.name)
         )
-        dishes = session.execute(stmt).all()  # getting all dishes by selected restaurant and category
-    
-    for dish in dishes:  # for every dish send message with it
-        kbrd = InlineKeyboardMarkup(
-            [
-                [
-                    InlineKeyboardButton(
-                        text="✅ enabled" if dish.enabled else "❌ disabled",
-                        callback_data={
-                            'value': '-CHANGE_DISH_STATUS-',
-                            'dish_id': dish.id,
-                            'enabled': dish.enabled
-                        }
-                    )
-                ]
-            ]
-        )
+        return session.execute(stmt).all()  # getting all dishes by selected restaurant and category
 
-        txt = (
-            f"{dish.name}\n\n"
-            f"{dish.description}\n\n"
-            f"Price: {dish.price} {dish.currency}"
-        )  # text for the message
-        
-        if dish.file_id:
-            await msg.reply_photo(photo=dish.file_id, caption=txt, reply_markup=kbrd, disable_notification=True)  # send photo with caption if dish has file_id
-        else:
-            await msg.reply_text(txt, reply_markup=kbrd, disable_notification=True)  # send text message file_id is None
+async def showDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message  # shortcut to use update message
+
+    if msg.text not in context.user_data['manage']['dish_categories']:  # filter text here, because filters module doesn't have access to context
+        return await error.messageHandler(update, context)
+
+    dishes = get_dishes(context.user_data['manage']['restaurant_id'], category=msg.text)  # getting all dishes by selected restaurant and category
+
+    await menu.sendDishes(
+        context.bot,
+        msg.chat_id,
+        dishes,
+        lambda dish, position: create_dish_state_keyboard(dish.id, dish.enabled, position)
+    )  # carousel or messages, depending on MENU_MODE
     return None  # returning None to not change the state
 
+async def changeMenuPage(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Handles pressed -MANAGE_MENU_PAGE- button in dish carousel'''
+    query = update.callback_query  # shortcut for callback query
+
+    dishes = get_dishes(context.user_data['manage']['restaurant_id'], category_id=query.data['category_id'])  # dishes could be changed since message was sent
+
+    await menu.changePage(
+        query,
+        dishes,
+        lambda dish, position: create_dish_state_keyboard(dish.id, dish.enabled, position)
+    )
+    return None  # not changing state
+
 async def changeDishState(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Disables or enables dish'''
     query = update.callback_query  # shortcut for callback query
@@ -829,26 +797,144 @@ async def changeDishState(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 .where(dbc.Dish.id==dish_id)
         )
         dish.enabled = not dish.enabled  # change state
+        availability.forget_sold_out(session, dish_id)  # dish is not enabled by restock job after manager's choice
 
         session.commit()  # save changes
+        catalog.forget_catalog()
 
-    kbrd = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    text="✅ enabled" if not dish_enabled else "❌ disabled",
-                    callback_data={
-                        'value': '-CHANGE_DISH_STATUS-',
-                        'dish_id': dish_id,
-                        'enabled': not dish_enabled
-                    }
-                )
-            ]
-        ]
-    )
+    kbrd = create_dish_state_keyboard(dish_id, not dish_enabled, menu.page_data(query.data))
     await query.edit_message_reply_markup(kbrd)  # update keyboard
     return None  # not changing state
 
+async def changeAvailability(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Enables or disables all dishes of restaurant, category or listed ids, optionally until time'''
+    msg = update.message  # shortcut for message
+    u_usr = update.effective_user  # user from update
+
+    with Session(dbc.engine) as session:
+        # ---------- CHECKING IF UPDATE USER IS MANAGER ----------
+        user_manager = session.scalar(
+            select(dbc.User)
+                .where(
+                    (dbc.User.id==u_usr.id)
+                    & (dbc.User.manager==True)
+                )
+        )
+
+        if not user_manager:
+            await msg.reply_text('You are not manager')  # notify of prohibited action
+            return bc.END  # end conversation
+        # ---------- END OF CHECKING IF UPDATE USER IS MANAGER ----------
+
+    try:
+        assert len(context.args) > 1, 'Arguments are not provided'
+        assert context.args[0].lower() in ('on', 'off'), 'First argument must be on or off'
+        enabled = context.args[0].lower() == 'on'
+        args = context.args[1:]
+
+        until = None
+        if args[0].lower() == 'until':
+            assert not enabled, 'Time can be set only for off'
+            until = availability.parse_until(args[1])  # sold out until this time
+            args = args[2:]
+
+        target = ' '.join(args)
+        if target.startswith('#'):
+            target = {'dish_ids': [int(dish_id) for dish_id in target[1:].replace(' ', '').split(',')]}
+        else:
+            restaurant_name, _, category_name = target.partition('|')
+            target = {'restaurant_name': restaurant_name.strip(), 'category_name': category_name.strip()}
+        count = availability.set_availability(enabled, until, **target)  # one update for all dishes
+    except Exception as er:
+        await msg.reply_text((
+            f"Error: {er}\n"
+            "To use this command: /availability <on|off> [until HH.MM] <RESTAURANT_NAME> [| CATEGORY_NAME]\n"
+            "or /availability <on|off> [until HH.MM] #<DISH_ID>,<DISH_ID>"
+        ))  # send message with error
+        return None  # return None to not change state
+
+    txt = f"{count} dishes have been {'enabled' if enabled else 'disabled'}"
+    if until is not None:
+        txt += f" until {until.astimezone(uc.PLACE_TIMEZONE):%Y-%m-%d %H:%M}"
+    await msg.reply_text(txt)  # send message with result
+    return None  # not changing state
+
+async def routeNotifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Shows notification chats of restaurant, adds or removes chat if its id is provided'''
+    msg = update.message  # shortcut for message
+    u_usr = update.effective_user  # user from update
+
+    with Session(dbc.engine) as session:
+        # ---------- CHECKING IF UPDATE USER IS MANAGER ----------
+        user_manager = session.scalar(
+            select(dbc.User)
+                .where(
+                    (dbc.User.id==u_usr.id)
+                    & (dbc.User.manager==True)
+                )
+        )
+
+        if not user_manager:
+            await msg.reply_text('You are not manager')  # notify of prohibited action
+            return bc.END  # end conversation
+        # ---------- END OF CHECKING IF UPDATE USER IS MANAGER ----------
+
+        try:
+            assert len(context.args), 'Arguments are not provided'
+            try:
+                chat_id = int(context.args[0])  # first argument is chat id if it is a number
+                restaurant_name = ' '.join(context.args[1:])
+            except ValueError:
+                chat_id = None  # only show notification chats
+                restaurant_name = ' '.join(context.args)
+            assert restaurant_name, 'Restaurant name is not provided'
+        except Exception as er:
+            await msg.reply_text((
+                f"Error: {er}\n"
+                "To use this command: /notify [CHAT_ID] <RESTAURANT_NAME>"
+            ))  # send message with error
+            return None  # return None to not change state
+
+        restaurant = session.scalar(
+            select(dbc.Restaurant)
+                .where(func.lower(dbc.Restaurant.name)==restaurant_name.lower())
+        )
+
+        if not restaurant:
+            await msg.reply_text(f'Restaurant with name {restaurant_name} not found')  # send message with information
+            return None  # return None to not change state
+
+        if chat_id is not None:
+            route = session.scalar(
+                select(dbc.NotificationChat)
+                    .where(dbc.NotificationChat.restaurant_id==restaurant.id)
+                    .where(dbc.NotificationChat.chat_id==chat_id)
+            )
+            if route:
+                session.delete(route)  # chat is removed if it was already added
+            else:
+                session.add(
+                    dbc.NotificationChat(
+                        chat_id=chat_id,
+                        restaurant_id=restaurant.id
+                    )
+                )
+            session.commit()  # save changes
+
+        chat_ids = session.scalars(
+            select(dbc.NotificationChat.chat_id)
+                .where(dbc.NotificationChat.restaurant_id==restaurant.id)
+                .order_by(dbc.NotificationChat.id)
+        ).all()
+        restaurant_name = restaurant.name
+
+    if chat_ids:
+        txt = f"Order requests of {restaurant_name} are sent to chats:\n" + '\n'.join(str(chat_id) for chat_id in chat_ids)
+    else:
+        txt = f"Order requests of {restaurant_name} are sent to default chat"
+    await msg.reply_text(txt)  # send message with notification chats
+    return None  # not changing state
+
 async def createNewRestaurant(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Starts process of creating new restaurant in DB'''
     msg = update.message  # shortcut for message
@@ -1001,6 +1087,7 @@ async def scheduleNewRestaurant(update: Update, context: ContextTypes.DEFAULT_TY
             session.add(new_day)  # add to session
         
         session.commit()
+        catalog.forget_catalog()
 
     txt = (
         f"New restaurant {context.user_data['manage']['new_restaurant']['restaurant_name']} has been created successfully\n"
@@ -1336,6 +1423,7 @@ async def photoNewDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         session.add(new_dish)
         session.commit()
+        catalog.forget_catalog()
     
     txt = f"Dish {context.user_data['manage']['new_dish']['name']} has been created successfully\n"
     kbrd = ReplyKeyboardMarkup(
@@ -1347,4 +1435,85 @@ async def photoNewDish(update: Update, context: ContextTypes.DEFAULT_TYPE):
         True
     )
     await msg.reply_text(txt, reply_markup=kbrd)  # send message
-    return bc.END  # end conversation
\ No newline at end of file
+    return bc.END  # end conversation
+
+async def startImport(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Starts bulk import of restaurants, categories, schedules and dishes from document'''
+    msg = update.message  # shortcut for message
+    u_usr = update.effective_user  # user from update
+
+    with Session(dbc.engine) as session:
+        # ---------- CHECKING IF UPDATE USER IS MANAGER ----------
+        user_manager = session.scalar(
+            select(dbc.User)
+                .where(
+                    (dbc.User.id==u_usr.id)
+                    & (dbc.User.manager==True)
+                )
+        )
+
+        if not user_manager:
+            await msg.reply_text('You are not manager')  # notify of prohibited action
+            return bc.END  # end conversation
+        # ---------- END OF CHECKING IF UPDATE USER IS MANAGER ----------
+
+    context.user_data.clear()  # clear manager's dictionary
+    context.user_data['manage'] = {
+        'import_check': bool(context.args) and context.args[0].lower() == 'check'  # only show changes
+    }
+
+    await msg.reply_text(
+        (
+            'Send CSV or JSON document with menu\n\n'
+            f"CSV columns: {', '.join(umi.IMPORT_COLUMNS)}\n"
+            'One row per dish, row without dish sets only currency and schedule of restaurant\n\n'
+            'JSON: {"restaurants": [{"name", "currency", "schedule": ["1 - 09.00 - 18.00"], '
+            '"dishes": [{"name", "category", "description", "price", "enabled"}]}]}\n\n'
+            'Restaurants, categories and dishes are found by name, empty values keep existing ones\n'
+            'Schedule: Day of the week (1-7) - Start Time (HH.MM) - End Time (HH.MM), days separated by ;'
+        ),
+        reply_markup=ReplyKeyboardRemove()
+    )  # send message
+
+    return bc.I_MENU  # next state for conversation handler
+
+async def importMenu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Checks whole document and saves it in one transaction, replies with changes'''
+    msg = update.message  # shortcut for message
+    u_usr = update.effective_user  # user from update
+    document = msg.document  # shortcut for document
+
+    if document.file_size and document.file_size > uc.IMPORT_MAX_SIZE:
+        await msg.reply_text(f"Document is too big, maximum size is {uc.IMPORT_MAX_SIZE // 1024} KB")
+        return None  # not changing state
+
+    with Session(dbc.engine) as session:
+        # ---------- CHECKING IF UPDATE USER IS MANAGER ----------
+        user_manager = session.scalar(
+            select(dbc.User)
+                .where(
+                    (dbc.User.id==u_usr.id)
+                    & (dbc.User.manager==True)
+                )
+        )
+
+        if not user_manager:
+            await msg.reply_text('You are not manager')  # notify of prohibited action
+            return bc.END  # end conversation
+        # ---------- END OF CHECKING IF UPDATE USER IS MANAGER ----------
+
+    dry_run = context.user_data.get('manage', {}).get('import_check', False)
+    tg_file = await document.get_file()
+    data = bytes(await tg_file.download_as_bytearray())
+
+    menu, errors = umi.parse_menu(data, document.file_name)  # whole document is checked before database
+    if errors:
+        result = {'changes': [], 'errors': errors, 'unchanged': 0}
+    else:
+        result = await asyncio.to_thread(menu_import.apply_menu, menu, dry_run)  # blocking work is done outside of event loop
+
+    await msg.reply_text(menu_import.format_report(document.file_name, result, dry_run))  # send message with changes
+
+    if result['errors'] or dry_run:
+        return None  # corrected document can be sent again
+    return bc.END  # end conversation
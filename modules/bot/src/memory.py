@@ -0,0 +1,109 @@
+import logging
+import pickle
+import time
+
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler, filters
+
+from utils import constants as uc
+
+
+logger = logging.getLogger(__name__)
+TRANSIENT_KEYS: tuple = ('restaurant_name', 'dish_categories', 'manage')  # user_data needed only inside conversation
+
+def drop_transient_data(user_data: dict) -> None:
+    '''Removes navigation data of user, cart is kept'''
+    for key in TRANSIENT_KEYS:
+        user_data.pop(key, None)
+    return None
+
+class EndedConversationFilter(filters.UpdateFilter):
+    '''Passes updates of users who have no state in handler, e.g. after conversation timeout'''
+
+    def __init__(self):
+        super().__init__(name='EndedConversationFilter')
+        self.handler: ConversationHandler = None  # set after handler is created
+
+    def filter(self, update: Update) -> bool:
+        return self.handler is not None and self.handler._get_key(update) not in self.handler._conversations  # library keeps no public way to read state
+
+async def conversationTimeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Silently ends conversation of idle user, called by conversation handler after its timeout'''
+    if context.user_data is not None:
+        drop_transient_data(context.user_data)
+    return ConversationHandler.END  # next message of user starts conversation again
+
+def _idle_users(application, now: float) -> list:
+    return [
+        user_id for user_id in application.user_data
+        if user_id not in application.user_locks  # user has no updates in progress
+        and (user_id not in application.last_seen or now - application.last_seen[user_id] > uc.USER_DATA_IDLE_TIMEOUT)
+    ]
+
+async def evictIdleUsers(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that removes user_data of users idle for USER_DATA_IDLE_TIMEOUT seconds from memory
+
+    With persistence user_data is written to database first and loaded again on next update of user,
+    without it only navigation data is removed and carts are kept.
+    '''
+    application = context.application
+    if not _idle_users(application, time.monotonic()):
+        return None
+
+    if application.persistence:
+        await application.update_persistence()
+
+    idle = _idle_users(application, time.monotonic())  # users could send updates while data was written
+    if application.persistence:
+        idle = [user_id for user_id in idle if user_id not in application.persistence.pending_users]  # not written, database is unavailable
+    evicted = 0
+    for user_id in idle:
+        if application.persistence:
+            application._user_data.pop(user_id, None)  # library keeps no public way to drop data without deleting it from persistence
+            evicted += 1
+        else:
+            user_data = application._user_data[user_id]
+            drop_transient_data(user_data)
+            if not user_data:
+                application._user_data.pop(user_id, None)
+                evicted += 1
+        application.last_seen.pop(user_id, None)
+    now = time.monotonic()
+    for key in [key for key, seen in application.last_seen.items() if now - seen > uc.USER_DATA_IDLE_TIMEOUT]:
+        del application.last_seen[key]  # chats without user_data
+
+    if application.persistence:
+        application.persistence.forget_users(idle)
+    logger.info('Evicted user data of %s idle users, %s users left in memory', evicted, len(application.user_data))
+    return None
+
+async def reportMemory(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that logs number and approximate size of user_data and conversation states kept in memory'''
+    application = context.application
+
+    sizes = {}
+    key_sizes = {}
+    for user_id, user_data in list(application.user_data.items()):
+        size = 0
+        for key, value in list(user_data.items()):
+            value_size = len(pickle.dumps(value))  # same size as stored by persistence
+            key_sizes[key] = key_sizes.get(key, 0) + value_size
+            size += value_size
+        sizes[user_id] = size
+
+    conversations = sum(
+        len(handler._conversations)
+        for handlers in application.handlers.values()
+        for handler in handlers if isinstance(handler, ConversationHandler)
+    )
+    total = sum(sizes.values())
+    top_users = sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:uc.MEMORY_REPORT_TOP]
+    top_keys = sorted(key_sizes.items(), key=lambda item: item[1], reverse=True)[:uc.MEMORY_REPORT_TOP]
+
+    logger.info(
+        'User data: %s users, %s conversations, ~%s bytes, avg %s bytes per user, top users %s, top keys %s',
+        len(sizes), conversations, total, total // len(sizes) if sizes else 0,
+        ', '.join(f"{user_id}={size}" for user_id, size in top_users) or '-',
+        ', '.join(f"{key}={size}" for key, size in top_keys) or '-'
+    )
+    return None
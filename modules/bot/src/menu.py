@@ -0,0 +1,156 @@
+from telegram import (Bot, InlineKeyboardButton, InlineKeyboardMarkup,
+                      InputMediaPhoto, Message)
+
+from modules.bot.src import rate_limiter
+from utils import constants as uc
+from utils import utility as uu
+
+
+def dish_text(dish, page: int = None, pages: int = None) -> str:
+    '''Returns text for dish message, with position in category for carousel'''
+    txt = (
+        f"{dish.name}\n\n"
+        f"{dish.description}\n\n"
+        f"Price: {dish.price} {dish.currency}"
+    )  # text for the message
+    if pages and pages > 1:
+        txt += f"\n\n({page + 1}/{pages})"  # position in carousel
+    return txt
+
+def page_data(callback_data: dict) -> dict:
+    '''Returns carousel position from callback data, empty if message is not carousel'''
+    return {key: callback_data[key] for key in ('category_id', 'page', 'pages') if key in callback_data}
+
+def create_navigation_row(value: str, category_id: int, page: int, pages: int) -> list:
+    '''Returns row with previous and next buttons for carousel, pages are cycled'''
+    if pages < 2:
+        return []
+    return [
+        InlineKeyboardButton('◀️', callback_data={
+            'value': value,
+            'category_id': category_id,
+            'page': (page - 1) % pages
+        }),
+        InlineKeyboardButton('▶️', callback_data={
+            'value': value,
+            'category_id': category_id,
+            'page': (page + 1) % pages
+        })
+    ]
+
+def add_navigation(kbrd: InlineKeyboardMarkup, value: str, callback_data: dict) -> InlineKeyboardMarkup:
+    '''Returns keyboard with navigation row if callback data has carousel position'''
+    position = page_data(callback_data)
+    if 'page' not in position:
+        return kbrd
+
+    rows = [list(row) for row in kbrd.inline_keyboard] if kbrd else []
+    navigation = create_navigation_row(value, position['category_id'], position['page'], position['pages'])
+    if navigation:
+        rows.append(navigation)
+    return InlineKeyboardMarkup(rows)
+
+async def sendMediaGroups(bot: Bot, chat_id: int, dishes: list):
+    '''Sends dish photos in albums of up to 10 photos'''
+    photos = [dish for dish in dishes if dish.file_id]
+    for chunk in uu.list_split(photos, 10):
+        if len(chunk) == 1:  # album must contain at least 2 photos
+            await bot.send_photo(
+                chat_id,
+                photo=chunk[0].file_id,
+                caption=dish_text(chunk[0]),
+                disable_notification=True,
+                rate_limit_args=rate_limiter.PRIORITY_MENU
+            )
+            continue
+        await bot.send_media_group(
+            chat_id,
+            [InputMediaPhoto(dish.file_id, caption=dish_text(dish)) for dish in chunk],
+            disable_notification=True,
+            rate_limit_args=rate_limiter.PRIORITY_MENU
+        )  # single request for whole album
+    return None
+
+async def showPage(bot: Bot, chat_id: int, dish, txt: str, kbrd: InlineKeyboardMarkup, message: Message = None, photo: bool = True):
+    '''Sends carousel message or edits existing one in place, returns the message'''
+    file_id = dish.file_id if photo else None
+
+    if message is not None:
+        if file_id and message.photo:
+            return await message.edit_media(
+                InputMediaPhoto(file_id, caption=txt),
+                reply_markup=kbrd
+            )  # change photo and caption
+        if not file_id and not message.photo:
+            return await message.edit_text(txt, reply_markup=kbrd)  # change text
+        await message.delete()  # text message cannot become photo and vice versa
+
+    if file_id:
+        return await bot.send_photo(
+            chat_id,
+            photo=file_id,
+            caption=txt,
+            reply_markup=kbrd,
+            disable_notification=True,
+            rate_limit_args=rate_limiter.PRIORITY_MENU
+        )  # send photo with caption if dish has file_id
+    return await bot.send_message(
+        chat_id,
+        txt,
+        reply_markup=kbrd,
+        disable_notification=True,
+        rate_limit_args=rate_limiter.PRIORITY_MENU
+    )  # send text message file_id is None
+
+async def sendDishes(bot: Bot, chat_id: int, dishes: list, create_keyboard):
+    '''Sends dishes of category according to MENU_MODE, create_keyboard(dish, position) returns keyboard for dish'''
+    if not dishes:
+        return None
+
+    if uc.MENU_MODE == 'messages':  # one message for every dish
+        for dish in dishes:  # dishes are sorted by name, telegram keeps order only for messages sent one after another
+            await showPage(bot, chat_id, dish, dish_text(dish), create_keyboard(dish, {}))
+        return None
+
+    if uc.MENU_MODE == 'media_group':  # photos are sent in albums, carousel is used for ordering
+        await sendMediaGroups(bot, chat_id, dishes)  # albums go before carousel
+
+    position = {
+        'category_id': dishes[0].dish_category_id,
+        'page': 0,
+        'pages': len(dishes)
+    }  # first page of carousel
+    await showPage(
+        bot,
+        chat_id,
+        dishes[0],
+        dish_text(dishes[0], 0, len(dishes)),
+        create_keyboard(dishes[0], position),
+        photo=uc.MENU_MODE == 'carousel'
+    )
+    return None
+
+async def changePage(query, dishes: list, create_keyboard):
+    '''Shows requested carousel page in place of query message'''
+    if not dishes:
+        await query.answer()
+        await query.edit_message_reply_markup(None)  # category has no dishes anymore
+        return None
+
+    page = query.data['page'] % len(dishes)  # dishes could be changed since message was sent
+    position = {
+        'category_id': query.data['category_id'],
+        'page': page,
+        'pages': len(dishes)
+    }
+    await query.answer()
+    await showPage(
+        query.get_bot(),
+        query.message.chat_id,
+        dishes[page],
+        dish_text(dishes[page], page, len(dishes)),
+        create_keyboard(dishes[page], position),
+        message=query.message,
+        photo=uc.MENU_MODE == 'carousel'
+    )
+    return None
@@ -0,0 +1,190 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from modules.bot.src import catalog
+from modules.database import config as dbc
+from utils import constants as uc
+
+
+def format_schedule(schedule: dict) -> str:
+    '''Returns schedule as "1 09.00-18.00, 2 ..." '''
+    return ', '.join(
+        f"{day} {start:%H.%M}-{end:%H.%M}" for day, (start, end) in sorted(schedule.items())
+    ) or 'empty'
+
+def check_lengths(menu: dict) -> list:
+    '''Returns errors for values longer than database columns'''
+    errors = []
+    limits = (
+        ('restaurant', dbc.Restaurant.name.type.length),
+        ('currency', dbc.Restaurant.currency.type.length),
+        ('category', dbc.DishCategory.name.type.length),
+        ('dish', dbc.Dish.name.type.length),
+        ('description', dbc.Dish.description.type.length),
+    )  # maximum length of every text value
+    for restaurant in menu.values():
+        values = {'restaurant': [restaurant['name']], 'currency': [restaurant['currency']]}
+        for dish in restaurant['dishes'].values():
+            values.setdefault('category', []).append(dish['category'])
+            values.setdefault('dish', []).append(dish['name'])
+            values.setdefault('description', []).append(dish['description'])
+
+        for column, length in limits:
+            for value in values.get(column, []):
+                if value and len(value) > length:
+                    errors.append(f"{restaurant['name']}: {column} '{value[:length]}...' is longer than {length}")
+    return errors
+
+def apply_menu(menu: dict, dry_run: bool = False) -> dict:
+    '''Upserts restaurants, categories, schedules and dishes of parsed menu in one transaction. Blocking, runs in a thread
+
+    Returns changes as (action, kind, text), errors and number of unchanged dishes,
+    nothing is saved if there are errors or it is dry run.
+    '''
+    result = {'changes': [], 'errors': check_lengths(menu), 'unchanged': 0}
+    changes, errors = result['changes'], result['errors']
+    if errors:
+        return result
+
+    with Session(dbc.engine) as session:
+        # ---------- LOADING EXISTING RECORDS ----------
+        restaurants = {
+            restaurant.name.lower(): restaurant for restaurant in session.scalars(
+                select(dbc.Restaurant)
+                    .where(func.lower(dbc.Restaurant.name).in_(list(menu)))
+            )
+        }
+        categories = {
+            category.name.lower(): category for category in session.scalars(select(dbc.DishCategory))
+        }  # few categories, all are loaded
+        category_names = {category.id: category.name for category in categories.values()}
+        restaurant_ids = [restaurant.id for restaurant in restaurants.values()]
+        dishes = {
+            (dish.restaurant_id, dish.name.lower()): dish for dish in session.scalars(
+                select(dbc.Dish)
+                    .where(dbc.Dish.restaurant_id.in_(restaurant_ids))
+            )
+        }
+        schedules = {}  # {restaurant_id: {day_of_week: RestaurantSchedule}}
+        for day in session.scalars(
+            select(dbc.RestaurantSchedule)
+                .where(dbc.RestaurantSchedule.restaurant_id.in_(restaurant_ids))
+        ):
+            schedules.setdefault(day.restaurant_id, {})[day.day_of_week] = day
+        # ---------- END OF LOADING EXISTING RECORDS ----------
+
+        for key, item in menu.items():
+            restaurant = restaurants.get(key)
+            if restaurant is None:
+                if not item['currency']:
+                    errors.append(f"{item['name']}: currency is required for new restaurant")
+                    continue
+                restaurant = dbc.Restaurant(name=item['name'], currency=item['currency'])  # disabled until manager enables it
+                session.add(restaurant)
+                restaurants[key] = restaurant
+                changes.append(('new', 'restaurant', f"+ restaurant {item['name']} ({item['currency']})"))
+            elif item['currency'] and item['currency'] != restaurant.currency:
+                changes.append(('changed', 'restaurant', f"~ restaurant {restaurant.name}: currency {restaurant.currency} -> {item['currency']}"))
+                restaurant.currency = item['currency']
+
+            for dish in item['dishes'].values():
+                if dish['category'] and dish['category'].lower() not in categories:
+                    categories[dish['category'].lower()] = dbc.DishCategory(name=dish['category'])
+                    session.add(categories[dish['category'].lower()])
+                    changes.append(('new', 'category', f"+ category {dish['category']}"))
+
+        session.flush()  # ids of new restaurants and categories
+
+        for key, item in menu.items():
+            restaurant = restaurants.get(key)
+            if restaurant is None:
+                continue  # not created because of error
+
+            if item['schedule'] is not None:
+                existing_schedule = schedules.get(restaurant.id, {})
+                old_schedule = {day: (row.start, row.end) for day, row in existing_schedule.items()}
+                if old_schedule != item['schedule']:
+                    for day, row in existing_schedule.items():
+                        if day not in item['schedule']:
+                            session.delete(row)
+                    for day, (start, end) in item['schedule'].items():
+                        if day in existing_schedule:
+                            existing_schedule[day].start, existing_schedule[day].end = start, end
+                        else:
+                            session.add(
+                                dbc.RestaurantSchedule(restaurant_id=restaurant.id, day_of_week=day, start=start, end=end)
+                            )
+                    changes.append(('changed', 'schedule', f"~ schedule of {restaurant.name}: {format_schedule(item['schedule'])}"))
+
+            for dish_key, dish_item in item['dishes'].items():
+                dish = dishes.get((restaurant.id, dish_key))
+                category = categories[dish_item['category'].lower()] if dish_item['category'] else None
+
+                if dish is None:
+                    missing = [field for field in ('category', 'description', 'price') if dish_item[field] is None]
+                    if missing:
+                        errors.append(f"{restaurant.name} / {dish_item['name']}: {', '.join(missing)} required for new dish")
+                        continue
+                    session.add(
+                        dbc.Dish(
+                            name=dish_item['name'],
+                            description=dish_item['description'],
+                            price=dish_item['price'],
+                            enabled=dish_item['enabled'] if dish_item['enabled'] is not None else True,
+                            dish_category_id=category.id,
+                            restaurant_id=restaurant.id
+                        )
+                    )
+                    changes.append(('new', 'dish', f"+ dish {restaurant.name} / {dish_item['name']}: {dish_item['price']} {restaurant.currency}"))
+                    continue
+
+                diffs = []
+                if category is not None and category.id != dish.dish_category_id:
+                    diffs.append(f"category {category_names.get(dish.dish_category_id)} -> {category.name}")
+                    dish.dish_category_id = category.id
+                if dish_item['description'] is not None and dish_item['description'] != dish.description:
+                    diffs.append('description')
+                    dish.description = dish_item['description']
+                if dish_item['price'] is not None and dish_item['price'] != dish.price:
+                    diffs.append(f"price {dish.price} -> {dish_item['price']}")
+                    dish.price = dish_item['price']
+                if dish_item['enabled'] is not None and dish_item['enabled'] != dish.enabled:
+                    diffs.append('enabled' if dish_item['enabled'] else 'disabled')
+                    dish.enabled = dish_item['enabled']
+
+                if diffs:
+                    changes.append(('changed', 'dish', f"~ dish {restaurant.name} / {dish.name}: {', '.join(diffs)}"))
+                else:
+                    result['unchanged'] += 1
+
+        if errors or dry_run:
+            session.rollback()  # document is imported completely or not at all
+        else:
+            session.commit()
+            catalog.forget_catalog()
+    return result
+
+def format_report(filename: str, result: dict, dry_run: bool) -> str:
+    '''Returns text with counts and first IMPORT_REPORT_LINES changes or errors of import'''
+    if result['errors']:
+        lines = result['errors']
+        txt = f"Import of {filename} failed, nothing is saved\n\n"
+    else:
+        counts = {}
+        for action, kind, _ in result['changes']:
+            counts[(action, kind)] = counts.get((action, kind), 0) + 1
+        lines = [text for _, _, text in result['changes']]
+        txt = (
+            f"Import of {filename} {'is checked, nothing is saved' if dry_run else 'is done'}\n\n"
+            f"Restaurants: {counts.get(('new', 'restaurant'), 0)} new, {counts.get(('changed', 'restaurant'), 0)} changed\n"
+            f"Categories: {counts.get(('new', 'category'), 0)} new\n"
+            f"Schedules: {counts.get(('changed', 'schedule'), 0)} changed\n"
+            f"Dishes: {counts.get(('new', 'dish'), 0)} new, {counts.get(('changed', 'dish'), 0)} changed, {result['unchanged']} unchanged\n\n"
+        )
+        if not lines:
+            lines = ['No changes']
+
+    txt += '\n'.join(lines[:uc.IMPORT_REPORT_LINES])
+    if len(lines) > uc.IMPORT_REPORT_LINES:
+        txt += f"\n... and {len(lines) - uc.IMPORT_REPORT_LINES} more"
+    return txt[:4096]  # telegram limit of message length
@@ -1,18 +1,79 @@
-import tabulate
-from sqlalchemy import select
+import asyncio
+import datetime as dt
+import logging
+
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
+from telegram import (Bot, ChatMember, InlineKeyboardButton,
+                      InlineKeyboardMarkup, Message, Update)
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import Application, ContextTypes
 
-from modules.bot.src import user_orders
+from modules.bot.src import dashboard, rate_limiter, user_orders
 from modules.database import config as dbc
 from utils import constants as uc
+from utils import table as utb
+from utils import utility as uu
+
+
+logger = logging.getLogger(__name__)
+bot_in_chat: bool = None  # membership of bot in notification chat, None if it is unknown
+_dispatch_lock = None  # outbox is dispatched by one job of the worker at a time, created in the event loop
+
+def is_member(member: ChatMember) -> bool:
+    '''True if chat member is in the chat'''
+    if member.status == ChatMember.RESTRICTED:
+        return member.is_member  # restricted user may be out of the chat
+    return member.status not in (ChatMember.LEFT, ChatMember.BANNED)
+
+async def checkChatMembership(application: Application):
+    '''Checks at startup if bot is in notification chat'''
+    global bot_in_chat
+
+    if uc.DEBUG or not uc.CHAT_ID:
+        return None  # notifications are sent to developer
+
+    try:
+        member = await application.bot.get_chat_member(uc.CHAT_ID, application.bot.id)
+        bot_in_chat = is_member(member)
+    except Exception as er:
+        bot_in_chat = False
+        logger.warning('Bot not found in notification chat %s: %s', uc.CHAT_ID, er)
+    return None
+
+async def trackChatMembership(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    '''Updates notification chat membership when bot is added or removed'''
+    global bot_in_chat
 
-single_ordr_hdr = ['Name', 'Quantity', 'Price']  # create header for the table with one order description
+    chat_member = update.my_chat_member
+    if str(chat_member.chat.id) != str(uc.CHAT_ID):
+        return None  # another chat
 
-async def sendOrderRequest(update: Update, order_id: int):
-    '''Sends order request in the notification chat'''
-    msg = update.message  # shortcut for message
+    bot_in_chat = is_member(chat_member.new_chat_member)
+    logger.info('Bot membership in notification chat changed to %s', chat_member.new_chat_member.status)
+    return None
+
+def save_request_messages(order_id: int, messages: list) -> None:
+    '''Saves order request messages of all chats, so any worker updates their keyboards together'''
+    with Session(dbc.engine) as session:
+        session.add_all(
+            dbc.OrderRequestMessage(order_id=order_id, chat_id=request_msg.chat_id, message_id=request_msg.message_id)
+            for request_msg in messages
+        )
+        session.commit()
+    return None
+
+def pop_request_messages(session: Session, order_ids: list) -> list:
+    '''Deletes saved order request messages of orders, returns their chat ids and message ids'''
+    return session.execute(
+        delete(dbc.OrderRequestMessage)
+            .where(dbc.OrderRequestMessage.order_id.in_(order_ids))
+            .returning(dbc.OrderRequestMessage.chat_id, dbc.OrderRequestMessage.message_id)
+    ).all()
+
+async def sendOrderRequest(bot: Bot, order_id: int, user_id: int):
+    '''Sends order request in notification chats of the restaurant, or in default chat if restaurant has none'''
+    global bot_in_chat
 
     with Session(dbc.engine) as session:
         stmt = (
@@ -22,30 +83,21 @@ async def sendOrderRequest(update: Update, order_id: int):
                 )
         )
         order = session.scalar(stmt)  # get order instance
+        if order is None:
+            raise LookupError(f"Order {order_id} not found")  # deleted after it was saved, not retried
         location = [float(value) for value in order.location.split(',')]  # get order delivery location
         restaurant = order.cart_dish[0].dish.restaurant  # get restaurant instance
 
-        order_dishes = []  # create list for dishes in order
-        total_price = 0  # total price of the order
-        for cart_dish in order.cart_dish:
-            order_dishes.append(
-                [cart_dish.dish.name, cart_dish.quantity, f"{cart_dish.dish.price} {restaurant.currency}"]
-            )
-            total_price += cart_dish.dish.price*cart_dish.quantity  # add price to total
-        
-        order_dishes.append(
-            ['Total', None, f"{total_price} {restaurant.currency}"]  # add total price to list
-        )
+        table = utb.format_order_table(
+            [(cart_dish.dish.name, cart_dish.quantity, cart_dish.dish.price) for cart_dish in order.cart_dish],
+            restaurant.currency
+        )  # create beautiful table for order
+        table += utb.format_order_footer(order_id, restaurant.name, order.status.name, order.date_ordered)  # add bottom information to the table
 
-        table = tabulate.tabulate(order_dishes, headers=single_ordr_hdr)  # create beautiful table for order
-        order_date = order.date_ordered.astimezone(uc.PLACE_TIMEZONE)  # convert timezone from UTC to local
-        table += (
-            f"\n\nOrder Number: {order_id}\n"
-            f"Restaurant: {restaurant.name}\n"
-            f"Status: {order.status.name}\n"
-            f"Order Date: {order_date.hour:02}:{order_date.minute:02} "
-            f"{order_date.day:02}.{order_date.month:02}.{order_date.year:04}"
-        )
+        chat_ids = session.scalars(
+            select(dbc.NotificationChat.chat_id)
+                .where(dbc.NotificationChat.restaurant_id==restaurant.id)
+        ).all()  # chats where restaurant orders are routed
 
     table_bytes = user_orders.create_image(table)  # create image in bytes
 
@@ -70,65 +122,161 @@ async def sendOrderRequest(update: Update, order_id: int):
             [
                 InlineKeyboardButton(
                     text='Chat with user',
-                    url=f"tg://user?id={update.effective_user.id}"
+                    url=f"tg://user?id={user_id}"
                 )
             ]
         ]
     )  # crate keyboard to respond on order request
 
-    try:
-        if uc.DEBUG:
-            chat_id = uc.DEVELOPER_ID
-            
-        else:
-            bot_in_chat = await update._bot.get_chat_member(uc.CHAT_ID, update._bot.id)  # try to get bot in chat to ensure that he can send message
-            
-            if bot_in_chat:  # if bot is in chat
-                chat_id = uc.CHAT_ID  # set target chat
-
-            else:  # if bot is not found in chat
-                chat_id = uc.DEVELOPER_ID  # set target chat
-                await update._bot.send_message(
-                    chat_id=uc.DEVELOPER_ID,
-                    text='Bot not found in chat'
-                )  # send error to developer
+    if uc.DEBUG:
+        chat_ids = [uc.DEVELOPER_ID]
 
-    except Exception as er:
-        chat_id = uc.DEVELOPER_ID  # set target chat
-        await update._bot.send_message(
+    elif chat_ids:
+        pass  # restaurant has its own notification chats
+
+    elif bot_in_chat is False:  # bot was removed from default notification chat
+        chat_ids = [uc.DEVELOPER_ID]  # set target chat
+        await bot.send_message(
             chat_id=uc.DEVELOPER_ID,
-            text=str(er)
+            text='Bot not found in chat'
         )  # send error to developer
 
-    await update._bot.send_photo(
-        chat_id,
-        photo=table_bytes,
-        caption=(
-            f"Order Number: {order_id}\n"
-            "Location:"
-        ),
-        reply_markup=kbrd
-    )  # send message with photo
-    await update._bot.send_location(
-        chat_id,
-        latitude=location[0],
-        longitude=location[1]
-    )  # send delivery location
+    else:  # membership is confirmed or couldn't be checked, telegram will tell if bot can't send
+        chat_ids = [uc.CHAT_ID]  # set target chat
+
+    async def send(chat_id):
+        '''Sends order request in one chat, returns request message or error'''
+        try:
+            request_msg = await bot.send_photo(
+                chat_id,
+                photo=table_bytes,
+                caption=(
+                    f"Order Number: {order_id}\n"
+                    "Location:"
+                ),
+                reply_markup=kbrd,
+                rate_limit_args=rate_limiter.PRIORITY_NOTIFICATION
+            )  # send message with photo
+            await bot.send_location(
+                chat_id,
+                latitude=location[0],
+                longitude=location[1],
+                rate_limit_args=rate_limiter.PRIORITY_NOTIFICATION
+            )  # send delivery location after order it belongs to
+            return request_msg
+        except Exception as er:
+            logger.warning('Order %s request was not sent in chat %s: %s', order_id, chat_id, er)
+            return er
+
+    results = await asyncio.gather(*[send(chat_id) for chat_id in chat_ids])  # chats have separate limits, so they are sent in parallel
+    sent = [result for result in results if isinstance(result, Message)]
+    failed = [(chat_id, result) for chat_id, result in zip(chat_ids, results) if not isinstance(result, Message)]
+
+    for chat_id, er in failed:
+        if isinstance(er, Forbidden) and str(chat_id) == str(uc.CHAT_ID):
+            bot_in_chat = False  # bot was removed from default chat, but membership update was missed
+    if failed and uc.DEVELOPER_ID not in chat_ids:
+        try:
+            await bot.send_message(
+                chat_id=uc.DEVELOPER_ID,
+                text='\n'.join(f"Order {order_id} request was not sent in chat {chat_id}: {er}" for chat_id, er in failed)
+            )  # send error to developer
+        except Exception as er:
+            logger.warning('Developer was not notified: %s', er)  # order request must not be sent again because of it
+
+    if not sent:
+        if not any(isinstance(er, Forbidden) for _, er in failed) or uc.DEVELOPER_ID in chat_ids:
+            raise failed[0][1]  # temporary error, order request is retried from outbox
+        result = await send(uc.DEVELOPER_ID)  # bot is not in any chat
+        if not isinstance(result, Message):
+            raise result
+        sent.append(result)
 
+    save_request_messages(order_id, sent)  # keyboards are updated together
+    return None
+
+def is_permanent_error(error: Exception) -> bool:
+    '''True if order request would fail again, e.g. chat not found, order deleted or wrong location'''
+    return isinstance(error, (BadRequest, LookupError, ValueError))
+
+async def dispatchOutbox(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that delivers order requests from outbox, failed ones are retried with growing delay'''
+    global _dispatch_lock
+
+    if _dispatch_lock is None:
+        _dispatch_lock = asyncio.Lock()
+
+    async with _dispatch_lock:  # same entry is not sent twice by concurrent jobs
+        with Session(dbc.engine) as session:
+            entries = session.execute(
+                select(dbc.OrderOutbox.id, dbc.OrderOutbox.order_id, dbc.OrderOutbox.user_id, dbc.OrderOutbox.attempts)
+                    .where(dbc.OrderOutbox.date_sent==None)
+                    .where(dbc.OrderOutbox.date_failed==None)
+                    .where(dbc.OrderOutbox.next_attempt<=uu.current_utc_time())
+                    .order_by(dbc.OrderOutbox.id)
+                    .limit(uc.OUTBOX_BATCH_SIZE)
+                    .with_for_update(skip_locked=True)  # entries claimed by other workers are skipped
+            ).all()  # entries that are due
+            if entries:
+                session.execute(
+                    update(dbc.OrderOutbox)
+                        .where(dbc.OrderOutbox.id.in_([entry.id for entry in entries]))
+                        .values(next_attempt=uu.current_utc_time() + dt.timedelta(seconds=uc.OUTBOX_CLAIM_TIMEOUT))
+                )  # claim entries, they are retried after timeout if worker stops while sending
+                session.commit()
+
+        for entry in entries:
+            try:
+                await sendOrderRequest(context.bot, entry.order_id, entry.user_id)
+                error = None
+            except Exception as er:
+                error = er
+
+            with Session(dbc.engine) as session:
+                outbox = session.get(dbc.OrderOutbox, entry.id)
+                if error is None:
+                    outbox.date_sent = uu.current_utc_time()  # delivered, entry is not sent again
+                else:
+                    outbox.attempts = entry.attempts + 1
+                    outbox.last_error = str(error)[:256]
+                    failed = is_permanent_error(error) or outbox.attempts >= uc.OUTBOX_MAX_ATTEMPTS
+                    if failed:
+                        outbox.date_failed = uu.current_utc_time()  # entry is not retried anymore
+                        logger.error('Order %s notification failed (attempt %s), not retried: %s', entry.order_id, outbox.attempts, error)
+                    else:
+                        delay = min(uc.OUTBOX_RETRY_DELAY * 2**entry.attempts, uc.OUTBOX_RETRY_MAX_DELAY)  # exponential backoff
+                        outbox.next_attempt = uu.current_utc_time() + dt.timedelta(seconds=delay)
+                        logger.warning('Order %s notification failed (attempt %s), retry in %ss: %s', entry.order_id, outbox.attempts, delay, error)
+                session.commit()
+
+            if error is not None and failed:
+                try:
+                    await context.bot.send_message(
+                        chat_id=uc.DEVELOPER_ID,
+                        text=f"Order {entry.order_id} request was not sent after {entry.attempts + 1} attempts and is not retried: {error}"
+                    )  # developer is notified once, when entry is marked failed
+                except Exception as er:
+                    logger.warning('Developer was not notified: %s', er)
+    return None
+
+async def _editRequestKeyboard(bot: Bot, chat_id: int, message_id: int, kbrd: InlineKeyboardMarkup):
+    '''Edits keyboard of order request message, message could be deleted'''
+    try:
+        await bot.edit_message_reply_markup(chat_id, message_id, reply_markup=kbrd)
+    except BadRequest as er:
+        logger.info('Order request %s in chat %s was not edited: %s', message_id, chat_id, er)
     return None
 
 async def requestButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    '''Confirms or cancels order'''
+    '''Confirms or cancels order, only first answer from any of notification chats is applied'''
     query = update.callback_query  # shortcut for callback query
     order_id = query.data['order_id']  # get order id from query
     user = update.effective_user  # get user from update
 
     if query.data['value'] == '-ORDER_CONFIRM-':
         new_status_name = uc.ORDER_STATUSES[1]  # get status name from list
-        btn_txt = f"Open user\n✅ {new_status_name}"  # create text for button
     elif query.data['value'] == '-ORDER_CANCEL-':
         new_status_name = uc.ORDER_STATUSES[-1]  # get status name from list
-        btn_txt = f"Open user\n❌ {new_status_name}"  # create text for button
     else:
         raise Exception('Order request managing unknown value')
     
@@ -145,21 +293,30 @@ async def requestButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.answer('You are not manager', show_alert=True)  # notify pressed button person
             return None  # return from function without changing
 
-        new_status = session.scalar(
-            select(dbc.Status)
-                .where(dbc.Status.name==new_status_name)
-        )  # get status
+        new_status_id = dbc.get_status_id(new_status_name)  # get status
 
         order = session.scalar(
             select(dbc.Order)
                 .where(dbc.Order.id==order_id)
+                .with_for_update()  # managers in other chats wait until this answer is saved
         )  # get order
-        order.status_id = new_status.id  # set new status
-        order.manager_id = user.id  # set manager for order
+        changed = order.status.name == uc.ORDER_STATUSES[0]  # order is still awaiting response
+        if changed:
+            order.status_id = new_status_id  # set new status
+            order.manager_id = user.id  # set manager for order
+        status_name = order.status.name if not changed else new_status_name  # actual status of the order
         user_id = order.user_id # get user_id from order
+        messages = set(pop_request_messages(session, [order_id]))  # order request messages in all chats, they are answered now
 
         session.commit()  # save changes
-    
+
+    if changed:
+        dashboard.orders_changed(context.job_queue, [order_id], new_status_name)
+        await query.answer()
+    else:
+        await query.answer(f"Order is already answered: {status_name}", show_alert=True)  # another manager was first
+
+    btn_txt = f"Open user\n{'❌' if status_name == uc.ORDER_STATUSES[-1] else '✅'} {status_name}"  # create text for button
     kbrd = InlineKeyboardMarkup(
         [
             [
@@ -168,5 +325,8 @@ async def requestButton(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
     )
 
-    await query.edit_message_reply_markup(kbrd)  # edit keyboard for request message
+    messages.add((query.message.chat_id, query.message.message_id))
+    await asyncio.gather(
+        *[_editRequestKeyboard(context.bot, chat_id, message_id, kbrd) for chat_id, message_id in messages]
+    )  # edit keyboard for request messages
     return None  # return from function without changing
@@ -1,14 +1,23 @@
-from sqlalchemy import select
+import datetime as dt
+import hashlib
+import logging
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from telegram import ReplyKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
 from modules.bot import config as bc
-from modules.bot.src import cart, default, lobby, notification, restaurant
+from modules.bot.src import (cart, catalog, dashboard, default, lobby,
+                             notification, restaurant)
 from modules.database import config as dbc
+from utils import constants as uc
 from utils import text as ut
+from utils import utility as uu
 
 
+logger = logging.getLogger(__name__)
 txt_dct = ut.messages  # dictionary of message texts
 ORDER_KEYBOARD: list = [
     [txt_dct['back_to_menu']],
@@ -18,31 +27,16 @@ async def startOrdering(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Function to check cart and ask user to proceed with ordering'''
     msg = update.message  # shortcut for message
     
-    if (
-        not context.user_data.get('cart')  # if cart is not created
-        or context.user_data['cart']['dishes'] == {}  # if cart is empty
-    ):
+    user_cart = cart.get_cart(context.user_data)
+    if user_cart.lines:
+        restaurant_name, currency, dish_names = cart.get_names(user_cart)  # names are not kept in cart
+    if not user_cart.lines:  # if cart is empty or its dishes were deleted
         await msg.reply_text(txt_dct['cart_is_empty'])
         return None  # return None to not change the state
 
-    restaurant_name = context.user_data['cart']['restaurant_name']  # get selected restaurant_name
-    dishes = context.user_data['cart']['dishes']  # get dishes dictionary
-    currency = context.user_data['cart']['currency']  # get currency
-
-    cart_sum = 0  # create cart price
-    txt = (
-        f"{txt_dct['cart']}\n\n"
-        f"{restaurant_name}:\n"
-    )  # create text for message
-    for dish_id in dishes:  # add line for each dish in cart
-        txt += (
-            f"{dishes[dish_id]['dish_name']} x{dishes[dish_id]['quantity']}: "
-            f"{dishes[dish_id]['dish_price']*dishes[dish_id]['quantity']} {currency}\n"
-        )
-        cart_sum += dishes[dish_id]['dish_price'] * dishes[dish_id]['quantity']  # add dish price to cart price
-
+    txt = cart.format_cart(user_cart, restaurant_name, currency, dish_names)
     txt += (
-        f"\n{txt_dct['total_price']}: {cart_sum} {currency}\n\n"  # line with cart price
+        f"\n{txt_dct['total_price']}: {user_cart.total} {currency}\n\n"  # line with cart price
         f"{txt_dct['order_confirmation']}"
     )  # add last lines
     kbrd = ReplyKeyboardMarkup(ORDER_KEYBOARD, True)
@@ -51,57 +45,113 @@ async def startOrdering(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     return bc.ORDER  # return next state
 
+def check_cart(user_cart: cart.Cart) -> str:
+    '''Checks cart against cached catalog without database and network, returns text key of problem or None'''
+    cart_restaurant = catalog.get_restaurant(restaurant_id=user_cart.restaurant_id)
+    if not cart_restaurant or not cart_restaurant['enabled'] or not restaurant.is_working(cart_restaurant['schedule']):
+        return 'cart_restaurant_closed'
+
+    for dish_id in user_cart.lines:
+        if catalog.dishes.get(dish_id) != (user_cart.restaurant_id, True):  # dish is deleted, disabled or moved
+            return 'cart_irrelevant_items'
+    return None
+
+def order_key(user_id: int, user_cart: cart.Cart) -> str:
+    '''Returns key that is the same for repeated submissions of the same cart by the same user'''
+    return hashlib.sha1(f"{user_id}:{user_cart.fingerprint()}".encode()).hexdigest()
+
+def get_order_by_key(session: Session, key: str) -> int:
+    '''Returns id of order made with the key, None if there is no such order'''
+    return session.scalar(
+        select(dbc.OrderKey.order_id)
+            .where(dbc.OrderKey.key==key)
+    )
+
+def saveOrder(key: str, user_id: int, location: str, user_cart: cart.Cart) -> tuple:
+    '''Saves order, its dishes and order request in one transaction
+
+    Returns id of order and True if it is new, or id of order saved before with the same key and False.
+    '''
+    with Session(dbc.engine) as session:  # short transaction without awaits, nothing is saved if it fails
+        new_order = dbc.Order(
+            location=location,
+            user_id=user_id
+        )  # create new order
+        session.add(new_order)  # add new order to session
+        session.flush()  # flush session to get new order id
+        new_order_id = new_order.id
+
+        session.add_all(
+            dbc.CartDish(
+                quantity=line.quantity,
+                dish_id=line.dish_id,
+                order_id=new_order_id
+            ) for line in user_cart.lines.values()
+        )  # add cart dishes to session
+        session.add(
+            dbc.OrderOutbox(
+                order_id=new_order_id,
+                user_id=user_id
+            )
+        )  # order request is saved in the same transaction and delivered by dispatcher
+        session.add(
+            dbc.OrderKey(
+                key=key,
+                order_id=new_order_id
+            )
+        )  # primary key rejects the same cart submitted again, e.g. by another worker or after restart
+        try:
+            session.commit()  # commit changes
+        except IntegrityError:
+            session.rollback()
+            existing_order_id = get_order_by_key(session, key)
+            if existing_order_id is None:
+                raise  # not repeated submission, e.g. dish was deleted after catalog was loaded
+            return existing_order_id, False
+    return new_order_id, True
+
+async def deleteOrderKeys(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that deletes order keys older than ORDER_KEY_TTL seconds'''
+    with Session(dbc.engine) as session:
+        deleted = session.execute(
+            delete(dbc.OrderKey)
+                .where(dbc.OrderKey.date_created<uu.current_utc_time() - dt.timedelta(seconds=uc.ORDER_KEY_TTL))
+        ).rowcount
+        session.commit()
+    if deleted:
+        logger.info('Old order keys are deleted: %s', deleted)
+    return None
+
 async def makeOrder(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '''Function to get location and make create order in database'''
     msg = update.message  # shortcut for message
     user = update.effective_user  # get update user
-    dishes = context.user_data['cart']['dishes']  # get dishes dictionary
+    user_cart = cart.get_cart(context.user_data)
 
     delivery_location = f"{msg.location.latitude},{msg.location.longitude}"  # get delivery location from message
 
-    #----------SAVING ORDER TO THE DATABASE----------
-    with Session(dbc.engine) as session:
-        new_order = dbc.Order(
-            location=delivery_location,
-            user_id=user.id
-        )  # create new order
-        session.add(new_order)  # add new order to session
-        session.flush()  #  flush session
-        session.refresh(new_order)  # refresh new order to get its id in DB
-        new_order_id = new_order.id
-        
-        dishes_db = session.scalars(
-            select(dbc.Dish)
-                .where(dbc.Dish.id.in_(dishes.keys()))
-        )
-    
-        if not await restaurant.isRestaurantWorking(context.user_data['cart']['restaurant_name']):
-            await msg.reply_text(txt_dct['cart_restaurant_closed'])  # notify that restaurant is now closed
-            return await default.startHandler(update, context)  # redirect to lobby
-
-        for dish in dishes_db:
-            if not dish.enabled:
-                await msg.reply_text(txt_dct['cart_irrelevant_items'])  # notify that cart contains irrelevant items
-                return await cart.showCart(update, context)  # redirect to cart
-
-            new_cart_dish = dbc.CartDish(
-                quantity=dishes[dish.id]['quantity'],
-                dish_id=dish.id,
-                order_id=new_order_id
-            )
-            session.add(new_cart_dish)  # add cart_dish to session
-        session.commit()  # commit changes
-    #----------END OF SAVING ORDER TO THE DATABASE----------
-    
+    problem = check_cart(user_cart) if user_cart.lines else 'cart_is_empty'  # whole cart is checked before transaction
+    if problem == 'cart_irrelevant_items':
+        await msg.reply_text(txt_dct[problem])  # notify that cart contains irrelevant items
+        return await cart.showCart(update, context)  # redirect to cart
+    elif problem:
+        await msg.reply_text(txt_dct[problem])  # notify that restaurant is now closed or cart is empty
+        return await default.startHandler(update, context)  # redirect to lobby
+
+    new_order_id, created = saveOrder(order_key(user.id, user_cart), user.id, delivery_location, user_cart)
+    if created:
+        context.job_queue.run_once(notification.dispatchOutbox, 0)  # send order request in the notification chat without waiting for periodic dispatch
+        dashboard.order_created(context.job_queue, new_order_id)
+    else:  # order was saved before, but cart was not cleared, e.g. worker stopped before saving state
+        logger.info('Order %s was submitted again by user %s', new_order_id, user.id)
+
     txt = (
         f"{txt_dct['order_completion']}\n\n"
         f"{txt_dct['order_number']}: {new_order_id}"
     )  # create text for confirmation message
     kbrd = ReplyKeyboardMarkup(lobby.LOBBY_KEYBOARD)  # keyboard for lobby
 
-    await notification.sendOrderRequest(update, new_order_id)  # send oerder request message in the notification chat
-
-    await msg.reply_text(txt, reply_markup=kbrd)  # send confirmation message to user
+    await msg.reply_text(txt, reply_markup=kbrd)  # send confirmation message to user (again for repeated submission)
 
     context.user_data.clear()  # clear user data
 
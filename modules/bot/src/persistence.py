@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import pickle
+
+from sqlalchemy import select
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+from telegram.ext import BasePersistence, PersistenceInput
+
+from modules.database import config as dbc
+from utils import constants as uc
+
+
+logger = logging.getLogger(__name__)
+
+class DatabasePersistence(BasePersistence):
+    '''Keeps user_data and conversation states in database, so carts survive restarts
+
+    Changes are collected in memory and written in one transaction every PERSISTENCE_INTERVAL seconds,
+    user_data is loaded on first update of the user instead of at startup.
+    '''
+
+    __slots__ = ('loaded_users', 'pending_users', 'pending_conversations')
+
+    def __init__(self):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=uc.PERSISTENCE_INTERVAL
+        )
+        self.loaded_users: dict = {}  # hash of stored user_data for every user loaded from database
+        self.pending_users: dict = {}  # pickled user_data and its hash waiting for write, None to delete
+        self.pending_conversations: dict = {}  # new state waiting for write by conversation name and key, None to delete
+
+    async def get_user_data(self) -> dict:
+        return {}  # loaded lazily by refresh_user_data
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None  # callback data is encoded in buttons
+
+    async def get_conversations(self, name: str) -> dict:
+        with Session(dbc.engine) as session:
+            rows = session.execute(
+                select(dbc.ConversationState.key, dbc.ConversationState.state)
+                    .where(dbc.ConversationState.name==name)
+            ).all()
+        return {tuple(json.loads(row.key)): row.state for row in rows}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self.loaded_users:
+            return None  # data in memory is newer than stored
+
+        with Session(dbc.engine) as session:
+            stored = session.scalar(
+                select(dbc.UserState.data)
+                    .where(dbc.UserState.user_id==user_id)
+            )
+        user_data.clear()  # data could be left from the time user was served by this worker before
+        if stored is not None:
+            user_data.update(pickle.loads(stored))
+        self.loaded_users[user_id] = hashlib.sha1(stored).digest() if stored is not None else None
+        return None
+
+    def forget_users(self, user_ids: list = None) -> None:
+        '''Makes user_data to be loaded again on next update of given users, every user if None'''
+        if user_ids is None:
+            self.loaded_users.clear()
+        else:
+            for user_id in user_ids:
+                self.loaded_users.pop(user_id, None)
+        return None
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        return None
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        return None
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if user_id not in self.loaded_users:
+            return None  # stored data was not loaded, it must not be overwritten
+
+        pickled = pickle.dumps(data)
+        digest = hashlib.sha1(pickled).digest()
+        if digest == self.loaded_users[user_id]:
+            self.pending_users.pop(user_id, None)  # user data is not changed since last write
+        else:
+            self.pending_users[user_id] = (pickled, digest)
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        return None
+
+    async def update_bot_data(self, data: dict) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        return None
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        self.pending_conversations[(name, json.dumps(list(key)))] = new_state
+        return None
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.pending_users[user_id] = None
+        return None
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        return None
+
+    def _write(self, users: dict, conversations: dict) -> None:
+        '''Writes changes of user_data and conversation states in one transaction'''
+        with Session(dbc.engine) as session:
+            for user_id, pending in users.items():
+                if pending is None:
+                    user_state = session.get(dbc.UserState, user_id)
+                    if user_state is not None:
+                        session.delete(user_state)
+                else:
+                    session.merge(dbc.UserState(user_id=user_id, data=pending[0]))
+
+            for (name, key), state in conversations.items():
+                if state is None:
+                    conversation_state = session.get(dbc.ConversationState, (name, key))
+                    if conversation_state is not None:
+                        session.delete(conversation_state)  # conversation ended
+                else:
+                    session.merge(dbc.ConversationState(name=name, key=key, state=state))
+
+            session.commit()
+        return None
+
+    def _write_each(self, users: dict, conversations: dict) -> tuple:
+        '''Writes changes one by one, returns written changes
+
+        Change that can't be stored is dropped, so it doesn't block others. If database is unavailable,
+        changes that are not written yet are kept for next flush.
+        '''
+        entries = [({user_id: pending}, {}) for user_id, pending in users.items()]
+        entries += [({}, {key: state}) for key, state in conversations.items()]
+        written_users, written_conversations = {}, {}
+        for i, (user_entry, conversation_entry) in enumerate(entries):
+            try:
+                self._write(user_entry, conversation_entry)
+            except (OperationalError, InterfaceError) as er:
+                logger.warning('Persistence is not written, database is unavailable: %s', er)
+                for left_users, left_conversations in entries[i:]:
+                    for user_id, pending in left_users.items():
+                        self.pending_users.setdefault(user_id, pending)  # newer changes are kept, failed ones retried
+                    for key, state in left_conversations.items():
+                        self.pending_conversations.setdefault(key, state)
+                break
+            except Exception as er:
+                logger.error('Persistence change is dropped, it can\'t be stored: %s %s: %s', user_entry, conversation_entry, er)
+            else:
+                written_users.update(user_entry)
+                written_conversations.update(conversation_entry)
+        return written_users, written_conversations
+
+    async def flush(self) -> None:
+        '''Writes collected changes in one transaction, called by application after every persistence update
+
+        If transaction fails, changes are written one by one. Errors are logged and not raised,
+        so periodic persistence of application keeps running.
+        '''
+        if not self.pending_users and not self.pending_conversations:
+            return None
+
+        users, self.pending_users = self.pending_users, {}
+        conversations, self.pending_conversations = self.pending_conversations, {}
+        try:
+            self._write(users, conversations)
+        except Exception as er:
+            logger.warning('Persistence batch is not written, writing changes one by one: %s', er)
+            users, conversations = self._write_each(users, conversations)
+
+        for user_id, pending in users.items():
+            if pending is None:
+                self.loaded_users.pop(user_id, None)
+            elif user_id in self.loaded_users:
+                self.loaded_users[user_id] = pending[1]  # same data is not written again
+        logger.debug('Persistence flushed: %s users, %s conversations', len(users), len(conversations))
+        return None
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from utils import constants as uc
+
+
+logger = logging.getLogger(__name__)
+
+def update_key(update: object):
+    '''Returns key that updates are serialized by: user id, chat id or None'''
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+class UserOrderedApplication(Application):
+    '''Application that processes updates of one user in order, and updates of different users concurrently'''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.user_locks: dict = {}  # lock and number of pending updates for every user with updates in progress
+        self.processing_semaphore = None  # global limit of updates processed at once, created in the event loop
+        self.updates_waiting: int = 0  # updates waiting for user lock or global limit
+        self.updates_processed: int = 0  # updates processed since last stats report
+        self.wait_time_total: float = 0  # seconds updates waited since last stats report
+        self.wait_time_max: float = 0  # longest wait since last stats report
+        self.last_seen: dict = {}  # monotonic time of last update of every user, idle users are evicted from memory
+
+    async def process_update(self, update: object) -> None:
+        key = update_key(update)
+        if self.processing_semaphore is None:
+            self.processing_semaphore = asyncio.Semaphore(uc.UPDATES_CONCURRENCY)
+
+        if key is None:
+            entry = [asyncio.Lock(), 0]  # updates without user or chat are not serialized
+        else:
+            entry = self.user_locks.setdefault(key, [asyncio.Lock(), 0])  # [lock, pending updates of the user]
+        entry[1] += 1
+
+        self.updates_waiting += 1
+        waiting = True
+        start = time.monotonic()
+        if key is not None:
+            self.last_seen[key] = start
+        try:
+            async with entry[0]:  # waiters are woken in order, so user updates keep their order
+                async with self.processing_semaphore:
+                    waiting = False
+                    self.updates_waiting -= 1
+                    wait_time = time.monotonic() - start
+                    self.updates_processed += 1
+                    self.wait_time_total += wait_time
+                    self.wait_time_max = max(self.wait_time_max, wait_time)
+
+                    await super().process_update(update)
+        finally:
+            if waiting:
+                self.updates_waiting -= 1  # update was cancelled while waiting
+            entry[1] -= 1
+            if key is not None and not entry[1]:
+                self.user_locks.pop(key, None)  # forget users without pending updates
+
+    async def update_persistence(self) -> None:
+        await super().update_persistence()
+        if self.persistence:
+            await self.persistence.flush()  # changes collected by persistence are written in one batch
+
+    def stats(self) -> dict:
+        '''Returns queue depth and wait time of updates'''
+        processed = self.updates_processed
+        return {
+            'waiting': self.updates_waiting,
+            'users': len(self.user_locks),
+            'processed': processed,
+            'wait_avg': self.wait_time_total / processed if processed else 0,
+            'wait_max': self.wait_time_max,
+        }
+
+    def reset_stats(self) -> None:
+        '''Starts new period of wait time statistics'''
+        self.updates_processed = 0
+        self.wait_time_total = 0
+        self.wait_time_max = 0
+
+async def reportStats(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that logs update processing statistics'''
+    stats = context.application.stats()
+    context.application.reset_stats()
+
+    logger.info(
+        'Updates: %s waiting, %s users in progress, %s processed, wait avg %.3fs, max %.3fs',
+        stats['waiting'], stats['users'], stats['processed'], stats['wait_avg'], stats['wait_max']
+    )
+    return None
@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ContextTypes
+
+from utils import constants as uc
+
+
+logger = logging.getLogger(__name__)
+
+# Priority classes of outgoing messages, lower value is sent first
+# Passed as rate_limit_args to bot methods, must not be 0 because bot ignores empty rate_limit_args
+PRIORITY_NOTIFICATION = 1  # order notifications for managers
+PRIORITY_DEFAULT = 2  # replies to users
+PRIORITY_MENU = 3  # menu photos and other bulk messages
+PRIORITY_NAMES: dict = {
+    PRIORITY_NOTIFICATION: 'notification',
+    PRIORITY_DEFAULT: 'default',
+    PRIORITY_MENU: 'menu',
+}
+
+# Bot API methods that are counted by telegram flood limits
+LIMITED_ENDPOINTS: set = {
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendLocation', 'sendMediaGroup',
+    'sendAudio', 'sendVideo', 'sendAnimation', 'sendVoice', 'sendSticker',
+    'copyMessage', 'forwardMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup',
+}
+
+class TokenBucket:
+    '''Allows rate events per second with bursts up to capacity'''
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity  # bucket starts full
+        self.updated = time.monotonic()
+        self.paused_until = 0  # set on RetryAfter from telegram
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        '''Returns seconds until one token is available'''
+        now = time.monotonic()
+        self._refill(now)
+        return max(self.paused_until - now, (1 - self.tokens)/self.rate, 0)
+
+    def consume(self):
+        '''Takes one token from bucket'''
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        '''Stops giving tokens for provided seconds'''
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        '''True if bucket is full and can be forgotten'''
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and self.paused_until <= self.updated
+
+class PriorityRateLimiter(BaseRateLimiter):
+    '''Keeps outgoing messages in telegram limits, global and per chat, sending higher priorities first'''
+
+    def __init__(self):
+        self.global_bucket = None  # created in initialize
+        self.chat_buckets: dict = {}  # token bucket and lock for every chat
+        self.waiters: list = []  # heap of (priority, number) waiting for global token
+        self.condition = None  # notifies waiters that head of the heap has changed
+        self.counter = itertools.count()  # keeps order of waiters with same priority
+        self.wait_stats: dict = {}  # [messages, total wait, max wait] for every priority since last report
+
+    async def initialize(self) -> None:
+        global_rate = uc.RATE_LIMIT_GLOBAL / max(len(uc.SHARD_WORKERS), 1)  # workers share one bot limit
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.condition = asyncio.Condition()
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id) -> list:
+        '''Returns [bucket, lock] of the chat, private chats and groups have different limits'''
+        try:
+            chat_id = int(chat_id)  # chat ids from environment are strings, so one chat would have two buckets
+        except ValueError:
+            pass  # @username of channel
+        entry = self.chat_buckets.get(chat_id)
+        if entry is None:
+            if len(self.chat_buckets) >= uc.RATE_LIMIT_CHATS_KEPT:
+                for key in [key for key, (bucket, lock) in self.chat_buckets.items() if bucket.is_idle() and not lock.locked()]:
+                    self.chat_buckets.pop(key)  # forget chats that are in limits
+            if str(chat_id).startswith('-'):  # group chat
+                bucket = TokenBucket(uc.RATE_LIMIT_GROUP, uc.RATE_LIMIT_GROUP_BURST)
+            else:
+                bucket = TokenBucket(uc.RATE_LIMIT_CHAT, uc.RATE_LIMIT_CHAT_BURST)
+            entry = self.chat_buckets[chat_id] = [bucket, asyncio.Lock()]
+        return entry
+
+    def _paused_chats(self) -> int:
+        '''Returns number of chats paused by RetryAfter now'''
+        now = time.monotonic()
+        return sum(1 for bucket, _ in self.chat_buckets.values() if bucket.paused_until > now)
+
+    async def _acquire_global(self, priority: int):
+        '''Waits for global token, waiters with higher priority get it first'''
+        entry = (priority, next(self.counter))
+        async with self.condition:
+            heapq.heappush(self.waiters, entry)
+            self.condition.notify_all()  # head of the heap may have changed
+            try:
+                while True:
+                    if self.waiters[0] != entry:
+                        await self.condition.wait()
+                        continue
+                    delay = self.global_bucket.delay()
+                    if delay <= 0:
+                        self.global_bucket.consume()
+                        return None
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()  # next waiter becomes head
+
+    def _record_wait(self, priority: int, wait_time: float):
+        stats = self.wait_stats.setdefault(priority, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += wait_time
+        stats[2] = max(stats[2], wait_time)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint not in LIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)  # answers to queries and other methods are not limited
+
+        priority = PRIORITY_DEFAULT if rate_limit_args is None else rate_limit_args
+        chat_id = data.get('chat_id')
+        chat_entry = self._chat_bucket(chat_id) if chat_id is not None else None
+
+        for attempt in range(uc.RATE_LIMIT_MAX_RETRIES + 1):
+            start = time.monotonic()
+            if chat_entry:
+                bucket, lock = chat_entry
+                async with lock:  # messages of one chat get tokens in order, requests themselves may still overlap
+                    delay = bucket.delay()
+                    while delay > 0:
+                        await asyncio.sleep(delay)
+                        delay = bucket.delay()
+                    bucket.consume()
+                    await self._acquire_global(priority)  # under chat lock, so priority heap doesn't reorder chat messages
+            else:
+                await self._acquire_global(priority)
+            self._record_wait(priority, time.monotonic() - start)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as er:
+                if attempt == uc.RATE_LIMIT_MAX_RETRIES:
+                    raise
+                logger.warning('Flood limit on %s for chat %s, retrying after %ss', endpoint, chat_id, er.retry_after)
+                if chat_entry:
+                    chat_entry[0].pause(er.retry_after)  # only messages of this chat wait
+                if not chat_entry or self._paused_chats() >= uc.RATE_LIMIT_GLOBAL_PAUSE_CHATS:
+                    self.global_bucket.pause(er.retry_after)  # several chats are limited at once, so limit is global
+
+    def stats(self) -> dict:
+        '''Returns messages count, average and max queue wait for every priority'''
+        return {
+            PRIORITY_NAMES.get(priority, priority): {
+                'sent': sent,
+                'wait_avg': total / sent if sent else 0,
+                'wait_max': max_wait,
+            } for priority, (sent, total, max_wait) in self.wait_stats.items()
+        }
+
+    def reset_stats(self) -> None:
+        '''Starts new period of wait statistics'''
+        self.wait_stats = {}
+
+async def reportStats(context: ContextTypes.DEFAULT_TYPE):
+    '''Job that logs outgoing messages queue latency'''
+    rate_limiter = context.bot.rate_limiter
+    stats = rate_limiter.stats()
+    rate_limiter.reset_stats()
+
+    for name, row in stats.items():
+        logger.info(
+            'Sent %s %s messages, wait avg %.3fs, max %.3fs',
+            row['sent'], name, row['wait_avg'], row['wait_max']
+        )
+    return None
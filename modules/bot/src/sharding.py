@@ -0,0 +1,204 @@
+import asyncio
+import bisect
+import hashlib
+import hmac
+import json
+import logging
+import signal
+
+import httpx
+from telegram import Bot, Update
+from telegram.ext import Application, ConversationHandler
+from tornado.web import Application as WebApplication
+from tornado.web import HTTPError, RequestHandler
+
+from modules.bot.src import processing
+from utils import constants as uc
+
+
+logger = logging.getLogger(__name__)
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+RING_HEADER = 'X-Shard-Ring'  # version of hash ring that ingress routes updates by
+ring_version: str = None  # version of hash ring last seen by worker
+_ring_lock = None  # one ring change is applied at a time, created in the event loop
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], 'big')
+
+class HashRing:
+    '''Consistent hash of user ids to workers, adding or removing worker moves only its share of users'''
+
+    def __init__(self, workers: list, replicas: int = uc.SHARD_REPLICAS):
+        if not workers:
+            raise Exception('SHARD_WORKERS is empty')
+
+        self.workers = workers
+        self.points = sorted(
+            (_hash(f"{worker}#{replica}"), worker) for worker in workers for replica in range(replicas)
+        )  # every worker has many points on ring, so users are spread evenly
+        self.hashes = [point for point, _ in self.points]
+        self.version = hashlib.sha1(','.join(sorted(workers)).encode()).hexdigest()[:12]
+
+    def worker_for(self, key) -> str:
+        '''Returns url of worker that serves the key'''
+        index = bisect.bisect(self.hashes, _hash(str(key))) % len(self.points)  # first point clockwise
+        return self.points[index][1]
+
+class IngressHandler(RequestHandler):
+    '''Receives updates from telegram and forwards them to workers'''
+
+    def initialize(self, ring: HashRing, client: httpx.AsyncClient):
+        self.ring = ring
+        self.client = client
+
+    async def post(self):
+        if not hmac.compare_digest(self.request.headers.get(SECRET_HEADER, '').encode(), uc.WEBHOOK_SECRET.encode()):
+            raise HTTPError(403)
+
+        data = json.loads(self.request.body)
+        key = processing.update_key(Update.de_json(data, None))  # same key that worker serializes updates by
+        worker = self.ring.worker_for(key if key is not None else data.get('update_id'))
+        try:
+            response = await self.client.post(
+                f"{worker}/{uc.WEBHOOK_PATH}",
+                content=self.request.body,
+                headers={SECRET_HEADER: uc.SHARD_SECRET, RING_HEADER: self.ring.version}
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as er:
+            logger.warning('Update %s was not forwarded to %s: %s', data.get('update_id'), worker, er)
+            raise HTTPError(502)  # telegram sends update again later
+        return None
+
+class WorkerHandler(RequestHandler):
+    '''Receives updates from ingress and puts them in application queue'''
+
+    def initialize(self, application: Application):
+        self.bot_application = application
+
+    async def post(self):
+        if not hmac.compare_digest(self.request.headers.get(SECRET_HEADER, '').encode(), uc.SHARD_SECRET.encode()):
+            raise HTTPError(403)
+
+        await syncRing(self.bot_application, self.request.headers.get(RING_HEADER))
+        if not self.request.body:
+            return None  # ring announcement without update
+
+        update = Update.de_json(json.loads(self.request.body), self.bot_application.bot)
+        self.bot_application.bot.insert_callback_data(update)  # decode callback data of buttons
+        await self.bot_application.update_queue.put(update)
+        return None
+
+async def syncRing(application: Application, version: str):
+    '''Saves state and reloads it from database when users are moved between workers'''
+    global ring_version, _ring_lock
+
+    if version is None or version == ring_version:
+        return None
+    if _ring_lock is None:
+        _ring_lock = asyncio.Lock()
+
+    async with _ring_lock:
+        if version == ring_version:
+            return None
+        if ring_version is not None and application.persistence:
+            await application.update_persistence()  # other workers read changes of users moved to them
+            application.persistence.forget_users()  # users moved back get their data from database
+            for handlers in application.handlers.values():
+                for handler in handlers:
+                    if isinstance(handler, ConversationHandler) and handler.persistent:
+                        conversations = handler._conversations  # library keeps no public way to reload states
+                        conversations.data.clear()
+                        conversations.update_no_track(await application.persistence.get_conversations(handler.name))
+            logger.info('Hash ring changed from %s to %s, state reloaded', ring_version, version)
+        ring_version = version
+    return None
+
+async def _announceRing(client: httpx.AsyncClient, ring: HashRing):
+    '''Tells workers about new ring before updates are routed by it'''
+    for worker in ring.workers:
+        try:
+            response = await client.post(
+                f"{worker}/{uc.WEBHOOK_PATH}",
+                headers={SECRET_HEADER: uc.SHARD_SECRET, RING_HEADER: ring.version}
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as er:
+            logger.warning('Worker %s was not told about hash ring: %s', worker, er)  # it reloads state on first update
+    return None
+
+def _stop_event() -> asyncio.Event:
+    '''Returns event that is set on SIGINT or SIGTERM, so server stops and state is saved'''
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            pass  # not available on Windows, Ctrl+C raises KeyboardInterrupt there
+    return stop
+
+def _check_secret():
+    '''Raises exception if requests to ingress or from ingress to workers are not protected by secret'''
+    if not uc.SHARD_SECRET:
+        raise Exception(f"SHARD_SECRET is required for SHARD_ROLE={uc.SHARD_ROLE}")  # anyone could send updates to workers
+    if uc.SHARD_ROLE == 'ingress' and not uc.WEBHOOK_SECRET:
+        raise Exception('WEBHOOK_SECRET is required for webhook mode')  # anyone could send updates to ingress
+    return None
+
+async def _serveIngress(token: str):
+    ring = HashRing(uc.SHARD_WORKERS)
+    async with httpx.AsyncClient(timeout=uc.SHARD_FORWARD_TIMEOUT) as client:
+        await _announceRing(client, ring)
+
+        async with Bot(token) as bot:
+            await bot.set_webhook(
+                url=f"{uc.WEBHOOK_URL.rstrip('/')}/{uc.WEBHOOK_PATH}",
+                secret_token=uc.WEBHOOK_SECRET,
+                max_connections=uc.WEBHOOK_MAX_CONNECTIONS
+            )
+
+        server = WebApplication(
+            [(f"/{uc.WEBHOOK_PATH}/?", IngressHandler, {'ring': ring, 'client': client})]
+        ).listen(uc.WEBHOOK_PORT, uc.WEBHOOK_LISTEN)
+        logger.info('Ingress routes updates to %s workers, hash ring %s', len(ring.workers), ring.version)
+        try:
+            await _stop_event().wait()  # until Ctrl+C or SIGTERM
+        finally:
+            server.stop()
+    return None
+
+async def _serveWorker(application: Application):
+    async with application:  # initialize and shutdown
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+        server = WebApplication(
+            [(f"/{uc.WEBHOOK_PATH}/?", WorkerHandler, {'application': application})]
+        ).listen(uc.WEBHOOK_PORT, uc.WEBHOOK_LISTEN)
+        logger.info('Worker receives updates on %s:%s', uc.WEBHOOK_LISTEN, uc.WEBHOOK_PORT)
+        try:
+            await _stop_event().wait()  # until Ctrl+C or SIGTERM
+        finally:
+            server.stop()
+            await application.stop()
+    return None  # leaving context shuts application down and saves state to database
+
+def run_ingress(token: str):
+    '''Runs webhook server that routes updates to workers by user id'''
+    _check_secret()
+    try:
+        asyncio.run(_serveIngress(token))
+    except KeyboardInterrupt:
+        pass
+    return None
+
+def run_worker(application: Application):
+    '''Runs application that receives updates from ingress'''
+    _check_secret()
+    try:
+        asyncio.run(_serveWorker(application))
+    except KeyboardInterrupt:
+        pass
+    return None
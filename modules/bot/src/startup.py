@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import time
+
+from telegram.ext import Application
+
+from modules.bot.src import catalog, dashboard, notification, user_orders
+from modules.database import config as dbc
+
+
+logger = logging.getLogger(__name__)
+timings: dict = {}  # seconds taken by every startup phase
+_last_checkpoint: float = time.perf_counter()
+
+def checkpoint(phase: str, start: float = None):
+    '''Records seconds since previous checkpoint, or since start if it is provided'''
+    global _last_checkpoint
+
+    now = time.perf_counter()
+    timings[phase] = now - (_last_checkpoint if start is None else start)
+    _last_checkpoint = now
+    return None
+
+async def _timed(name: str, function, *args):
+    '''Runs warm-up step and records its time, blocking steps run in threads to load concurrently'''
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(function):
+            await function(*args)
+        else:
+            await asyncio.to_thread(function, *args)
+    except Exception as er:
+        logger.warning('Warm-up of %s failed: %s', name, er)  # loaded on first use instead
+    timings[name] = time.perf_counter() - start
+    return None
+
+async def warmUp(application: Application):
+    '''Fills caches before first update and logs startup timing, used as post_init hook'''
+    checkpoint('initialize')  # bot info and persisted conversations are loaded by application
+
+    await asyncio.gather(
+        _timed('statuses', dbc.load_status_ids),
+        _timed('catalog', catalog.load_catalog),
+        _timed('font', user_orders.load_font),
+        _timed('chat membership', notification.checkChatMembership, application),
+        _timed('dashboard', dashboard.load_orders),
+    )
+    dashboard.schedule(application.job_queue)  # dashboard shows orders changed while bot was stopped
+    checkpoint('warm-up')
+
+    logger.info('Startup: %s', ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items()))
+    return None
@@ -0,0 +1,111 @@
+import importlib.util
+from typing import Optional, Tuple
+
+import httpx
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from utils import constants as uc
+
+
+class TunedRequest(HTTPXRequest):
+    '''HTTPXRequest with configurable keep-alive and HTTP/2'''
+
+    def __init__(
+        self,
+        connection_pool_size: int,
+        read_timeout: Optional[float],
+        write_timeout: Optional[float],
+        connect_timeout: Optional[float],
+        pool_timeout: Optional[float],
+        keepalive_expiry: Optional[float] = uc.HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = uc.HTTP2,
+    ):
+        if http2 and importlib.util.find_spec('h2') is None:
+            raise Exception('HTTP/2 requires httpx[http2] to be installed')
+
+        self.limits = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=connection_pool_size,
+            keepalive_expiry=keepalive_expiry,  # idle connections are kept open to skip TLS handshakes
+        )
+        self.http2 = http2  # many requests share one connection
+        super().__init__(
+            connection_pool_size=connection_pool_size,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )  # builds client with settings above
+
+    def _build_client(self) -> httpx.AsyncClient:
+        '''Builds client, library calls it on creation and after shutdown, so only one client is ever open'''
+        return httpx.AsyncClient(**{**self._client_kwargs, 'limits': self.limits, 'http2': self.http2})  # library keeps no public way to pass client settings
+
+class RoutingRequest(BaseRequest):
+    '''Sends file uploads through separate connection pool, so uploads never take connections of text messages'''
+
+    __slots__ = ('messages_request', 'media_request')
+
+    def __init__(self, messages_request: BaseRequest, media_request: BaseRequest):
+        self.messages_request = messages_request
+        self.media_request = media_request
+
+    async def initialize(self) -> None:
+        await self.messages_request.initialize()
+        await self.media_request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.messages_request.shutdown()
+        await self.media_request.shutdown()
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        if request_data is not None and request_data.contains_files:
+            # Library passes its own write timeout for uploads, media timeouts from config are used instead
+            return await self.media_request.do_request(url, method, request_data)
+        return await self.messages_request.do_request(
+            url,
+            method,
+            request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )
+
+def create_request() -> RoutingRequest:
+    '''Returns request for bot methods, with separate pools for messages and media uploads'''
+    return RoutingRequest(
+        TunedRequest(
+            connection_pool_size=uc.HTTP_MESSAGES_POOL_SIZE,
+            read_timeout=uc.HTTP_MESSAGES_READ_TIMEOUT,
+            write_timeout=uc.HTTP_MESSAGES_WRITE_TIMEOUT,
+            connect_timeout=uc.HTTP_CONNECT_TIMEOUT,
+            pool_timeout=uc.HTTP_MESSAGES_POOL_TIMEOUT,
+        ),
+        TunedRequest(
+            connection_pool_size=uc.HTTP_MEDIA_POOL_SIZE,
+            read_timeout=uc.HTTP_MEDIA_READ_TIMEOUT,
+            write_timeout=uc.HTTP_MEDIA_WRITE_TIMEOUT,
+            connect_timeout=uc.HTTP_CONNECT_TIMEOUT,
+            pool_timeout=uc.HTTP_MEDIA_POOL_TIMEOUT,
+        ),
+    )
+
+def create_updates_request() -> TunedRequest:
+    '''Returns request for getUpdates, that has its own connection'''
+    return TunedRequest(
+        connection_pool_size=1,  # only one getUpdates request is running at once
+        read_timeout=uc.HTTP_UPDATES_READ_TIMEOUT,
+        write_timeout=uc.HTTP_MESSAGES_WRITE_TIMEOUT,
+        connect_timeout=uc.HTTP_CONNECT_TIMEOUT,
+        pool_timeout=uc.HTTP_MESSAGES_POOL_TIMEOUT,
+    )
@@ -1,8 +1,6 @@
 import io
 import tempfile
 
-import tabulate
-from PIL import Image, ImageDraw, ImageFont
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from telegram import ReplyKeyboardMarkup, Update
@@ -11,6 +9,7 @@ from telegram.ext import ContextTypes
 from modules.bot import config as bc
 from modules.database import config as dbc
 from utils import constants as uc
+from utils import table as utb
 from utils import text as ut
 from utils import utility as uu
 
@@ -21,12 +20,22 @@ USER_ORDERS_KEYBOARD: list = [
 ]
 
 font_size = uc.FONT_SIZE  # get font size
-fnt = ImageFont.truetype(uc.FONT_PATH, font_size)  # set font for PIL
-many_ordrs_hdr = ['Order Number', 'Date', 'Status', 'Total Price']  # create header for the table with many orders
-single_ordr_hdr = ['Name', 'Quantity', 'Price']  # create header for the table with one order description
+fnt = None  # font for PIL, loaded on first use or by startup warm-up
+
+def load_font():
+    '''Returns font for order images, Pillow is imported on first call to keep bot startup fast'''
+    global fnt
+
+    if fnt is None:
+        from PIL import ImageFont
+        fnt = ImageFont.truetype(uc.FONT_PATH, font_size)  # set font for PIL
+    return fnt
 
 def create_image(table: str):
     '''Returns image in bytes with table content on it'''
+    from PIL import Image, ImageDraw
+
+    fnt = load_font()
     table_rows = table.split('\n')  # split to get number of rows, width of text in pixels
     l  = int(fnt.getlength(table_rows[1]))  # get width of longest line in pixels
     img = Image.new('1', (l+40, (font_size*len(table_rows))+40), 1)  # create blank image
@@ -93,7 +102,7 @@ async def showOrders(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if past_orders:  # if user has past orders
         txt = f"{txt_dct['past_orders']}\n\n"  # create text for past orders message
-        table = tabulate.tabulate(past_orders, headers=many_ordrs_hdr)  # create beautiful table for orders
+        table = utb.format_table(past_orders, utb.MANY_ORDERS_COLUMNS)  # create beautiful table for orders
 
         if len(past_orders) > 10:  # if there are too much for single message
             tmp_file = tempfile.NamedTemporaryFile(suffix='.txt')  # create temporary file to be sent
@@ -109,7 +118,7 @@ async def showOrders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if current_orders:
         txt = f"{txt_dct['current_orders']}\n\n"  # create text for current orders message
-        table = tabulate.tabulate(current_orders, headers=many_ordrs_hdr)  # create beautiful table for orders
+        table = utb.format_table(current_orders, utb.MANY_ORDERS_COLUMNS)  # create beautiful table for orders
         
         table_bytes = create_image(table)  # convert text table to image
         
@@ -153,27 +162,11 @@ async def showSingleOrder(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         txt = msg.text  # caption for message
 
-        order_dishes = []  # create list for dishes in order
-        total_price = 0  # total price of the order
-        for cart_dish in order.cart_dish:
-            order_dishes.append(
-                [cart_dish.dish.name, cart_dish.quantity, f"{cart_dish.dish.price} {restaurant.currency}"]
-            )
-            total_price += cart_dish.dish.price*cart_dish.quantity  # add price to total
-        
-        order_dishes.append(
-            ['Total', None, f"{total_price} {restaurant.currency}"]  # add total price to list
-        )
-
-        table = tabulate.tabulate(order_dishes, headers=single_ordr_hdr)  # create beautiful table for order
-        order_date = order.date_ordered.astimezone(uc.PLACE_TIMEZONE)  # convert timezone from UTC to local
-        table += (
-            f"\n\nOrder Number: {msg.text}\n"
-            f"Restaurant: {restaurant.name}\n"
-            f"Status: {order.status.name}\n"
-            f"Order Date: {order_date.hour:02}:{order_date.minute:02} "
-            f"{order_date.day:02}.{order_date.month:02}.{order_date.year:04}"
-        )
+        table = utb.format_order_table(
+            [(cart_dish.dish.name, cart_dish.quantity, cart_dish.dish.price) for cart_dish in order.cart_dish],
+            restaurant.currency
+        )  # create beautiful table for order
+        table += utb.format_order_footer(msg.text, restaurant.name, order.status.name, order.date_ordered)  # add bottom information to the table
 
         # Session now may be closed
 
@@ -2,11 +2,11 @@ import datetime
 import os
 from typing import Optional
 
-from sqlalchemy import ForeignKey, create_engine, select
+from sqlalchemy import ForeignKey, UniqueConstraint, create_engine, select
 from sqlalchemy.orm import (DeclarativeBase, Mapped, Session, mapped_column,
                             relationship)
 from sqlalchemy.types import (BigInteger, Boolean, DateTime, Float, Integer,
-                              String, Time, Unicode)
+                              LargeBinary, String, Time, Unicode)
 
 from utils import constants as uc
 from utils import utility as uu
@@ -23,14 +23,24 @@ DBADDR = os.environ.get('DBADDR')
 # Create engine with database
 engine = create_engine(f"{uc.DBDIALECT}://{DBLOGIN}@{DBADDR}/{uc.DBNAME}", echo=uc.DEBUG)
 
+status_ids: dict = {}  # status id by name, statuses are created with database and not changed while bot runs
+
+def load_status_ids() -> dict:
+    '''Loads ids of all statuses'''
+    with Session(engine) as session:
+        rows = session.execute(select(Status.id, Status.name)).all()
+    status_ids.update({row.name: row.id for row in rows})
+    return status_ids
+
+def get_status_id(name: str) -> int:
+    '''Returns id of status by name'''
+    if name not in status_ids:
+        load_status_ids()
+    return status_ids[name]
+
 def default_status_id():
     '''Function that returns default status id for every new order'''
-    with Session(engine) as session:
-        status_id = session.scalar(
-            select(Status)
-                .where(Status.name==uc.ORDER_STATUSES[0])  # First status for order is kept under index 0 in statuses list
-        ).id
-    return status_id
+    return get_status_id(uc.ORDER_STATUSES[0])  # First status for order is kept under index 0 in statuses list
 
 # Create Base class that inherits from main ORM class
 class Base(DeclarativeBase):
@@ -64,10 +74,25 @@ class Restaurant(Base):
 
     dishes: Mapped[list['Dish']] = relationship(back_populates='restaurant')
     schedule: Mapped[list['RestaurantSchedule']] = relationship(back_populates='restaurant')
+    notification_chats: Mapped[list['NotificationChat']] = relationship(back_populates='restaurant')
 
     def __repr__(self):
         return f"[RESTAURANT] {self.name}"
 
+class NotificationChat(Base):
+    __tablename__: str = 'notification_chat'
+    __table_args__: tuple = (UniqueConstraint('restaurant_id', 'chat_id'),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)  # chat where order requests of restaurant are sent
+
+    restaurant_id: Mapped[int] = mapped_column(ForeignKey('restaurant.id'))
+
+    restaurant: Mapped['Restaurant'] = relationship(back_populates='notification_chats')
+
+    def __repr__(self):
+        return f"[NOTIFICATION_CHAT] {self.chat_id} of {self.restaurant.name}"
+
 class RestaurantSchedule(Base):
     __tablename__: str = 'restaurant_schedule'
 
@@ -153,4 +178,106 @@ class CartDish(Base):
 
     def __repr__(self):
         return f"[CART_DISH] id: {self.id}"
-    
\ No newline at end of file
+    
+class OrderOutbox(Base):
+    __tablename__: str = 'order_outbox'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    date_created: Mapped[datetime.datetime] = mapped_column(DateTime, default=uu.current_utc_time)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)  # failed delivery attempts
+    next_attempt: Mapped[datetime.datetime] = mapped_column(DateTime, default=uu.current_utc_time)  # entry is not sent before this time
+    date_sent: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)  # None until notification is delivered
+    date_failed: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime)  # set when notification is not retried anymore
+    last_error: Mapped[Optional[str]] = mapped_column(String(256))
+
+    order_id: Mapped[int] = mapped_column(ForeignKey('order.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))  # customer to chat with
+
+    order: Mapped['Order'] = relationship()
+
+    def __repr__(self):
+        return f"[ORDER_OUTBOX] id: {self.id}, order id: {self.order_id}"
+
+class OrderRequestMessage(Base):
+    __tablename__: str = 'order_request_message'
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    message_id: Mapped[int] = mapped_column(Integer, primary_key=True)  # order request in notification chat, its keyboard is edited on answer
+
+    order_id: Mapped[int] = mapped_column(ForeignKey('order.id'))
+
+    def __repr__(self):
+        return f"[ORDER_REQUEST_MESSAGE] order id: {self.order_id}, chat id: {self.chat_id}, message id: {self.message_id}"
+
+class DishSoldOut(Base):
+    __tablename__: str = 'dish_sold_out'
+
+    dish_id: Mapped[int] = mapped_column(ForeignKey('dish.id'), primary_key=True)
+    date_until: Mapped[datetime.datetime] = mapped_column(DateTime)  # dish is enabled again by restock job after this time
+
+    def __repr__(self):
+        return f"[DISH_SOLD_OUT] dish id: {self.dish_id}, until: {self.date_until}"
+
+class OrderStatusChange(Base):
+    __tablename__: str = 'order_status_change'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    date_changed: Mapped[datetime.datetime] = mapped_column(DateTime, default=uu.current_utc_time)
+    order_ids: Mapped[str] = mapped_column(String)  # comma separated ids of orders changed at once
+
+    manager_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    status_id: Mapped[int] = mapped_column(ForeignKey('status.id'))
+
+    def __repr__(self):
+        return f"[ORDER_STATUS_CHANGE] id: {self.id}, orders: {self.order_ids}"
+
+class DashboardMessage(Base):
+    __tablename__: str = 'dashboard_message'
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    message_id: Mapped[Optional[int]] = mapped_column(Integer)  # pinned message with active orders, None while worker that claimed row sends it
+    text: Mapped[Optional[str]] = mapped_column(String)  # shown text, message is not edited with the same text
+    date_claimed: Mapped[datetime.datetime] = mapped_column(DateTime, default=uu.current_utc_time)  # when worker started to send message
+
+    def __repr__(self):
+        return f"[DASHBOARD_MESSAGE] chat id: {self.chat_id}, message id: {self.message_id}"
+
+class CatalogVersion(Base):
+    __tablename__: str = 'catalog_version'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)  # only one row
+    version: Mapped[int] = mapped_column(Integer, default=0)  # increased on every change of restaurants or dishes, workers reload catalog on it
+
+    def __repr__(self):
+        return f"[CATALOG_VERSION] version: {self.version}"
+
+class OrderKey(Base):
+    __tablename__: str = 'order_key'
+
+    key: Mapped[str] = mapped_column(String(40), primary_key=True)  # hash of user and cart, same cart can't be ordered twice
+    date_created: Mapped[datetime.datetime] = mapped_column(DateTime, default=uu.current_utc_time)
+
+    order_id: Mapped[int] = mapped_column(ForeignKey('order.id'))
+
+    def __repr__(self):
+        return f"[ORDER_KEY] key: {self.key}, order id: {self.order_id}"
+
+class UserState(Base):
+    __tablename__: str = 'user_state'
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)  # telegram user id, user could be not in user table yet
+    data: Mapped[bytes] = mapped_column(LargeBinary)  # pickled user_data of bot context
+    date_updated: Mapped[datetime.datetime] = mapped_column(DateTime, default=uu.current_utc_time, onupdate=uu.current_utc_time)
+
+    def __repr__(self):
+        return f"[USER_STATE] user id: {self.user_id}, updated: {self.date_updated}"
+
+class ConversationState(Base):
+    __tablename__: str = 'conversation_state'
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)  # name of conversation handler
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # conversation key as json list
+    state: Mapped[int] = mapped_column(Integer)
+
+    def __repr__(self):
+        return f"[CONVERSATION_STATE] name: {self.name}, key: {self.key}, state: {self.state}"
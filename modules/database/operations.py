@@ -10,6 +10,12 @@ def create_database():
 
     add_statuses()
     add_developer()
+    add_catalog_version()
+
+def update_database():
+    '''Function to create tables that were added to config after database creation'''
+    dbc.Base.metadata.create_all(dbc.engine)  # existing tables are not changed
+    add_catalog_version()
 
 def drop_database():
     '''Function to delete tables, described in config'''
@@ -37,3 +43,10 @@ def add_developer():
         )
         session.add(new_developer)
         session.commit()
+
+def add_catalog_version():
+    '''Adds row of catalog version if it doesn't exist'''
+    with Session(dbc.engine) as session:
+        if session.get(dbc.CatalogVersion, 1) is None:
+            session.add(dbc.CatalogVersion(id=1, version=0))
+            session.commit()
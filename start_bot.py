@@ -1,4 +1,8 @@
+import time
+
+started = time.perf_counter()  # imports are included in startup timing
+
 from modules.bot import config as bc
 
 if __name__ == '__main__':
-    bc.main()
\ No newline at end of file
+    bc.main(started)
\ No newline at end of file
@@ -0,0 +1,4 @@
+from modules.database import operations as dbo
+
+if __name__ == '__main__':
+    dbo.update_database()
\ No newline at end of file
@@ -19,11 +19,113 @@ FONT_SIZE: int = 24
 FONT_FILENAME: str = 'consolas.ttf'  # name of chosen font file in utils/resources
 FONT_PATH: str = os.path.join(BASE_DIR, 'resources', FONT_FILENAME)  # Path to default font
 
+# Exports configuration for /orders and /users
+EXPORT_BUFFER_SIZE: int = 1024 * 1024  # size in bytes of export file kept in memory, bigger exports are written to disk
+EXPORT_CHUNK_SIZE: int = 64 * 1024  # size in characters of csv lines written to export file at once
+EXPORT_YIELD_PER: int = 500  # rows fetched from database at once
+EXPORT_JOBS_LIMIT: int = 2  # exports running at once, others wait in queue
+EXPORT_PROGRESS_INTERVAL: float = 3  # seconds between export progress message edits
+BULK_ORDERS_PAGE_SIZE: int = 24  # active orders on one page of manager order list
+BULK_ORDERS_COLUMNS: int = 3  # order buttons in one row
+IMPORT_MAX_SIZE: int = 1024 * 1024  # size in bytes of biggest menu import document
+IMPORT_REPORT_LINES: int = 30  # changes or errors listed in import report, others are only counted
+
+# How dishes of category are shown
+# 'carousel' - one message with previous and next buttons, edited in place
+# 'media_group' - photos in albums of up to 10, and text carousel for ordering
+# 'messages' - one message for every dish
+MENU_MODE: str = 'carousel'
+
+# Seconds restaurants, schedules and dishes are cached at most, changes are seen earlier by catalog version
+CATALOG_CACHE_TTL: float = 60
+CATALOG_VERSION_INTERVAL: float = 1  # seconds between checks of catalog version, changes made on other workers are seen after it
+
+# Updates processing configuration
+# Updates of one user are processed in order, updates of different users concurrently
+UPDATES_CONCURRENCY: int = 16  # updates processed at once
+UPDATES_TASKS_LIMIT: int = 1024  # updates fetched from telegram and waiting for processing
+
+# Outgoing messages limits (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this)
+RATE_LIMIT_GLOBAL: float = 30  # messages per second for all chats, divided between shard workers
+RATE_LIMIT_CHAT: float = 1  # messages per second for private chat
+RATE_LIMIT_CHAT_BURST: int = 3  # messages that can be sent to private chat at once
+RATE_LIMIT_GROUP: float = 20 / 60  # messages per second for group chat
+RATE_LIMIT_GROUP_BURST: int = 5  # messages that can be sent to group chat at once
+RATE_LIMIT_MAX_RETRIES: int = 3  # retries of message after RetryAfter error
+RATE_LIMIT_GLOBAL_PAUSE_CHATS: int = 2  # chats limited by RetryAfter at once that pause all messages, one limited chat waits alone
+RATE_LIMIT_CHATS_KEPT: int = 10000  # chats with limits kept in memory, idle ones are forgotten above it
+
+# Connections to telegram, messages and media uploads use separate connection pools
+HTTP2: bool = False  # one connection serves many requests, requires httpx[http2]
+HTTP_KEEPALIVE_EXPIRY: float = 60  # seconds idle connection is kept open
+HTTP_CONNECT_TIMEOUT: float = 5
+HTTP_MESSAGES_POOL_SIZE: int = 32  # connections for text messages, edits and answers
+HTTP_MESSAGES_READ_TIMEOUT: float = 10
+HTTP_MESSAGES_WRITE_TIMEOUT: float = 10
+HTTP_MESSAGES_POOL_TIMEOUT: float = 5  # seconds request waits for free connection
+HTTP_MEDIA_POOL_SIZE: int = 8  # connections for photo and document uploads
+HTTP_MEDIA_READ_TIMEOUT: float = 30
+HTTP_MEDIA_WRITE_TIMEOUT: float = 60
+HTTP_MEDIA_POOL_TIMEOUT: float = 30
+HTTP_UPDATES_READ_TIMEOUT: float = 5  # added to POLLING_TIMEOUT for getUpdates
+POLLING_TIMEOUT: int = 10  # seconds telegram holds getUpdates request open if there are no updates
+
+# Seconds between checks of sold out dishes that should be enabled again
+RESTOCK_INTERVAL: int = 60
+
+# Seconds between writes of changed carts and conversation states to database
+PERSISTENCE_INTERVAL: float = 60
+
+# Memory used by users, conversations of idle users are ended and their user_data is removed from memory
+USER_CONVERSATION_TIMEOUT: int = 3600  # seconds without updates before user conversation ends, None to never end
+MANAGER_CONVERSATION_TIMEOUT: int = 1800  # seconds without updates before manager conversation ends, None to never end
+USER_DATA_IDLE_TIMEOUT: int = 7200  # seconds without updates before user_data is removed from memory
+EVICTION_INTERVAL: int = 600  # seconds between checks of idle users
+MEMORY_REPORT_INTERVAL: int = 3600  # seconds between logging size of user_data
+MEMORY_REPORT_TOP: int = 5  # users and user_data keys with largest size in report
+
+# Seconds between logging updates and outgoing messages queue depth and wait time
+STATS_INTERVAL: int = 300
+
 # Chat ID where orders notifications will be sent
 CHAT_ID: int = os.environ.get('CHAT_ID')
 
+# Pinned message with active orders in notification chat
+DASHBOARD_DEBOUNCE: float = 5  # seconds order events are collected before dashboard is edited once
+DASHBOARD_MAX_ORDERS: int = 50  # orders listed in dashboard, others are only counted
+DASHBOARD_CLAIM_TIMEOUT: int = 60  # seconds other workers wait for dashboard message that one worker claimed to send
+
+# Order requests outbox, requests are saved with order and delivered to notification chat by background job
+OUTBOX_INTERVAL: int = 30  # seconds between checks of undelivered order requests
+OUTBOX_BATCH_SIZE: int = 20  # order requests delivered in one check
+OUTBOX_RETRY_DELAY: int = 5  # seconds before first retry of failed order request, doubled on every attempt
+OUTBOX_RETRY_MAX_DELAY: int = 600  # longest delay between retries
+OUTBOX_CLAIM_TIMEOUT: int = 120  # seconds order request is claimed by worker that sends it
+OUTBOX_MAX_ATTEMPTS: int = 20  # failed deliveries before order request is marked failed and developer is notified
+ORDER_KEY_TTL: int = 86400  # seconds order keys are kept, the same cart submitted again is answered with saved order
+ORDER_KEY_CLEANUP_INTERVAL: int = 3600  # seconds between deletions of old order keys
+
+# Webhook configuration, if WEBHOOK_URL is not set bot uses long polling
+WEBHOOK_URL: str = os.environ.get('WEBHOOK_URL')  # public https url of the bot (example: https://bot.example.com)
+WEBHOOK_LISTEN: str = os.environ.get('WEBHOOK_LISTEN', '127.0.0.1')  # address for local webhook server
+WEBHOOK_PORT: int = int(os.environ.get('WEBHOOK_PORT', 8443))  # port for local webhook server
+WEBHOOK_PATH: str = os.environ.get('WEBHOOK_PATH', 'telegram')  # url path of webhook
+WEBHOOK_SECRET: str = os.environ.get('WEBHOOK_SECRET')  # secret token, telegram sends it in every webhook request
+WEBHOOK_MAX_CONNECTIONS: int = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))  # max simultaneous connections from telegram (1-100)
+
+# Sharding, webhook ingress routes updates to workers by user id, so every user is served by one worker
+# Changing SHARD_WORKERS moves part of users to other workers, workers save and reload their state on it
+SHARD_ROLE: str = os.environ.get('SHARD_ROLE')  # 'ingress', 'worker' or empty to run single process
+SHARD_WORKERS: list = [url.rstrip('/') for url in os.environ.get('SHARD_WORKERS', '').split(',') if url]  # worker urls (example: http://10.0.0.2:8001)
+SHARD_SECRET: str = os.environ.get('SHARD_SECRET')  # secret token in requests from ingress to workers
+SHARD_REPLICAS: int = 100  # points of every worker on hash ring, more points spread users more evenly
+SHARD_FORWARD_TIMEOUT: float = 10  # seconds ingress waits for worker to accept update
+
 # Developer ID for errors
 DEVELOPER_ID: int = os.environ.get('DEVELOPER_ID')
+ERROR_DIGEST_INTERVAL: int = 600  # seconds between messages with counts of repeated errors
+ERROR_NEW_REPORTS_LIMIT: int = 10  # new errors sent as documents between digests, others are only counted
+ERROR_REPORTS_KEPT: int = 1000  # error fingerprints remembered, least recently seen are forgotten
 
 # This account will be displayed in "About Us" menu as help contact
 MANAGER_ID: int = os.environ.get('MANAGER_ID')
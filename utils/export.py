@@ -0,0 +1,62 @@
+import csv
+import gzip
+import io
+import tempfile
+
+from utils import constants as uc
+
+
+EXPORT_FORMATS: tuple = ('csv', 'gz', 'xlsx')  # formats available for exports
+EXPORT_EXTENSIONS: dict = {
+    'csv': 'csv',
+    'gz': 'csv.gz',
+    'xlsx': 'xlsx',
+}  # file extension for every export format
+
+def _write_csv(out, header: list, rows):
+    '''Writes rows to binary file object one by one'''
+    line = io.StringIO()  # buffer for single csv line
+    writer = csv.writer(line)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if line.tell() >= uc.EXPORT_CHUNK_SIZE:  # write encoded lines in chunks
+            out.write(line.getvalue().encode('utf-8'))
+            line.seek(0)
+            line.truncate()
+    out.write(line.getvalue().encode('utf-8'))
+
+def _write_xlsx(out, header: list, rows):
+    '''Writes rows to binary file object as xlsx workbook'''
+    try:
+        from openpyxl import Workbook  # optional dependency, only needed for xlsx exports
+    except ImportError:
+        raise Exception('xlsx export requires openpyxl to be installed')
+
+    workbook = Workbook(write_only=True)  # write only workbook keeps memory constant
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(out)
+
+def write_export(header: list, rows, export_format: str = 'csv'):
+    '''Writes rows to temporary file, that is kept in memory until EXPORT_BUFFER_SIZE, and returns it'''
+    if export_format not in EXPORT_FORMATS:
+        raise Exception(f"Unknown export format {export_format}, available: {', '.join(EXPORT_FORMATS)}")
+
+    tmp_file = tempfile.SpooledTemporaryFile(max_size=uc.EXPORT_BUFFER_SIZE)  # bounded in-memory buffer
+    if export_format == 'csv':
+        _write_csv(tmp_file, header, rows)
+    elif export_format == 'gz':
+        with gzip.GzipFile(fileobj=tmp_file, mode='wb') as gz_file:
+            _write_csv(gz_file, header, rows)
+    else:
+        _write_xlsx(tmp_file, header, rows)
+    tmp_file.seek(0)
+
+    return tmp_file
+
+def export_filename(name: str, export_format: str) -> str:
+    '''Returns file name for export'''
+    return f"{name}.{EXPORT_EXTENSIONS[export_format]}"
@@ -0,0 +1,144 @@
+import csv
+import datetime as dt
+import io
+import json
+
+
+IMPORT_FORMATS: tuple = ('csv', 'json')  # formats of menu import document, chosen by file extension
+IMPORT_COLUMNS: tuple = ('restaurant', 'currency', 'schedule', 'category', 'dish', 'description', 'price', 'enabled')  # csv header
+BOOL_VALUES: dict = {
+    'yes': True, 'true': True, '1': True, '+': True,
+    'no': False, 'false': False, '0': False, '-': False,
+}  # accepted values of enabled column
+
+def parse_schedule(text: str) -> dict:
+    '''Returns {day_of_week: (start, end)} from lines "Day of the week (1-7) - Start Time (HH.MM) - End Time (HH.MM)" separated by new line or ;'''
+    schedule = {}
+    for st in text.replace(';', '\n').split('\n'):
+        if not st.strip():
+            continue
+        fields = st.replace(' ', '').split('-')
+        assert len(fields) == 3, f"schedule line '{st.strip()}' must contain 3 values"
+        day = int(fields[0])
+        assert 1 <= day <= 7, f"day of the week {day} is not in 1-7"
+        assert day not in schedule, f"day of the week {day} is repeated"
+        schedule[day] = (
+            dt.time(*[int(x) for x in fields[1].split('.')]),  # start time
+            dt.time(*[int(x) for x in fields[2].split('.')]),  # end time
+        )
+    return schedule
+
+def _csv_rows(data: bytes):
+    '''Yields location and row of csv document'''
+    reader = csv.DictReader(io.StringIO(data.decode('utf-8-sig')))  # signature is added by spreadsheet editors
+    header = [(column or '').strip().lower() for column in reader.fieldnames or []]
+    unknown = [column for column in header if column not in IMPORT_COLUMNS]
+    if 'restaurant' not in header or unknown:
+        raise Exception(f"CSV header must contain restaurant column and only columns: {', '.join(IMPORT_COLUMNS)}")
+    reader.fieldnames = header
+
+    for row in reader:
+        yield f"Line {reader.line_num}", row
+
+def _json_rows(data: bytes):
+    '''Yields location and row for every restaurant and dish of json document'''
+    document = json.loads(data.decode('utf-8-sig'))
+    restaurants = document.get('restaurants') if isinstance(document, dict) else document
+    if not isinstance(restaurants, list):
+        raise Exception('JSON document must be a list of restaurants or {"restaurants": [...]}')
+
+    for i, restaurant in enumerate(restaurants):
+        location = f"restaurants[{i}]"
+        if not isinstance(restaurant, dict):
+            raise Exception(f"{location} must be an object")
+        schedule = restaurant.get('schedule')
+        yield location, {
+            'restaurant': restaurant.get('name'),
+            'currency': restaurant.get('currency'),
+            'schedule': '\n'.join(schedule) if isinstance(schedule, list) else schedule,  # list of lines or one string
+        }
+
+        for j, dish in enumerate(restaurant.get('dishes') or []):
+            if not isinstance(dish, dict):
+                raise Exception(f"{location}.dishes[{j}] must be an object")
+            yield f"{location}.dishes[{j}]", {
+                'restaurant': restaurant.get('name'),
+                'category': dish.get('category'),
+                'dish': dish.get('name'),
+                'description': dish.get('description'),
+                'price': dish.get('price'),
+                'enabled': dish.get('enabled'),
+            }
+
+def _value(row: dict, column: str) -> str:
+    '''Returns stripped value of column, None if it is empty'''
+    value = row.get(column)
+    if value is None:
+        return None
+    value = str(value).strip() if not isinstance(value, bool) else str(value).lower()
+    return value or None
+
+def parse_menu(data: bytes, filename: str) -> tuple:
+    '''Parses and checks whole document, returns menu and list of errors
+
+    Menu is {restaurant_name_lower: {'name', 'currency', 'schedule', 'dishes': {dish_name_lower: dish}}},
+    dish is {'name', 'category', 'description', 'price', 'enabled'}, empty values are None and keep stored values.
+    '''
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if extension not in IMPORT_FORMATS:
+        return {}, [f"Unknown import format {extension or filename}, available: {', '.join(IMPORT_FORMATS)}"]
+
+    menu = {}
+    errors = []
+    try:
+        for location, row in (_csv_rows(data) if extension == 'csv' else _json_rows(data)):
+            try:
+                restaurant_name = _value(row, 'restaurant')
+                assert restaurant_name, 'restaurant is empty'
+                restaurant = menu.setdefault(
+                    restaurant_name.lower(),
+                    {'name': restaurant_name, 'currency': None, 'schedule': None, 'dishes': {}}
+                )
+
+                currency = _value(row, 'currency')
+                if currency:
+                    assert restaurant['currency'] in (None, currency), f"currency of {restaurant_name} is already {restaurant['currency']}"
+                    restaurant['currency'] = currency
+
+                schedule_text = _value(row, 'schedule')
+                if schedule_text:
+                    schedule = parse_schedule(schedule_text)
+                    assert restaurant['schedule'] in (None, schedule), f"schedule of {restaurant_name} is already set"
+                    restaurant['schedule'] = schedule
+
+                dish_name = _value(row, 'dish')
+                if not dish_name:
+                    assert not any(_value(row, column) for column in ('category', 'description', 'price', 'enabled')), 'dish is empty'
+                    continue  # row only with restaurant data
+                assert dish_name.lower() not in restaurant['dishes'], f"dish {dish_name} of {restaurant_name} is repeated"
+
+                price = _value(row, 'price')
+                if price is not None:
+                    price = float(price.replace(',', '.'))
+                    assert price >= 0, 'price is negative'
+
+                enabled = _value(row, 'enabled')
+                if enabled is not None:
+                    assert enabled.lower() in BOOL_VALUES, f"enabled must be one of: {', '.join(BOOL_VALUES)}"
+                    enabled = BOOL_VALUES[enabled.lower()]
+
+                restaurant['dishes'][dish_name.lower()] = {
+                    'name': dish_name,
+                    'category': _value(row, 'category'),
+                    'description': _value(row, 'description'),
+                    'price': price,
+                    'enabled': enabled,
+                }
+            except Exception as er:
+                errors.append(f"{location}: {er}")
+    except Exception as er:
+        errors.append(f"Document can't be read: {er}")  # wrong encoding, header or json structure
+
+    if not menu and not errors:
+        errors.append('Document is empty')
+    return menu, errors
@@ -0,0 +1,163 @@
+import math
+
+from utils import constants as uc
+
+try:
+    import wcwidth  # optional wide-character support, used by tabulate when installed
+except ImportError:
+    wcwidth = None
+
+
+# Column kinds of the fixed table schemas
+TEXT = 'text'  # never parsed as number, flushed left
+INT = 'int'  # digits or None, flushed right
+BOOL = 'bool'  # 'True' or 'False', flushed left
+AUTO = 'auto'  # user provided text, kind is inferred per table like tabulate does
+
+SINGLE_ORDER_COLUMNS: tuple = (
+    ('Name', TEXT),  # always contains 'Total' row, so it is never numeric
+    ('Quantity', INT),
+    ('Price', AUTO),
+)  # table with one order description
+MANY_ORDERS_COLUMNS: tuple = (
+    ('Order Number', INT),
+    ('Date', TEXT),
+    ('Status', AUTO),
+    ('Total Price', AUTO),
+)  # table with many orders
+USERS_LIST_COLUMNS: tuple = (
+    ('ID', INT),
+    ('Username', AUTO),
+    ('First Name', AUTO),
+    ('Last Name', AUTO),
+    ('Admin', BOOL),
+    ('Manager', BOOL),
+    ('Date Registered', TEXT),
+)  # table with users list
+
+_SPECIAL_CHARS = ('\x1b', '\n', '\r', '\x01')  # ANSI codes, multiline cells and separating lines are left to tabulate
+
+def _width(s: str) -> int:
+    '''Returns visible width of the string'''
+    return wcwidth.wcswidth(s) if wcwidth is not None else len(s)
+
+def _is_float(value) -> bool:
+    '''Same rules as tabulate uses to detect float values'''
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return False
+    if isinstance(value, str) and (math.isinf(number) or math.isnan(number)):
+        return value.lower() in ['inf', '-inf', 'nan']
+    return True
+
+def _is_int(value) -> bool:
+    '''Same rules as tabulate uses to detect int values'''
+    if type(value) is int:
+        return True
+    if not isinstance(value, str):
+        return False
+    try:
+        int(value)
+    except ValueError:
+        return False
+    return True
+
+def _infer_kind(values: list) -> str:
+    '''Returns the least generic kind all column values are convertible to'''
+    kind = BOOL  # None and bool values keep column flushed left
+    for value in values:
+        if value is None or type(value) is bool or value in ('True', 'False'):
+            continue
+        if _is_int(value):
+            kind = INT if kind == BOOL else kind
+        elif _is_float(value):
+            kind = 'float'
+        else:
+            return TEXT
+    return kind
+
+def _afterpoint(s: str) -> int:
+    '''Symbols after a decimal point of formatted float, -1 if there is no point'''
+    if not _is_float(s) or _is_int(s):
+        return -1
+    pos = s.rfind('.')
+    pos = s.lower().rfind('e') if pos < 0 else pos
+    return len(s) - pos - 1 if pos >= 0 else -1
+
+def _format_column(values: list, kind: str) -> tuple:
+    '''Returns formatted column cells and flag if they are flushed right'''
+    if kind == AUTO:
+        kind = _infer_kind(values)
+
+    if kind == INT and any(value is not None for value in values):
+        return ['' if value is None else str(value) for value in values], True
+
+    if kind != 'float':
+        return ['' if value is None else str(value).strip() for value in values], False
+
+    cells = ['' if value is None else format(float(value), 'g') for value in values]  # float column
+    decimals = [_afterpoint(cell) for cell in cells]
+    max_decimals = max(decimals)
+    return [cell + ' '*(max_decimals - dec) for cell, dec in zip(cells, decimals)], True
+
+def _pad(cell: str, width: int, right: bool) -> str:
+    '''Pads cell to visible width'''
+    width -= _width(cell) - len(cell)  # correction for wide characters
+    return cell.rjust(width) if right else cell.ljust(width)
+
+def _fallback(rows: list, columns: tuple) -> list:
+    '''Formats table with tabulate for cells that fast path doesn't support'''
+    import tabulate
+
+    return tabulate.tabulate(rows, headers=[name for name, _ in columns]).split('\n')
+
+def iter_table(rows: list, columns: tuple):
+    '''Yields lines of the table, same as tabulate.tabulate(rows, headers) with "simple" format'''
+    rows = [list(row) for row in rows]
+    for row in rows:
+        for cell in row:
+            if isinstance(cell, str) and any(char in cell for char in _SPECIAL_CHARS):
+                yield from _fallback(rows, columns)
+                return
+
+    headers = [name for name, _ in columns]
+    cols = []  # formatted cells by column
+    aligns = []  # True if column is flushed right
+    widths = []  # width of every column
+    for index, (header, kind) in enumerate(columns):
+        cells, right = _format_column([row[index] for row in rows], kind) if rows else ([], False)
+        cols.append(cells)
+        aligns.append(right)
+        widths.append(max([_width(header) + 2] + [_width(cell) for cell in cells]))  # tabulate pads headers with 2 spaces
+
+    yield '  '.join(_pad(h, w, r) for h, w, r in zip(headers, widths, aligns)).rstrip()
+    yield '  '.join('-'*w for w in widths)
+    for line in zip(*cols):
+        yield '  '.join(_pad(c, w, r) for c, w, r in zip(line, widths, aligns)).rstrip()
+
+def format_table(rows: list, columns: tuple) -> str:
+    '''Returns table as single string'''
+    return '\n'.join(iter_table(rows, columns))
+
+def format_order_table(dishes: list, currency: str) -> str:
+    '''Returns table with one order description, dishes is a list of (name, quantity, price)'''
+    rows = []  # rows of the table
+    total_price = 0  # total price of the order
+    for name, quantity, price in dishes:
+        rows.append([name, quantity, f"{price} {currency}"])
+        total_price += price*quantity  # add price to total
+    rows.append(['Total', None, f"{total_price} {currency}"])  # add total price to list
+
+    return format_table(rows, SINGLE_ORDER_COLUMNS)
+
+def format_order_footer(order_id, restaurant_name: str, status_name: str, date_ordered) -> str:
+    '''Returns bottom information for the table with one order description'''
+    order_date = date_ordered.astimezone(uc.PLACE_TIMEZONE)  # convert timezone from UTC to local
+    return (
+        f"\n\nOrder Number: {order_id}\n"
+        f"Restaurant: {restaurant_name}\n"
+        f"Status: {status_name}\n"
+        f"Order Date: {order_date.hour:02}:{order_date.minute:02} "
+        f"{order_date.day:02}.{order_date.month:02}.{order_date.year:04}"
+    )
@@ -33,6 +33,7 @@ messages = {
         'Manager will contact you soon'
     ),
     'order_number': 'Your order number',
+    'orders_status_changed': 'Status of your orders has been changed',
     'current_orders': 'Your current orders',
     'past_orders': 'Your previous orders',
     'no_past_orders': 'You do not have any current or previous orders',
@@ -54,13 +55,19 @@ messages = {
     'help_manager': (
         'You are identified as manager\n'
         '- To view and manage order, use /order <ORDER_NUMBER>\n'
-        '- To view last <QUANTITY> orders, use /orders <QUANTITY>\n\n'
+        '- To complete or cancel several active orders at once, use /active_orders\n'
+        '- To export last <QUANTITY> orders, use /orders <QUANTITY> [csv|gz|xlsx]\n\n'
         '- To view and manage user, use /user <USER_ID> or /user <@USERNAME>\n'
-        '- To view last <QUANTITY> registered user, use /users <QUANTITY>\n\n'
+        '- To export last <QUANTITY> registered users, use /users <QUANTITY> [csv|gz|xlsx]\n\n'
         '- To manage existing restaurant, use /restaurant <RESTAURANT_NAME>\n'
+        '- To view notification chats of restaurant, use /notify <RESTAURANT_NAME>\n'
+        '- To add or remove notification chat of restaurant, use /notify <CHAT_ID> <RESTAURANT_NAME>\n'
         '- To add new restaurant, use /new_restaurant\n'
         '- To add new category, use /new_category\n'
         '- To add new dish, use /new_dish\n'
         '  (Restaurant and category must be present)\n'
+        '- To add or update restaurants, categories and dishes from CSV or JSON document, use /import\n'
+        '  (/import check only shows changes)\n'
+        '- To enable or disable all dishes of restaurant or category, use /availability <on|off> [until HH.MM] <RESTAURANT_NAME> [| CATEGORY_NAME]\n'
     )
 }
\ No newline at end of file